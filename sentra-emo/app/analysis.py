@@ -1,7 +1,10 @@
-from typing import Dict, List, Tuple, Optional, Any
+from typing import Any, Callable, Dict, List, Tuple, Optional
 from pathlib import Path
 import json
 import logging
+import threading
+
+import numpy as np
 
 from .config import (
     get_vad_config_paths,
@@ -15,6 +18,12 @@ logger = logging.getLogger(__name__)
 
 _negative_labels: Optional[set[str]] = None
 _last_emotion_dir: Optional[Path] = None
+# (emotion_model_dir, labels) the current mapper was built for, and the map files it was built from
+_vad_key: Optional[Tuple[str, Tuple[str, ...]]] = None
+_vad_files_sig: Optional[Tuple[Tuple[Optional[str], Optional[int]], ...]] = None
+# Keys replaced by `swap_vad_mapper`: requests still running on the old model must not rebuild theirs
+_swapped_out_keys: set[Tuple[str, Tuple[str, ...]]] = set()
+_vad_init_lock = threading.Lock()
 _vad_status: Dict[str, Any] = {
     "emotion_model_dir": None,
     "map_path": None,
@@ -30,12 +39,38 @@ _vad_status: Dict[str, Any] = {
 
 
 class VADMapper:
-    def __init__(self, mapping: Dict[str, Tuple[float, float, float]], alias: Optional[Dict[str, str]] = None) -> None:
+    """Emotion label -> (valence, arousal, dominance).
+
+    When built for an emotion model's labels, alias resolution and map lookups happen once:
+    `vad` is a dense labels x 3 array in the model's output order, so a score vector or a whole
+    batch of score rows maps to VAD with one matrix product.
+    """
+
+    def __init__(
+        self,
+        mapping: Dict[str, Tuple[float, float, float]],
+        alias: Optional[Dict[str, str]] = None,
+        labels: Optional[List[str]] = None,
+    ) -> None:
         # canonical lower-case label -> (v,a,d)
         self.mapping: Dict[str, Tuple[float, float, float]] = {
             str(k).lower(): (float(v), float(a), float(d)) for k, (v, a, d) in mapping.items()
         }
         self.alias: Dict[str, str] = {str(k).lower(): str(v).lower() for k, v in (alias or {}).items()}
+        self.labels: List[str] = list(labels or [])
+        self.vad = np.array([self.map_label(l) for l in self.labels], dtype=np.float64).reshape(-1, 3)
+        # raw (lower-case) and canonical label -> column of `vad`
+        self.columns: Dict[str, int] = {}
+        for i, l in enumerate(self.labels):
+            self.columns.setdefault(str(l).lower(), i)
+        for i, l in enumerate(self.labels):
+            c = self.canonical(l)
+            if self.canonical(c) == c:  # same VAD as the raw label (aliases are resolved one step)
+                self.columns.setdefault(c, i)
+
+    def with_labels(self, labels: Optional[List[str]]) -> "VADMapper":
+        """Same mapping and aliases, built for another label set."""
+        return VADMapper(self.mapping, self.alias, labels)
 
     def canonical(self, label: str) -> str:
         l = str(label).lower()
@@ -45,20 +80,54 @@ class VADMapper:
         key = self.canonical(label)
         return self.mapping.get(key, (0.5, 0.5, 0.5))
 
+    @staticmethod
+    def _weighted(scores: np.ndarray, vad: np.ndarray) -> np.ndarray:
+        totals = scores.sum(axis=1, keepdims=True)
+        out = np.full((scores.shape[0], 3), 0.5)
+        np.divide(scores @ vad, totals, out=out, where=totals > 0)
+        return out
+
+    def map_batch(self, scores: np.ndarray) -> np.ndarray:
+        """N x len(labels) score rows (model output order) -> N x 3 score-weighted VAD.
+        Rows whose scores sum to <= 0 map to (0.5, 0.5, 0.5)."""
+        return self._weighted(np.asarray(scores, dtype=np.float64).reshape(-1, len(self.labels)), self.vad)
+
+    def map_scores(self, scores: np.ndarray) -> Tuple[float, float, float]:
+        """One score vector in model output order -> (v, a, d)."""
+        v, a, d = self.map_batch(scores)[0].tolist()
+        return v, a, d
+
+    def map_distributions(self, distributions: List[List[Tuple[str, float]]]) -> np.ndarray:
+        """(label, score) distributions -> N x 3 VAD. Labels of the model go through the dense
+        array; any other label (e.g. from an online provider) is looked up individually."""
+        n_cols = len(self.labels)
+        extra: Dict[str, int] = {}
+        extra_vad: List[Tuple[float, float, float]] = []
+        rows: List[int] = []
+        cols: List[int] = []
+        vals: List[float] = []
+        for i, distribution in enumerate(distributions):
+            for label, score in distribution:
+                c = self.columns.get(str(label).lower())
+                if c is None:
+                    c = extra.get(label)
+                    if c is None:
+                        c = extra[label] = n_cols + len(extra_vad)
+                        extra_vad.append(self.map_label(label))
+                rows.append(i)
+                cols.append(c)
+                vals.append(score)
+        scores = np.zeros((len(distributions), n_cols + len(extra_vad)))
+        # np.add.at: a label may occur more than once in a distribution (e.g. after alias folding)
+        np.add.at(scores, (rows, cols), vals)
+        vad = np.vstack([self.vad, np.array(extra_vad).reshape(-1, 3)]) if extra_vad else self.vad
+        return self._weighted(scores, vad)
+
     def map_distribution(self, distribution: List[Tuple[str, float]]) -> Tuple[float, float, float]:
         if not distribution:
             return 0.5, 0.5, 0.5
-        v = a = d = 0.0
-        total = 0.0
-        for label, score in distribution:
-            vv, aa, dd = self.map_label(label)
-            v += score * vv
-            a += score * aa
-            d += score * dd
-            total += score
-        if total <= 0:
-            return 0.5, 0.5, 0.5
-        return v / total, a / total, d / total
+        v, a, d = self.map_distributions([distribution])[0].tolist()
+        return v, a, d
 
     def unknown_labels(self, labels: List[str]) -> List[str]:
         res: List[str] = []
@@ -114,7 +183,9 @@ def init_vad_mapper(emotion_model_dir: Path | str, emotion_labels: Optional[List
     if map_path is None:
         logger.info("No specific VAD map found; falling back to default")
         _ensure_default_mapper()
-        mapper = _vad_mapper
+        assert _vad_mapper is not None
+        mapper = _vad_mapper.with_labels(emotion_labels)
+        _vad_mapper = mapper
     else:
         mapping = _load_mapping_from_json(map_path)
         alias: Optional[Dict[str, str]] = None
@@ -123,7 +194,7 @@ def init_vad_mapper(emotion_model_dir: Path | str, emotion_labels: Optional[List
                 alias = json.loads(alias_path.read_text(encoding="utf-8"))
             except Exception as e:  # noqa: BLE001
                 logger.warning(f"Failed to read alias file {alias_path}: {e}")
-        mapper = VADMapper(mapping, alias)
+        mapper = VADMapper(mapping, alias, emotion_labels)
         _vad_mapper = mapper
         logger.info(f"Loaded VAD mapping from {map_path} (alias: {alias_path if alias_path else 'none'})")
 
@@ -152,6 +223,91 @@ def init_vad_mapper(emotion_model_dir: Path | str, emotion_labels: Optional[List
         logger.warning(f"Failed to write unknown labels file: {e}")
 
 
+def _vad_files_signature(emo_dir: Path) -> Tuple[Tuple[Optional[str], Optional[int]], ...]:
+    """(path, mtime_ns) of the map/alias/negative files that currently win the search order."""
+    paths = get_vad_config_paths(emo_dir)
+    chosen = [paths["map"], paths["alias"], get_negative_config_paths(emo_dir)["neg"]]
+    sig: List[Tuple[Optional[str], Optional[int]]] = []
+    for p in chosen:
+        if p is None:
+            sig.append((None, None))
+            continue
+        try:
+            sig.append((str(p), p.stat().st_mtime_ns))
+        except OSError:
+            sig.append((str(p), None))
+    return tuple(sig)
+
+
+def _negative_labels_dir() -> Path:
+    """Model dir to search for negative_emotions.json: the current emotion model's, else the models root."""
+    key = _vad_key
+    return Path(key[0]) if key is not None else PROJECT_ROOT / "models" / "emotion"
+
+
+def _reload_vad_state(emo_dir: Path, labels: Optional[List[str]]) -> None:
+    global _vad_key, _vad_files_sig, _negative_labels
+    sig = _vad_files_signature(emo_dir)
+    init_vad_mapper(emo_dir, labels)
+    # negative labels may be derived from the mapper; rebuild them against the new one
+    _negative_labels = None
+    init_negative_labels(emotion_model_dir=emo_dir, emotion_labels=None)
+    _vad_files_sig = sig
+    _vad_key = (str(emo_dir), tuple(labels or ()))
+
+
+def ensure_vad_mapper(emotion_model_dir: Path | str, emotion_labels: Optional[List[str]] = None) -> None:
+    """Initialize the VAD mapper for this emotion model once.
+
+    Cheap on the request path: when the mapper was already built for the same model dir and
+    label set this is an in-memory comparison with no filesystem access. Map file changes are
+    picked up by `refresh_vad_mapper_if_changed()` (called periodically off the request path).
+    A key that a hot-swap already replaced is left alone: only the swap installs mappers
+    once the first one exists.
+    """
+    key = (str(emotion_model_dir), tuple(emotion_labels or ()))
+    if _vad_key == key or key in _swapped_out_keys:
+        return
+    with _vad_init_lock:
+        if _vad_key == key or key in _swapped_out_keys:
+            return
+        _reload_vad_state(Path(emotion_model_dir), emotion_labels)
+
+
+def swap_vad_mapper(emotion_model_dir: Path | str, emotion_labels: Optional[List[str]], swap: Callable[[], Any]) -> Any:
+    """Build the mapper for a new emotion model and run `swap` (which installs the model) under
+    the same lock, so requests never see the new model with the old mapper or rebuild it themselves.
+    Returns what `swap` returns.
+    """
+    key = (str(emotion_model_dir), tuple(emotion_labels or ()))
+    with _vad_init_lock:
+        old = _vad_key
+        _reload_vad_state(Path(emotion_model_dir), emotion_labels)
+        if old is not None and old != key:
+            _swapped_out_keys.add(old)
+        _swapped_out_keys.discard(key)
+        return swap()
+
+
+def refresh_vad_mapper_if_changed() -> bool:
+    """Re-stat the VAD map/alias/negative files and rebuild the mapper if any of them changed.
+    Returns True when a reload happened.
+    """
+    key = _vad_key
+    if key is None:
+        return False
+    emo_dir = Path(key[0])
+    sig = _vad_files_signature(emo_dir)
+    if sig == _vad_files_sig:
+        return False
+    with _vad_init_lock:
+        if _vad_key != key:
+            return False
+        logger.info(f"VAD map files changed for {emo_dir}; reloading mapper")
+        _reload_vad_state(emo_dir, list(key[1]) or None)
+    return True
+
+
 def _load_negative_from_file(p: Path) -> Optional[set[str]]:
     try:
         data = json.loads(p.read_text(encoding="utf-8"))
@@ -245,13 +401,17 @@ def derive_stress(valence: float, arousal: float, distribution: List[Tuple[str,
     global _negative_labels
     if _negative_labels is None:
         # Try to derive without labels list
-        init_negative_labels(emotion_model_dir=PROJECT_ROOT / "models" / "emotion", emotion_labels=None)
+        init_negative_labels(emotion_model_dir=_negative_labels_dir(), emotion_labels=None)
     neg_sum = 0.0
     for label, score in distribution:
         lab = str(label)
         canon = _vad_mapper.canonical(lab) if _vad_mapper else lab.lower()
         if _negative_labels and canon in _negative_labels:
             neg_sum += score
+    return _stress_level(valence, arousal, neg_sum)
+
+
+def _stress_level(valence: float, arousal: float, neg_sum: float) -> Tuple[float, str]:
     stress = 0.6 * (1.0 - valence) + 0.4 * arousal + 0.15 * neg_sum
     stress = max(0.0, min(1.0, stress))
     if stress < 0.33:
@@ -263,6 +423,133 @@ def derive_stress(valence: float, arousal: float, distribution: List[Tuple[str,
     return stress, level
 
 
+def postprocess_emotions_batch(
+    distributions: List[List[Tuple[str, float]]],
+    *,
+    use_alias: bool = True,
+    min_score: float = 0.0,
+) -> List[Tuple[List[Tuple[str, float]], float, float, float, float, str]]:
+    """Post-process a batch of emotion distributions in one pass.
+
+    Per item: alias canonicalisation (optional), min-score filtering with renormalisation
+    (only if some labels remain), VAD mapping (one matrix product for the batch) and stress.
+    Mapper and negative-label state are resolved once for the whole batch.
+    Returns one (canon_pairs, v, a, d, stress, level) tuple per input distribution.
+    """
+    global _vad_mapper, _negative_labels
+    if _vad_mapper is None:
+        _ensure_default_mapper()
+    if _negative_labels is None:
+        init_negative_labels(emotion_model_dir=_negative_labels_dir(), emotion_labels=None)
+    mapper = _vad_mapper
+    negative = _negative_labels or set()
+    assert mapper is not None
+    batch_pairs: List[List[Tuple[str, float]]] = []
+    for distribution in distributions:
+        if use_alias:
+            pairs = [(mapper.canonical(lbl), float(score)) for lbl, score in distribution]
+        else:
+            pairs = [(lbl, float(score)) for lbl, score in distribution]
+        if min_score > 0.0:
+            filtered = [(k, vv) for k, vv in pairs if vv >= min_score]
+            if filtered:
+                pairs = normalize_distribution(filtered)
+        batch_pairs.append(pairs)
+    vads = mapper.map_distributions(batch_pairs)
+    results: List[Tuple[List[Tuple[str, float]], float, float, float, float, str]] = []
+    for pairs, (v, a, d) in zip(batch_pairs, vads.tolist()):
+        neg_sum = sum(score for lbl, score in pairs if mapper.canonical(lbl) in negative)
+        stress, level = _stress_level(v, a, neg_sum)
+        results.append((pairs, v, a, d, stress, level))
+    return results
+
+
+_columns_cache: Optional[Tuple[VADMapper, set[str], Tuple[str, ...], bool, Tuple[List[str], np.ndarray, np.ndarray]]] = None
+
+
+def _emotion_columns(
+    mapper: VADMapper, negative: set[str], labels: Tuple[str, ...], use_alias: bool
+) -> Tuple[List[str], np.ndarray, np.ndarray]:
+    """(output name, VAD row, is-negative) per emotion model class, compiled once per mapper /
+    negative-label set / label set and reused until one of them changes."""
+    global _columns_cache
+    cached = _columns_cache
+    if (
+        cached is not None
+        and cached[0] is mapper
+        and cached[1] is negative
+        and cached[2] == labels
+        and cached[3] == use_alias
+    ):
+        return cached[4]
+    names = [mapper.canonical(l) for l in labels] if use_alias else list(labels)
+    vad = mapper.vad if names == mapper.labels else mapper.with_labels(names).vad
+    neg = np.array([mapper.canonical(n) in negative for n in names], dtype=np.float64)
+    compiled = (names, vad, neg)
+    _columns_cache = (mapper, negative, labels, use_alias, compiled)
+    return compiled
+
+
+def postprocess_emotion_scores(
+    scores: np.ndarray,
+    labels: Tuple[str, ...],
+    *,
+    multi: bool,
+    threshold: float,
+    topk: int,
+    use_alias: bool = True,
+    min_score: float = 0.0,
+) -> List[Tuple[List[Tuple[str, float]], float, float, float, float, str]]:
+    """Columnar post-processing of an N x classes emotion score matrix (model output order).
+
+    Label selection (threshold/top-k), min-score filtering with renormalisation, VAD, negative
+    sum and stress run on arrays of class ids for the whole batch; alias resolution, VAD rows
+    and the negative mask are compiled per model. Label strings are only attached at the end.
+    Same results as `analyze_emotions_batch` + `postprocess_emotions_batch` on the same scores.
+    """
+    from .models import select_emotions
+
+    global _negative_labels
+    if _vad_mapper is None:
+        _ensure_default_mapper()
+    if _negative_labels is None:
+        init_negative_labels(emotion_model_dir=_negative_labels_dir(), emotion_labels=None)
+    assert _vad_mapper is not None
+    negative = _negative_labels if _negative_labels is not None else set()
+    names, vad, neg = _emotion_columns(_vad_mapper, negative, tuple(labels), use_alias)
+
+    order, ranked, keep = select_emotions(np.asarray(scores, dtype=np.float64), multi, threshold, topk)
+    weights = np.where(keep, ranked, 0.0)
+    if min_score > 0.0:
+        # 最小分数过滤后重归一；全部被过滤的行保留原分布
+        kept = keep & (ranked >= min_score)
+        rows = kept.any(axis=1)
+        if rows.any():
+            kept, clipped = kept[rows], np.where(kept[rows], np.maximum(ranked[rows], 0.0), 0.0)
+            totals = clipped.sum(axis=1, keepdims=True)
+            uniform = kept / kept.sum(axis=1, keepdims=True)
+            weights[rows] = np.where(totals > 0, clipped / np.where(totals > 0, totals, 1.0), uniform)
+            keep = keep.copy()
+            keep[rows] = kept
+    # back to class order for the per-class VAD rows and negative mask
+    by_class = np.zeros_like(weights)
+    np.put_along_axis(by_class, order, weights, axis=1)
+    totals = by_class.sum(axis=1, keepdims=True)
+    v_a_d = np.full((by_class.shape[0], 3), 0.5)
+    np.divide(by_class @ vad, totals, out=v_a_d, where=totals > 0)
+    neg_sum = by_class @ neg
+    stress = np.clip(0.6 * (1.0 - v_a_d[:, 0]) + 0.4 * v_a_d[:, 1] + 0.15 * neg_sum, 0.0, 1.0)
+    levels = np.where(stress < 0.33, "low", np.where(stress < 0.66, "medium", "high")).tolist()
+
+    results: List[Tuple[List[Tuple[str, float]], float, float, float, float, str]] = []
+    for o, w, k, (v, a, d), st, level in zip(
+        order.tolist(), weights.tolist(), keep.tolist(), v_a_d.tolist(), stress.tolist(), levels
+    ):
+        pairs = [(names[c], s) for c, s, kk in zip(o, w, k) if kk]
+        results.append((pairs, v, a, d, st, level))
+    return results
+
+
 def get_vad_status() -> Dict[str, Any]:
     """Return snapshot of current VAD/negative labels status.
     If not initialized yet, ensure default mapper, and return current snapshot.
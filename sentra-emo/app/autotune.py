@@ -0,0 +1,279 @@
+"""CPU autotuning of torch intra-op threads x batch size per local model.
+
+With EMO_ENGINE=onnx the thread count is fixed when an onnxruntime session is created, so each
+thread count is measured on a fresh session built with it.
+
+Each combination runs short benchmarks on synthetic texts; the best one (highest throughput
+whose p95 batch latency stays within EMO_AUTOTUNE_MAX_BATCH_MS) is saved per host and model
+in EMO_AUTOTUNE_PATH and reused by later startups with the same thread cap, batch size
+candidates and latency budget. Thread counts are capped so that all concurrently running
+inference workers together don't exceed the CPU count.
+
+  python -m app.autotune            # tune (or show saved results) for the configured models
+  python -m app.autotune --force    # re-benchmark
+"""
+from __future__ import annotations
+
+import argparse
+import json
+import logging
+import multiprocessing
+import os
+import platform
+import random
+import socket
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Optional
+
+from .config import (
+    get_autotune_batch_sizes,
+    get_autotune_max_batch_ms,
+    get_autotune_path,
+    get_infer_processes,
+    get_infer_workers,
+    is_parallel_models_enabled,
+)
+from .models import ModelManager, set_thread_budget
+
+logger = logging.getLogger(__name__)
+
+_TRIAL_SEC = 0.3
+_MIN_ITERATIONS = 3
+# Characters for synthetic inputs: common Chinese chars, punctuation and ASCII letters
+_CHARS = "今天我们你他她这那是不了的很好太真心情开难过生气担忧害怕喜欢讨厌工作学习朋友家人时间事情觉得希望因为所以但是还有没什么怎样为啥吧呢啊吗嗯哈 ,.!?，。！？abcdefghijklmnopqrstuvwxyz"
+
+
+def host_key() -> str:
+    return f"{socket.gethostname()}/{platform.machine()}/{os.cpu_count() or 1}cpu"
+
+
+def thread_cap() -> int:
+    """Most torch threads one inference worker may use without oversubscribing the CPUs."""
+    lanes = get_infer_processes() or get_infer_workers()
+    if is_parallel_models_enabled():
+        lanes *= 2
+    return max(1, (os.cpu_count() or 1) // max(1, lanes))
+
+
+def thread_candidates(cap: int) -> List[int]:
+    out = {cap}
+    n = 1
+    while n < cap:
+        out.add(n)
+        n *= 2
+    return sorted(out)
+
+
+def synthetic_texts(rng: random.Random, n: int, length: Optional[int] = None) -> List[str]:
+    """Chat-like inputs of 8-64 characters (or exactly `length`); fresh texts each batch so the token cache doesn't help."""
+    return ["".join(rng.choice(_CHARS) for _ in range(length or rng.randint(8, 64))) for _ in range(n)]
+
+
+_CJK = "".join(c for c in _CHARS if "\u4e00" <= c <= "\u9fff")
+
+
+def token_length_texts(rng: random.Random, n: int, tokens: int, tokenizer: Any = None) -> List[str]:
+    """`n` texts that encode to `tokens` tokens with `tokenizer`, special tokens included.
+
+    Built from CJK characters (one token each in Chinese BERT-style vocabularies, so usually
+    right first time), rescaled by the measured tokens per character otherwise. Without a
+    tokenizer: `tokens` characters.
+    """
+    if tokenizer is None:
+        return synthetic_texts(rng, n, tokens)
+    special = tokenizer.num_special_tokens_to_add()
+    want = max(1, tokens - special)
+    out: List[str] = []
+    for _ in range(n):
+        chars = want
+        for _ in range(4):
+            text = "".join(rng.choice(_CJK) for _ in range(chars))
+            got = len(tokenizer(text)["input_ids"]) - special
+            if got == want:
+                break
+            chars = max(1, round(chars * want / max(1, got)))
+        out.append(text)
+    return out
+
+
+def _trial(run_batch: Callable[[List[str]], Any], rng: random.Random, batch_size: int) -> Dict[str, float]:
+    run_batch(synthetic_texts(rng, batch_size))  # warm-up for this shape
+    times: List[float] = []
+    t_end = time.perf_counter() + _TRIAL_SEC
+    while len(times) < _MIN_ITERATIONS or time.perf_counter() < t_end:
+        texts = synthetic_texts(rng, batch_size)
+        t0 = time.perf_counter()
+        run_batch(texts)
+        times.append((time.perf_counter() - t0) * 1000.0)
+    times.sort()
+    total_sec = sum(times) / 1000.0
+    return {
+        "texts_per_sec": (batch_size * len(times) / total_sec) if total_sec > 0 else 0.0,
+        "batch_ms_p50": times[int(0.50 * (len(times) - 1))],
+        "batch_ms_p95": times[int(0.95 * (len(times) - 1))],
+    }
+
+
+def benchmark(
+    run_batch: Callable[[List[str]], Any],
+    threads: List[int],
+    batch_sizes: List[int],
+    on_threads: Optional[Callable[[int], None]] = None,
+) -> List[Dict[str, Any]]:
+    """Time every threads x batch size combination (on a dedicated thread, so the caller's
+    torch thread setting is left alone). `on_threads(t)` runs before the trials of each thread count."""
+
+    def _run() -> List[Dict[str, Any]]:
+        rng = random.Random(0)
+        results: List[Dict[str, Any]] = []
+        for t in threads:
+            set_thread_budget(t)
+            if on_threads is not None:
+                on_threads(t)
+            for bs in batch_sizes:
+                results.append({"threads": t, "batch_size": bs, **_trial(run_batch, rng, bs)})
+        return results
+
+    with ThreadPoolExecutor(max_workers=1, thread_name_prefix="emo-autotune") as ex:
+        return ex.submit(_run).result()
+
+
+def choose(results: List[Dict[str, Any]], max_batch_ms: float) -> Dict[str, Any]:
+    """Highest throughput within the latency budget (fewer threads on ties); lowest latency if none fits."""
+    within = [r for r in results if r["batch_ms_p95"] <= max_batch_ms]
+    if within:
+        return max(within, key=lambda r: (round(r["texts_per_sec"], 1), -r["threads"]))
+    return min(results, key=lambda r: r["batch_ms_p95"])
+
+
+class AutotuneStore:
+    """Saved results: {"<host>|<kind>|<model>|<engine>|<quantization>": result}."""
+
+    def __init__(self, path: Path) -> None:
+        self.path = Path(path)
+        self._lock = threading.Lock()
+
+    def _read(self) -> Dict[str, Any]:
+        try:
+            data = json.loads(self.path.read_text(encoding="utf-8"))
+            return data if isinstance(data, dict) else {}
+        except Exception:  # noqa: BLE001
+            return {}
+
+    def get(self, key: str) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            return self._read().get(key)
+
+    def put(self, key: str, result: Dict[str, Any]) -> None:
+        with self._lock:
+            data = self._read()
+            data[key] = result
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            tmp = self.path.with_name(f"{self.path.name}.{os.getpid()}.tmp")
+            tmp.write_text(json.dumps(data, ensure_ascii=False, indent=2), encoding="utf-8")
+            os.replace(tmp, self.path)
+
+
+def autotune_model(manager: ModelManager, kind: str, *, force: bool = False, store: Optional[AutotuneStore] = None) -> Dict[str, Any]:
+    """Saved or freshly benchmarked {threads, batch_size, ...} for one loaded model."""
+    store = store or AutotuneStore(get_autotune_path())
+    pipe, mid = manager.ensure_sentiment() if kind == "sentiment" else manager.ensure_emotion()
+    cap = thread_cap()
+    key = "|".join([host_key(), kind, str(mid), manager.engine, str(getattr(pipe, "quantization", None) or "fp32")])
+    batch_sizes = get_autotune_batch_sizes()
+    max_batch_ms = get_autotune_max_batch_ms()
+    saved = None if force else store.get(key)
+    if (
+        saved
+        # results saved before ONNX trials got one session per thread count have no "engine"
+        and saved.get("engine") == manager.engine
+        and saved.get("max_threads") == cap
+        and saved.get("batch_sizes") == batch_sizes
+        and saved.get("max_batch_ms") == max_batch_ms
+    ):
+        return {**saved, "source": "saved"}
+
+    run_batch = manager.analyze_sentiment_batch if kind == "sentiment" else manager.analyze_emotions_batch
+    session = getattr(pipe, "onnx_session", None)
+    on_threads = None
+    if session is not None:
+        from .onnx_engine import OnnxSession
+
+        def on_threads(t: int) -> None:
+            pipe.onnx_session = OnnxSession(session.path, threads=t)
+
+    t0 = time.perf_counter()
+    try:
+        results = benchmark(run_batch, thread_candidates(cap), batch_sizes, on_threads)
+    finally:
+        if session is not None:
+            # Fresh and lazy, so serving builds its session with the thread budget applied after tuning
+            pipe.onnx_session = OnnxSession(session.path, threads=session.threads)
+    best = choose(results, max_batch_ms)
+    result = {
+        "threads": best["threads"],
+        "batch_size": best["batch_size"],
+        "texts_per_sec": best["texts_per_sec"],
+        "batch_ms_p95": best["batch_ms_p95"],
+        "engine": manager.engine,
+        "max_threads": cap,
+        "batch_sizes": batch_sizes,
+        "max_batch_ms": max_batch_ms,
+        "tuned_at": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "tune_sec": time.perf_counter() - t0,
+        "trials": results,
+    }
+    try:
+        store.put(key, result)
+    except Exception as e:  # noqa: BLE001
+        logger.warning(f"Failed to save autotune result to {store.path}: {e}")
+    logger.info(
+        f"Autotuned {kind} model {mid}: threads={result['threads']} batch_size={result['batch_size']} "
+        f"({result['texts_per_sec']:.1f} texts/s, p95 {result['batch_ms_p95']:.1f} ms) in {result['tune_sec']:.1f}s"
+    )
+    return {**result, "source": "benchmark"}
+
+
+def _autotune_child(engine: str, model_ids: Dict[str, str], force: bool) -> Dict[str, Dict[str, Any]]:
+    manager = ModelManager(engine=engine)
+    for kind, mid in model_ids.items():
+        manager.install(kind, manager.load_model(kind, mid))
+    return {kind: autotune_model(manager, kind, force=force) for kind in model_ids}
+
+
+def autotune_in_subprocess(manager: ModelManager, force: bool = False) -> Dict[str, Dict[str, Any]]:
+    """`autotune_model` for both models, run in a throwaway spawned process on the same model dirs.
+
+    For servers that fork inference workers afterwards: benchmarking in the parent would start
+    its OpenMP thread pools, and children forked after that can hang in their first parallel region.
+    """
+    model_ids = {"sentiment": manager.ensure_sentiment()[1], "emotion": manager.ensure_emotion()[1]}
+    with ProcessPoolExecutor(max_workers=1, mp_context=multiprocessing.get_context("spawn")) as ex:
+        return ex.submit(_autotune_child, manager.engine, model_ids, force).result()
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    ap = argparse.ArgumentParser(description="Benchmark torch threads x batch size for the local models")
+    ap.add_argument("--force", action="store_true", help="re-benchmark even if a saved result exists")
+    ap.add_argument("--kinds", default="sentiment,emotion", help="comma-separated: sentiment,emotion")
+    args = ap.parse_args(argv)
+
+    manager = ModelManager()
+    out: Dict[str, Any] = {"host": host_key(), "path": str(get_autotune_path())}
+    for kind in [k.strip() for k in args.kinds.split(",") if k.strip()]:
+        res = autotune_model(manager, kind, force=args.force)
+        out[kind] = {k: v for k, v in res.items() if k != "trials"}
+        out[kind]["trials"] = [
+            f"threads={r['threads']} batch={r['batch_size']}: {r['texts_per_sec']:.1f} texts/s, p95 {r['batch_ms_p95']:.1f} ms"
+            for r in res.get("trials", [])
+        ]
+    print(json.dumps(out, ensure_ascii=False, indent=2))
+    return 0
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    raise SystemExit(main())
@@ -0,0 +1,139 @@
+import asyncio
+import logging
+import time
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from .executor import InferenceExecutor, InferenceOverloaded
+from .metrics import LATENCY_MS_BOUNDS, Histogram, linear_bounds
+from .timing import collect_spans, merge_spans
+
+logger = logging.getLogger(__name__)
+
+
+class MicroBatcher:
+    """Coalesce concurrent single-item calls into one batched call.
+
+    Callers `await submit(item)`; items arriving within `max_wait_ms` of the first
+    pending item (or until `max_batch_size` is reached) are passed together to
+    `batch_fn(items) -> results` on the inference executor, and each caller gets
+    its own result back. If the batched call fails, its items are retried one at a
+    time, so only callers whose own item fails get an error (an overloaded executor
+    still fails them all). Stage spans of the batched call are added to every caller's request.
+    """
+
+    def __init__(
+        self,
+        name: str,
+        batch_fn: Callable[[List[Any]], List[Any]],
+        executor: InferenceExecutor,
+        max_batch_size: int,
+        max_wait_ms: float,
+    ) -> None:
+        self.name = name
+        self.batch_fn = batch_fn
+        self.executor = executor
+        self.max_batch_size = max(1, int(max_batch_size))
+        self.max_wait_ms = max(0.0, float(max_wait_ms))
+        self._pending: List[Tuple[Any, asyncio.Future]] = []
+        self._timer: Optional[asyncio.TimerHandle] = None
+        # telemetry
+        self._batches = 0
+        self._items = 0
+        self._failed_batches = 0
+        self._sizes = Histogram(linear_bounds(0.0, 1.0, self.max_batch_size))
+        self._batch_ms = Histogram(LATENCY_MS_BOUNDS)
+
+    async def submit(self, item: Any) -> Any:
+        loop = asyncio.get_running_loop()
+        fut: asyncio.Future = loop.create_future()
+        self._pending.append((item, fut))
+        if len(self._pending) >= self.max_batch_size:
+            self._flush()
+        elif self._timer is None:
+            self._timer = loop.call_later(self.max_wait_ms / 1000.0, self._flush)
+        res, spans = await fut
+        merge_spans(spans)
+        return res
+
+    def _flush(self) -> None:
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        # Drop callers that went away while waiting for the window to close
+        batch = [(it, f) for it, f in self._pending if not f.done()]
+        self._pending = []
+        if batch:
+            asyncio.ensure_future(self._run(batch))
+
+    def _call(self, items: List[Any]) -> Tuple[List[Any], Dict[str, float]]:
+        results, spans = collect_spans(self.batch_fn, items)
+        if len(results) != len(items):
+            raise RuntimeError(f"{self.name} batch returned {len(results)} results for {len(items)} items")
+        return results, spans
+
+    def _call_each(self, items: List[Any]) -> List[Any]:
+        """Retry path: one call per item; returns (result, spans) or the exception per item."""
+        out: List[Any] = []
+        for it in items:
+            try:
+                results, spans = self._call([it])
+                out.append((results[0], spans))
+            except Exception as e:  # noqa: BLE001
+                out.append(e)
+        return out
+
+    @staticmethod
+    def _fail(batch: List[Tuple[Any, asyncio.Future]], e: BaseException) -> None:
+        for _, fut in batch:
+            if not fut.done():
+                fut.set_exception(e)
+
+    async def _run(self, batch: List[Tuple[Any, asyncio.Future]]) -> None:
+        items = [it for it, _ in batch]
+        t0 = time.perf_counter()
+        outcomes: List[Any]
+        try:
+            results, spans = await self.executor.run(self._call, items)
+            outcomes = [(res, spans) for res in results]
+        except InferenceOverloaded as e:
+            self._failed_batches += 1
+            self._fail(batch, e)
+            return
+        except Exception as e:  # noqa: BLE001
+            self._failed_batches += 1
+            if len(items) == 1:
+                self._fail(batch, e)
+                return
+            logger.warning("%s micro-batch of %d failed, retrying per item: %s", self.name, len(items), e)
+            try:
+                outcomes = await self.executor.run(self._call_each, items)
+            except Exception as e2:  # noqa: BLE001
+                self._fail(batch, e2)
+                return
+        finally:
+            self._batches += 1
+            self._items += len(items)
+            self._sizes.observe(len(items))
+            self._batch_ms.observe((time.perf_counter() - t0) * 1000.0)
+        for (_, fut), out in zip(batch, outcomes):
+            if fut.done():
+                continue
+            if isinstance(out, Exception):
+                fut.set_exception(out)
+            else:
+                fut.set_result(out)
+
+    def stats(self) -> Dict[str, Any]:
+        sizes = self._sizes.snapshot()
+        times = self._batch_ms.snapshot()
+        return {
+            "max_batch_size": self.max_batch_size,
+            "max_wait_ms": self.max_wait_ms,
+            "pending": len(self._pending),
+            "batches": self._batches,
+            "items": self._items,
+            "failed_batches": self._failed_batches,
+            "avg_batch_size": sizes.mean(),
+            "max_batch_size_seen": int(sizes.max) if sizes.count else None,
+            "avg_batch_ms": times.mean(),
+        }
@@ -0,0 +1,111 @@
+import hashlib
+import sys
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Hashable, Optional
+
+
+def normalize_text(text: str) -> str:
+    """Cache-key normalisation: trim and collapse internal whitespace."""
+    return " ".join(str(text or "").split())
+
+
+def text_digest(text: str) -> bytes:
+    """Fixed-size digest of the normalised text so long messages don't bloat cache keys."""
+    return hashlib.blake2b(normalize_text(text).encode("utf-8", errors="ignore"), digest_size=16).digest()
+
+
+def approx_size(obj: Any) -> int:
+    """Rough deep size in bytes of plain containers (dict/list/tuple/str/numbers)."""
+    size = sys.getsizeof(obj)
+    if isinstance(obj, dict):
+        for k, v in obj.items():
+            size += approx_size(k) + approx_size(v)
+    elif isinstance(obj, (list, tuple)):
+        for v in obj:
+            size += approx_size(v)
+    return size
+
+
+class LRUCache:
+    """Thread-safe LRU cache bounded by approximate memory, with a per-entry TTL.
+
+    - `max_bytes`: least recently used entries are evicted once the estimated total size exceeds it.
+    - `ttl_sec`: entries older than this are treated as misses and dropped (0 disables expiry).
+    """
+
+    def __init__(self, max_bytes: int, ttl_sec: float, *, enabled: bool = True) -> None:
+        self.enabled = bool(enabled) and max_bytes > 0
+        self.max_bytes = max(0, int(max_bytes))
+        self.ttl_sec = max(0.0, float(ttl_sec))
+        self._data: "OrderedDict[Hashable, tuple[Any, int, float]]" = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self._hits = 0
+        self._misses = 0
+        self._evictions = 0
+        self._expirations = 0
+        self._inserts = 0
+
+    def get(self, key: Hashable) -> Optional[Any]:
+        if not self.enabled:
+            return None
+        now = time.monotonic()
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None:
+                self._misses += 1
+                return None
+            value, size, stored_at = entry
+            if self.ttl_sec > 0 and (now - stored_at) > self.ttl_sec:
+                del self._data[key]
+                self._bytes -= size
+                self._expirations += 1
+                self._misses += 1
+                return None
+            self._data.move_to_end(key)
+            self._hits += 1
+            return value
+
+    def put(self, key: Hashable, value: Any, *, size: Optional[int] = None) -> None:
+        """Insert `value`; `size` overrides the estimate for values approx_size can't measure (e.g. tensors)."""
+        if not self.enabled:
+            return
+        size = approx_size(key) + (approx_size(value) if size is None else int(size))
+        if size > self.max_bytes:
+            return
+        now = time.monotonic()
+        with self._lock:
+            old = self._data.pop(key, None)
+            if old is not None:
+                self._bytes -= old[1]
+            self._data[key] = (value, size, now)
+            self._bytes += size
+            self._inserts += 1
+            while self._bytes > self.max_bytes and self._data:
+                _, (_, evicted_size, _) = self._data.popitem(last=False)
+                self._bytes -= evicted_size
+                self._evictions += 1
+
+    def clear(self) -> None:
+        with self._lock:
+            self._data.clear()
+            self._bytes = 0
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            lookups = self._hits + self._misses
+            return {
+                "enabled": self.enabled,
+                "entries": len(self._data),
+                "bytes": self._bytes,
+                "max_bytes": self.max_bytes,
+                "ttl_sec": self.ttl_sec,
+                "hits": self._hits,
+                "misses": self._misses,
+                "hit_rate": (self._hits / lookups) if lookups else None,
+                "evictions": self._evictions,
+                "expirations": self._expirations,
+                "inserts": self._inserts,
+            }
@@ -1,7 +1,7 @@
 import os
 from pathlib import Path
-from typing import Any
-from dotenv import load_dotenv
+from typing import Any, List
+from dotenv import dotenv_values, load_dotenv
 
 # Load .env from project root if present
 PROJECT_ROOT = Path(__file__).resolve().parents[1]
@@ -124,6 +124,14 @@ def get_vad_config_paths(emotion_model_dir: Path) -> dict[str, Path | None]:
     return {"map": chosen_map, "alias": chosen_alias, "unknown": unknown_out}
 
 
+def get_vad_watch_interval_sec() -> float:
+    """How often (seconds) VAD map/alias/negative files are re-checked for changes. 0 disables. Default: 10."""
+    try:
+        return max(0.0, float(os.getenv("EMO_VAD_WATCH_SEC", "10")))
+    except Exception:
+        return 10.0
+
+
 def get_negative_config_paths(emotion_model_dir: Path) -> dict[str, Path | None]:
     """Return candidate paths for negative emotions JSON list.
     Priority (first existing wins):
@@ -207,6 +215,34 @@ def get_model_selector(kind: str) -> str | None:
     return val or None
 
 
+def reload_model_selectors() -> None:
+    """Re-read SENTRA_SENTIMENT_MODEL / SENTRA_EMOTION_MODEL from .env (for the model hot-swap watcher).
+    Keys missing from .env keep their current value."""
+    try:
+        values = dotenv_values(PROJECT_ROOT / ".env")
+    except Exception:
+        return
+    for key in ("SENTRA_SENTIMENT_MODEL", "SENTRA_EMOTION_MODEL"):
+        v = values.get(key)
+        if v is not None:
+            os.environ[key] = v
+
+
+def get_model_watch_interval_sec() -> float:
+    """How often (seconds) the model selection (priority.txt, selectors in .env) is re-checked and a
+    changed model hot-swapped in. 0 disables. Default: 10."""
+    try:
+        return max(0.0, float(os.getenv("EMO_MODEL_WATCH_SEC", "10")))
+    except Exception:
+        return 10.0
+
+
+def get_admin_token() -> str | None:
+    """Token required in the X-Admin-Token header of /admin endpoints. Empty: /admin endpoints are disabled."""
+    v = os.getenv("EMO_ADMIN_TOKEN", "").strip()
+    return v or None
+
+
 def is_emotion_multi_label() -> bool:
     """Whether to treat emotion task as multi-label (sigmoid) at inference.
     Default: true.
@@ -450,3 +486,363 @@ def get_nlpcloud_config() -> dict[str, Any]:
         "gpu": gpu,
         "token_cooldown": cooldown,
     }
+
+
+# ----- Inference executor / admission control -----
+def get_infer_workers() -> int:
+    """Number of threads in the dedicated inference executor. Default: 1.
+    Each worker runs one forward pass at a time; torch itself still uses its intra-op threads.
+    """
+    try:
+        return max(1, int(os.getenv("EMO_INFER_WORKERS", "1")))
+    except Exception:
+        return 1
+
+
+def get_infer_queue_size() -> int:
+    """Max pending inference tasks (queued + running) before new requests are rejected. Default: 64."""
+    try:
+        return max(1, int(os.getenv("EMO_INFER_QUEUE_SIZE", "64")))
+    except Exception:
+        return 64
+
+
+def get_infer_queue_timeout_ms() -> float:
+    """Drop tasks that waited longer than this in the queue before starting (0 disables). Default: 0."""
+    try:
+        return max(0.0, float(os.getenv("EMO_INFER_QUEUE_TIMEOUT_MS", "0")))
+    except Exception:
+        return 0.0
+
+
+def get_infer_overload_status() -> int:
+    """HTTP status returned when the inference queue is full: 429 or 503. Default: 503."""
+    try:
+        v = int(os.getenv("EMO_INFER_OVERLOAD_STATUS", "503"))
+    except Exception:
+        return 503
+    return v if v in {429, 503} else 503
+
+
+def get_batch_size() -> int:
+    """Default sub-batch size for /analyze/batch forward passes. Default: 32."""
+    try:
+        return max(1, int(os.getenv("EMO_BATCH_SIZE", "32")))
+    except Exception:
+        return 32
+
+
+# Hard upper bound for client-supplied batch_size (request validation); EMO_MAX_BATCH_SIZE can only lower it
+BATCH_SIZE_LIMIT = 1024
+
+
+def get_max_batch_size() -> int:
+    """Max sub-batch size a client may request on /analyze/batch and /analyze/stream. Default: 256."""
+    try:
+        return min(BATCH_SIZE_LIMIT, max(1, int(os.getenv("EMO_MAX_BATCH_SIZE", "256"))))
+    except Exception:
+        return 256
+
+
+def get_stream_max_line_bytes() -> int:
+    """Max size of one NDJSON line accepted by /analyze/stream; longer lines are reported and skipped. Default: 64 KiB."""
+    try:
+        return max(1024, int(os.getenv("EMO_STREAM_MAX_LINE_BYTES", "65536")))
+    except Exception:
+        return 65536
+
+
+# ----- Micro-batching for single-text /analyze -----
+def is_microbatch_enabled() -> bool:
+    """Whether concurrent /analyze calls are merged into batched forward passes (local backend). Default: true."""
+    v = os.getenv("EMO_MICROBATCH", "true").strip().lower()
+    return v in {"1", "true", "yes", "on"}
+
+
+def get_microbatch_max_size() -> int:
+    """Max number of texts merged into one forward pass per model. Default: 16."""
+    try:
+        return max(1, int(os.getenv("EMO_MICROBATCH_MAX_SIZE", "16")))
+    except Exception:
+        return 16
+
+
+def get_microbatch_wait_ms() -> float:
+    """Max time the first text of a micro-batch waits for others to join. Default: 5 ms."""
+    try:
+        return max(0.0, float(os.getenv("EMO_MICROBATCH_WAIT_MS", "5")))
+    except Exception:
+        return 5.0
+
+
+# ----- Multi-process inference workers -----
+def get_infer_processes() -> int:
+    """Number of forked inference worker processes sharing the loaded weights (0 = in-process inference). Default: 0."""
+    try:
+        return max(0, int(os.getenv("EMO_INFER_PROCESSES", "0")))
+    except Exception:
+        return 0
+
+
+def get_infer_process_threads() -> int:
+    """Torch intra-op threads per worker process; 0 (default) splits the CPU cores evenly across workers."""
+    try:
+        n = int(os.getenv("EMO_INFER_PROCESS_THREADS", "0"))
+    except Exception:
+        n = 0
+    if n > 0:
+        return n
+    return max(1, (os.cpu_count() or 1) // max(1, get_infer_processes()))
+
+
+# ----- Inference engine -----
+def get_engine() -> str:
+    """Local inference engine: torch (eager PyTorch) or onnx (exported once, run with onnxruntime on CPU). Default: torch."""
+    v = os.getenv("EMO_ENGINE", "torch").strip().lower()
+    if v in {"torch", "onnx"}:
+        return v
+    return "torch"
+
+
+def get_model_quantize(kind: str) -> str:
+    """Quantisation of one local model: off or int8 (dynamic int8 Linear layers, CPU only).
+
+    EMO_SENTIMENT_QUANTIZE / EMO_EMOTION_QUANTIZE override EMO_QUANTIZE. Default: off.
+    """
+    key = "EMO_SENTIMENT_QUANTIZE" if kind == "sentiment" else "EMO_EMOTION_QUANTIZE"
+    v = (os.getenv(key, "").strip() or os.getenv("EMO_QUANTIZE", "off")).strip().lower()
+    if v in {"int8", "on", "true", "1"}:
+        return "int8"
+    return "off"
+
+
+# ----- Tokenisation cache -----
+def is_token_cache_enabled() -> bool:
+    """Whether encoded model inputs are cached per text (shared when both models use the same tokenizer). Default: true."""
+    return os.getenv("EMO_TOKEN_CACHE", "true").strip().lower() in {"1", "true", "yes", "on"}
+
+
+def get_token_cache_max_mb() -> float:
+    """Memory budget of the tokenisation cache in MB. Default: 32."""
+    try:
+        return max(0.0, float(os.getenv("EMO_TOKEN_CACHE_MAX_MB", "32")))
+    except Exception:
+        return 32.0
+
+
+# ----- Truncation / length bucketing -----
+def get_model_max_length(kind: str) -> int:
+    """Token limit per model (EMO_SENTIMENT_MAX_LENGTH / EMO_EMOTION_MAX_LENGTH); longer inputs are truncated.
+
+    0 (default) uses the model's own limit (max_position_embeddings / tokenizer model_max_length).
+    """
+    key = "EMO_SENTIMENT_MAX_LENGTH" if kind == "sentiment" else "EMO_EMOTION_MAX_LENGTH"
+    try:
+        return max(0, int(os.getenv(key, "0")))
+    except Exception:
+        return 0
+
+
+def get_length_buckets() -> List[int]:
+    """Token-length bucket edges for batched inference (EMO_LENGTH_BUCKETS, comma-separated).
+
+    Texts in one batch are grouped by these edges and each group runs as its own forward pass,
+    so short messages aren't padded to the longest. Empty or "off" disables. Default: 16,32,64,128,256.
+    """
+    raw = os.getenv("EMO_LENGTH_BUCKETS", "16,32,64,128,256").strip().lower()
+    if raw in {"", "off", "false", "0", "none"}:
+        return []
+    edges: List[int] = []
+    for part in raw.split(","):
+        try:
+            v = int(part.strip())
+        except Exception:
+            continue
+        if v > 0:
+            edges.append(v)
+    return sorted(set(edges))
+
+
+# ----- Parallel sentiment / emotion models -----
+def is_parallel_models_enabled() -> bool:
+    """Run the sentiment and emotion models concurrently, each on its own executor. Default: false."""
+    return os.getenv("EMO_PARALLEL_MODELS", "false").strip().lower() in {"1", "true", "yes", "on"}
+
+
+def get_model_threads(kind: str) -> int:
+    """Torch intra-op threads for one model's workers in parallel mode (EMO_SENTIMENT_THREADS / EMO_EMOTION_THREADS).
+
+    0 (default) splits the CPU cores evenly between the two models.
+    """
+    key = "EMO_SENTIMENT_THREADS" if kind == "sentiment" else "EMO_EMOTION_THREADS"
+    try:
+        n = int(os.getenv(key, "0"))
+    except Exception:
+        n = 0
+    if n > 0:
+        return n
+    return max(1, (os.cpu_count() or 2) // 2)
+
+
+# ----- Stage timing -----
+def is_server_timing_enabled() -> bool:
+    """Attach a Server-Timing header with per-stage durations to responses. Default: true."""
+    return os.getenv("EMO_SERVER_TIMING", "true").strip().lower() in {"1", "true", "yes", "on"}
+
+
+# ----- Result cache -----
+def is_result_cache_enabled() -> bool:
+    """Whether repeated texts reuse cached model outputs. Default: true."""
+    v = os.getenv("EMO_RESULT_CACHE", "true").strip().lower()
+    return v in {"1", "true", "yes", "on"}
+
+
+def get_result_cache_max_mb() -> float:
+    """Approximate memory budget of the result cache in MB. Default: 64."""
+    try:
+        return max(0.0, float(os.getenv("EMO_RESULT_CACHE_MAX_MB", "64")))
+    except Exception:
+        return 64.0
+
+
+def get_result_cache_ttl_sec() -> float:
+    """Time-to-live of cached results in seconds (0 = no expiry). Default: 600."""
+    try:
+        return max(0.0, float(os.getenv("EMO_RESULT_CACHE_TTL_SEC", "600")))
+    except Exception:
+        return 600.0
+
+
+# ----- Fire-and-forget ingest -----
+def get_ingest_queue_path() -> Path:
+    """DuckDB file backing the durable /ingest queue. Default: <USER_STORE_DIR>/ingest_queue.duckdb."""
+    v = os.getenv("EMO_INGEST_QUEUE_PATH", "").strip()
+    if not v:
+        return get_user_store_dir() / "ingest_queue.duckdb"
+    p = Path(v)
+    if not p.is_absolute():
+        p = PROJECT_ROOT / v
+    return p
+
+
+def get_ingest_queue_size() -> int:
+    """Max messages waiting in the ingest queue before /ingest is rejected. Default: 10000."""
+    try:
+        return max(1, int(os.getenv("EMO_INGEST_QUEUE_SIZE", "10000")))
+    except Exception:
+        return 10000
+
+
+def get_ingest_batch_size() -> int:
+    """Messages analysed per background batch. Default: 32."""
+    try:
+        return max(1, int(os.getenv("EMO_INGEST_BATCH_SIZE", "32")))
+    except Exception:
+        return 32
+
+
+def get_ingest_max_attempts() -> int:
+    """Failed attempts after which an ingest message is moved to the dead-letter table. Default: 5."""
+    try:
+        return max(1, int(os.getenv("EMO_INGEST_MAX_ATTEMPTS", "5")))
+    except Exception:
+        return 5
+
+
+def get_ingest_idempotency_ttl_sec() -> float:
+    """How long idempotency keys are remembered in seconds (0 = forever). Default: 86400."""
+    try:
+        return max(0.0, float(os.getenv("EMO_INGEST_IDEMPOTENCY_TTL_SEC", "86400")))
+    except Exception:
+        return 86400.0
+
+
+# ----- CPU autotuning -----
+def get_autotune_mode() -> str:
+    """Startup autotuning of torch threads x batch size: off | on (reuse the saved result for this
+    host and model, benchmark only when missing) | force (always re-benchmark). Default: off."""
+    v = os.getenv("EMO_AUTOTUNE", "off").strip().lower()
+    if v in {"on", "true", "1", "yes"}:
+        return "on"
+    if v == "force":
+        return "force"
+    return "off"
+
+
+def get_autotune_path() -> Path:
+    """JSON file with saved autotune results. Default: <USER_STORE_DIR>/autotune.json."""
+    v = os.getenv("EMO_AUTOTUNE_PATH", "").strip()
+    if not v:
+        return get_user_store_dir() / "autotune.json"
+    p = Path(v)
+    if not p.is_absolute():
+        p = PROJECT_ROOT / v
+    return p
+
+
+def get_autotune_batch_sizes() -> List[int]:
+    """Batch sizes tried by the autotuner (EMO_AUTOTUNE_BATCH_SIZES, comma-separated). Default: 1,4,8,16,32."""
+    sizes: List[int] = []
+    for part in os.getenv("EMO_AUTOTUNE_BATCH_SIZES", "1,4,8,16,32").split(","):
+        try:
+            v = int(part.strip())
+        except Exception:
+            continue
+        if v > 0:
+            sizes.append(v)
+    return sorted(set(sizes)) or [1, 4, 8, 16, 32]
+
+
+def get_autotune_max_batch_ms() -> float:
+    """Latency budget for one batch: combinations whose p95 exceeds it are not chosen. Default: 250."""
+    try:
+        return max(1.0, float(os.getenv("EMO_AUTOTUNE_MAX_BATCH_MS", "250")))
+    except Exception:
+        return 250.0
+
+
+def is_mmap_weights_enabled() -> bool:
+    """Load safetensors weights as a copy-on-write memory map (shared page cache, no private copy).
+    Falls back to from_pretrained per model when not applicable. Default: true."""
+    v = os.getenv("EMO_MMAP_WEIGHTS", "true").strip().lower()
+    return v in {"1", "true", "yes", "on"}
+
+
+# ----- Warmup -----
+def _positive_ints(raw: str) -> List[int]:
+    out: List[int] = []
+    for part in raw.split(","):
+        try:
+            v = int(part.strip())
+        except Exception:
+            continue
+        if v > 0:
+            out.append(v)
+    return sorted(set(out))
+
+
+def is_warmup_enabled() -> bool:
+    """Run synthetic batches through both models before /ready turns green. Default: true."""
+    v = os.getenv("EMO_WARMUP", "true").strip().lower()
+    return v in {"1", "true", "yes", "on"}
+
+
+def get_warmup_lengths() -> List[int]:
+    """Text lengths in tokens (special tokens included) used for warmup (EMO_WARMUP_LENGTHS,
+    comma-separated), the same unit as EMO_LENGTH_BUCKETS.
+    Empty (default): the length bucket edges, or 16,64,256 when bucketing is off."""
+    return _positive_ints(os.getenv("EMO_WARMUP_LENGTHS", ""))
+
+
+def get_warmup_batch_sizes() -> List[int]:
+    """Batch sizes used for warmup (EMO_WARMUP_BATCH_SIZES, comma-separated).
+    Empty (default): 1, the micro-batch size and the batch endpoint sub-batch size."""
+    return _positive_ints(os.getenv("EMO_WARMUP_BATCH_SIZES", ""))
+
+
+def get_warmup_rounds() -> int:
+    """How many times each warmup shape runs. Default: 2."""
+    try:
+        return max(1, int(os.getenv("EMO_WARMUP_ROUNDS", "2")))
+    except Exception:
+        return 2
@@ -0,0 +1,138 @@
+import asyncio
+import contextvars
+import logging
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Any, Callable, Dict, Optional
+
+from .metrics import LATENCY_MS_BOUNDS, HistogramSnapshot, RecentHistogram
+
+logger = logging.getLogger(__name__)
+
+
+class InferenceOverloaded(RuntimeError):
+    """Raised when the inference executor cannot accept or start a task in time."""
+
+    def __init__(self, message: str, *, retry_after_sec: float = 1.0) -> None:
+        super().__init__(message)
+        self.retry_after_sec = float(retry_after_sec)
+
+
+class InferenceExecutor:
+    """Dedicated thread pool for model inference with a bounded admission queue.
+
+    - At most `max_workers` tasks run concurrently (the forward passes).
+    - At most `max_queue` tasks may be pending (queued + running); further submits
+      are rejected immediately with InferenceOverloaded instead of piling up latency.
+    - Optional `queue_timeout_ms`: a task that waited longer than this before it
+      could start is dropped with InferenceOverloaded (0 disables).
+    - Optional `initializer`: called once in each worker thread (e.g. to set its torch thread budget).
+    """
+
+    def __init__(
+        self,
+        name: str,
+        max_workers: int,
+        max_queue: int,
+        queue_timeout_ms: float = 0.0,
+        initializer: Optional[Callable[[], None]] = None,
+    ) -> None:
+        self.name = name
+        self.max_workers = max(1, int(max_workers))
+        self.max_queue = max(self.max_workers, int(max_queue))
+        self.queue_timeout_ms = max(0.0, float(queue_timeout_ms))
+        self._pool = ThreadPoolExecutor(
+            max_workers=self.max_workers, thread_name_prefix=f"emo-{name}", initializer=initializer
+        )
+        self._lock = threading.Lock()
+        self._pending = 0
+        self._running = 0
+        self._submitted = 0
+        self._completed = 0
+        self._rejected = 0
+        self._expired = 0
+        self._busy_sec = 0.0
+        self._started_at = time.perf_counter()
+        self._wait_ms = RecentHistogram(LATENCY_MS_BOUNDS)
+
+    def submit(self, fn: Callable[..., Any], *args: Any, **kwargs: Any) -> Future:
+        with self._lock:
+            if self._pending >= self.max_queue:
+                self._rejected += 1
+                raise InferenceOverloaded(
+                    f"inference queue is full ({self._pending}/{self.max_queue})",
+                    retry_after_sec=1.0,
+                )
+            self._pending += 1
+            self._submitted += 1
+        enqueued_at = time.perf_counter()
+        # Carry the caller's context (request span collector) into the worker thread
+        ctx = contextvars.copy_context()
+
+        def _task():
+            started = time.perf_counter()
+            wait_ms = (started - enqueued_at) * 1000.0
+            self._wait_ms.observe(wait_ms)
+            with self._lock:
+                if self.queue_timeout_ms > 0 and wait_ms > self.queue_timeout_ms:
+                    self._expired += 1
+                    expired = True
+                else:
+                    self._running += 1
+                    expired = False
+            if expired:
+                raise InferenceOverloaded(
+                    f"inference task waited {wait_ms:.0f} ms in queue (limit {self.queue_timeout_ms:.0f} ms)",
+                    retry_after_sec=1.0,
+                )
+            try:
+                return ctx.run(fn, *args, **kwargs)
+            finally:
+                with self._lock:
+                    self._running -= 1
+                    self._busy_sec += time.perf_counter() - started
+
+        fut = self._pool.submit(_task)
+
+        def _done(_f: Future) -> None:
+            # Fires on completion, failure and cancellation (client went away before start)
+            with self._lock:
+                self._pending -= 1
+                self._completed += 1
+
+        fut.add_done_callback(_done)
+        return fut
+
+    async def run(self, fn: Callable[..., Any], *args: Any, **kwargs: Any) -> Any:
+        """Submit `fn` and await its result without blocking the event loop."""
+        return await asyncio.wrap_future(self.submit(fn, *args, **kwargs))
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            pending, running = self._pending, self._running
+            busy = self._busy_sec
+            counters = {
+                "submitted": self._submitted,
+                "completed": self._completed,
+                "rejected": self._rejected,
+                "expired": self._expired,
+            }
+        elapsed = max(1e-9, time.perf_counter() - self._started_at)
+        return {
+            "workers": self.max_workers,
+            "max_queue": self.max_queue,
+            "queue_timeout_ms": self.queue_timeout_ms or None,
+            "queue_depth": max(0, pending - running),
+            "running": running,
+            "utilization": min(1.0, busy / (elapsed * self.max_workers)),
+            "busy_workers_ratio": running / self.max_workers,
+            "wait_ms": self._wait_ms.summary(("avg", "p50", "p95", "p99", "max")),
+            **counters,
+        }
+
+    def wait_histogram(self) -> HistogramSnapshot:
+        return self._wait_ms.snapshot()
+
+    def shutdown(self) -> None:
+        self._pool.shutdown(wait=False, cancel_futures=True)
@@ -0,0 +1,227 @@
+import logging
+import threading
+import time
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Tuple
+
+import duckdb
+
+from .metrics import LATENCY_MS_BOUNDS, Histogram, HistogramSnapshot
+
+logger = logging.getLogger(__name__)
+
+
+class IngestQueueFull(RuntimeError):
+    """Raised when the durable ingest queue already holds its maximum number of messages."""
+
+
+class IngestQueue:
+    """Durable, bounded FIFO of messages waiting for background analysis (DuckDB file).
+
+    - Messages survive restarts; they are deleted only after their user updates were applied
+      (at-least-once: a crash between the two may apply a message twice).
+    - Optional idempotency keys are remembered for `idempotency_ttl_sec`; a repeated key is
+      acknowledged without enqueueing the message again.
+    - `fetch` returns messages in enqueue order, so one consumer keeps per-user order.
+    - Each message counts its failed attempts; after `max_attempts` it is moved to the
+      `ingest_failed` table (dead letters, kept for inspection or manual re-enqueue).
+    """
+
+    def __init__(self, path: Path, max_size: int, idempotency_ttl_sec: float, max_attempts: int = 5) -> None:
+        self.path = Path(path)
+        self.max_size = max(1, int(max_size))
+        self.idempotency_ttl_sec = max(0.0, float(idempotency_ttl_sec))
+        self.max_attempts = max(1, int(max_attempts))
+        self._lock = threading.Lock()
+        self._conn: Optional[duckdb.DuckDBPyConnection] = None
+        self._depth = 0
+        self._last_prune = 0.0
+        # telemetry
+        self._enqueued = 0
+        self._duplicates = 0
+        self._rejected = 0
+        self._processed = 0
+        self._failed = 0
+        self._retries = 0
+        self._dead_lettered = 0
+        self._lag_ms = Histogram(LATENCY_MS_BOUNDS)
+
+    def _connect(self) -> duckdb.DuckDBPyConnection:
+        if self._conn is None:
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            conn = duckdb.connect(str(self.path))
+            conn.execute("CREATE SEQUENCE IF NOT EXISTS ingest_seq")
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS ingest_queue (
+                    seq BIGINT PRIMARY KEY DEFAULT nextval('ingest_seq'),
+                    idem_key VARCHAR,
+                    userid VARCHAR,
+                    username VARCHAR,
+                    text VARCHAR,
+                    enqueued_ts DOUBLE
+                )
+            """)
+            # Queue files from before attempt counting
+            conn.execute("ALTER TABLE ingest_queue ADD COLUMN IF NOT EXISTS attempts INTEGER DEFAULT 0")
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS ingest_failed (
+                    seq BIGINT,
+                    userid VARCHAR,
+                    username VARCHAR,
+                    text VARCHAR,
+                    enqueued_ts DOUBLE,
+                    attempts INTEGER,
+                    error VARCHAR,
+                    failed_ts DOUBLE
+                )
+            """)
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS ingest_keys (
+                    idem_key VARCHAR,
+                    seq BIGINT,
+                    ts DOUBLE
+                )
+            """)
+            self._depth = int(conn.execute("SELECT COUNT(*) FROM ingest_queue").fetchone()[0])
+            self._conn = conn
+        return self._conn
+
+    def open(self) -> int:
+        """Open the queue file; returns the number of messages left over from a previous run."""
+        with self._lock:
+            self._connect()
+            return self._depth
+
+    def enqueue(self, userid: str, username: Optional[str], text: str, idem_key: Optional[str] = None) -> Tuple[int, bool]:
+        """Persist one message. Returns (seq, duplicate); raises IngestQueueFull when at capacity."""
+        now = time.time()
+        with self._lock:
+            conn = self._connect()
+            if idem_key:
+                row = conn.execute(
+                    "SELECT seq FROM ingest_keys WHERE idem_key = ? AND ts >= ? ORDER BY ts DESC LIMIT 1",
+                    [idem_key, now - self.idempotency_ttl_sec if self.idempotency_ttl_sec > 0 else 0.0],
+                ).fetchone()
+                if row is not None:
+                    self._duplicates += 1
+                    return int(row[0]), True
+            if self._depth >= self.max_size:
+                self._rejected += 1
+                raise IngestQueueFull(f"ingest queue is full ({self._depth}/{self.max_size})")
+            conn.execute("BEGIN TRANSACTION")
+            try:
+                seq = int(conn.execute(
+                    "INSERT INTO ingest_queue (idem_key, userid, username, text, enqueued_ts) VALUES (?, ?, ?, ?, ?) RETURNING seq",
+                    [idem_key, userid, username, text, now],
+                ).fetchone()[0])
+                if idem_key:
+                    # No unique index (it makes every insert ~10x slower); uniqueness is checked above under the lock
+                    conn.execute("INSERT INTO ingest_keys VALUES (?, ?, ?)", [idem_key, seq, now])
+                conn.execute("COMMIT")
+            except Exception:
+                conn.execute("ROLLBACK")
+                raise
+            self._depth += 1
+            self._enqueued += 1
+            return seq, False
+
+    def fetch(self, limit: int) -> List[Dict[str, Any]]:
+        """Oldest `limit` messages, without removing them."""
+        with self._lock:
+            rows = self._connect().execute(
+                "SELECT seq, userid, username, text, enqueued_ts, COALESCE(attempts, 0) FROM ingest_queue ORDER BY seq LIMIT ?",
+                [max(1, int(limit))],
+            ).fetchall()
+        return [
+            {"seq": int(r[0]), "userid": r[1], "username": r[2], "text": r[3], "enqueued_ts": float(r[4]), "attempts": int(r[5])}
+            for r in rows
+        ]
+
+    def record_failure(self, message: Dict[str, Any], error: str) -> bool:
+        """Count a failed attempt for `message`; after `max_attempts` move it to `ingest_failed`.
+        Returns True when the message was dead-lettered (it is no longer queued)."""
+        now = time.time()
+        with self._lock:
+            conn = self._connect()
+            conn.execute("BEGIN TRANSACTION")
+            try:
+                row = conn.execute(
+                    "UPDATE ingest_queue SET attempts = COALESCE(attempts, 0) + 1 WHERE seq = ? RETURNING attempts",
+                    [message["seq"]],
+                ).fetchone()
+                dead = row is not None and int(row[0]) >= self.max_attempts
+                if dead:
+                    conn.execute(
+                        "INSERT INTO ingest_failed SELECT seq, userid, username, text, enqueued_ts, attempts, ?, ? "
+                        "FROM ingest_queue WHERE seq = ?",
+                        [error, now, message["seq"]],
+                    )
+                    conn.execute("DELETE FROM ingest_queue WHERE seq = ?", [message["seq"]])
+                conn.execute("COMMIT")
+            except Exception:
+                conn.execute("ROLLBACK")
+                raise
+            if row is None:
+                return False
+            self._retries += 1
+            if dead:
+                self._depth = max(0, self._depth - 1)
+                self._failed += 1
+                self._dead_lettered += 1
+            return dead
+
+    def ack(self, messages: List[Dict[str, Any]], failed: int = 0) -> None:
+        """Delete processed messages and record their end-to-end lag."""
+        if not messages:
+            return
+        now = time.time()
+        seqs = [m["seq"] for m in messages]
+        with self._lock:
+            conn = self._connect()
+            conn.execute(f"DELETE FROM ingest_queue WHERE seq IN ({', '.join('?' * len(seqs))})", seqs)
+            self._depth = max(0, self._depth - len(seqs))
+            self._processed += len(seqs) - failed
+            self._failed += failed
+            for m in messages:
+                self._lag_ms.observe((now - m["enqueued_ts"]) * 1000.0)
+            if self.idempotency_ttl_sec > 0 and now - self._last_prune > 60.0:
+                self._last_prune = now
+                conn.execute("DELETE FROM ingest_keys WHERE ts < ?", [now - self.idempotency_ttl_sec])
+
+    def depth(self) -> int:
+        return self._depth
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            oldest = None
+            if self._conn is not None and self._depth > 0:
+                row = self._conn.execute("SELECT MIN(enqueued_ts) FROM ingest_queue").fetchone()
+                if row and row[0] is not None:
+                    oldest = max(0.0, time.time() - float(row[0]))
+            lags = self._lag_ms.summary()
+
+            return {
+                "depth": self._depth,
+                "max_size": self.max_size,
+                "oldest_age_sec": oldest,
+                "enqueued": self._enqueued,
+                "duplicates": self._duplicates,
+                "rejected": self._rejected,
+                "processed": self._processed,
+                "failed": self._failed,
+                "retries": self._retries,
+                "dead_lettered": self._dead_lettered,
+                "max_attempts": self.max_attempts,
+                "lag_ms": {k: lags[k] for k in ("avg", "p50", "p95", "max")},
+            }
+
+    def lag_histogram(self) -> HistogramSnapshot:
+        return self._lag_ms.snapshot()
+
+    def close(self) -> None:
+        with self._lock:
+            if self._conn is not None:
+                try:
+                    self._conn.close()
+                finally:
+                    self._conn = None
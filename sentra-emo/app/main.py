@@ -1,56 +1,210 @@
+import asyncio
+import functools
+import hmac
+import json
 import logging
-from fastapi import FastAPI, HTTPException
-from fastapi.middleware.cors import CORSMiddleware
-from contextlib import asynccontextmanager
+import random
+import sys
+import threading
 import time
-from typing import List, Optional
 
-from .schemas import AnalyzeRequest, AnalyzeResponse, LabelScore, SentimentResult, VADResult, PADResult, StressResult, BatchAnalyzeRequest, UserState
-from .models import ModelManager
-from .analysis import emotions_to_vad, derive_stress, init_vad_mapper, get_vad_status, canonicalize_distribution, normalize_distribution
-from .config import get_device_report, use_emotion_label_alias, get_emo_backend, get_online_provider, get_nlpcloud_config, get_emotion_min_score
+_import_t0 = time.perf_counter()
+
+import numpy as np
+from fastapi import FastAPI, HTTPException, Request, Response
+from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import PlainTextResponse, StreamingResponse
+from starlette.concurrency import run_in_threadpool
+from pydantic import TypeAdapter
+from contextlib import asynccontextmanager
+from typing import Any, AsyncIterator, Callable, Dict, List, Optional, Tuple, Union
+
+from .schemas import AnalyzeRequest, AnalyzeResponse, LabelScore, SentimentResult, VADResult, PADResult, StressResult, BatchAnalyzeRequest, BatchItemError, StreamAnalyzeItem, UserState, IngestRequest, IngestAccepted
+from .models import EmotionScores, ModelManager, heavy_import_times, set_interop_threads, set_thread_budget
+from .analysis import ensure_vad_mapper, refresh_vad_mapper_if_changed, get_vad_status, postprocess_emotion_scores, postprocess_emotions_batch, swap_vad_mapper
+from .config import (
+    get_device_report,
+    use_emotion_label_alias,
+    get_emo_backend,
+    get_online_provider,
+    get_nlpcloud_config,
+    get_emotion_min_score,
+    get_emotion_threshold,
+    get_emotion_topk,
+    get_sentiment_neutral_mode,
+    is_emotion_multi_label,
+    get_infer_workers,
+    get_infer_queue_size,
+    get_infer_queue_timeout_ms,
+    get_infer_overload_status,
+    is_microbatch_enabled,
+    get_microbatch_max_size,
+    get_microbatch_wait_ms,
+    get_batch_size,
+    get_max_batch_size,
+    get_vad_watch_interval_sec,
+    is_result_cache_enabled,
+    get_result_cache_max_mb,
+    get_result_cache_ttl_sec,
+    get_stream_max_line_bytes,
+    is_parallel_models_enabled,
+    get_model_threads,
+    get_infer_processes,
+    get_infer_process_threads,
+    get_ingest_queue_path,
+    get_ingest_queue_size,
+    get_ingest_batch_size,
+    get_ingest_idempotency_ttl_sec,
+    get_ingest_max_attempts,
+    is_server_timing_enabled,
+    get_autotune_mode,
+    get_model_watch_interval_sec,
+    get_admin_token,
+    reload_model_selectors,
+    get_length_buckets,
+    is_warmup_enabled,
+    get_warmup_lengths,
+    get_warmup_batch_sizes,
+    get_warmup_rounds,
+)
+from .executor import InferenceExecutor, InferenceOverloaded
+from .batching import MicroBatcher
+from .cache import LRUCache, text_digest
 from .user_store import get_store
+from .workers import ProcessInferencePool
+from .autotune import autotune_in_subprocess, autotune_model, host_key, token_length_texts
+from .ingest import IngestQueue, IngestQueueFull
+from .timing import ServerTimingMiddleware, collect_spans_async, merge_spans, span, stages
+from .metrics import LATENCY_MS_BOUNDS, SCORE_BOUNDS, Counter, Histogram, PrometheusWriter, RecentHistogram, WindowedHistogram, process_rss_mb
 
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+# Startup profile shown in /models: import times, model load / autotune / warmup durations
+_startup: Dict[str, Any] = {"import_ms": {"app": (time.perf_counter() - _import_t0) * 1000.0}}
+
 models = ModelManager()
 
+# Settings chosen by the startup autotuner (EMO_AUTOTUNE); empty when it is off
+_autotune: Dict[str, Any] = {}
+# Torch thread budget per executor ("infer", "sentiment", "emotion", "process") from autotuning
+_thread_budget: Dict[str, int] = {}
+# Startup phase reported by /ready: starting -> autotuning -> warming -> ready (or failed), then stopping
+_readiness: Dict[str, Any] = {"phase": "starting", "warmup": None}
+
+
+def _init_inference_thread(name: str) -> None:
+    """Executor thread initializer: autotuned torch thread budget, else the configured one (if any).
+    Online-only deployments never touch torch."""
+    if _online_only():
+        return
+    n = _thread_budget.get(name)
+    if n is None and name in ("sentiment", "emotion"):
+        n = get_model_threads(name)
+    if n is not None:
+        set_thread_budget(n)
+
+
+# Dedicated executor for model inference so forward passes never block the event loop
+inference = InferenceExecutor(
+    "infer",
+    max_workers=max(get_infer_workers(), get_infer_processes()),
+    max_queue=get_infer_queue_size(),
+    queue_timeout_ms=get_infer_queue_timeout_ms(),
+    initializer=functools.partial(_init_inference_thread, "infer"),
+)
+
+
+def _model_executor(kind: str) -> InferenceExecutor:
+    """Executor for one model: its own pool and torch thread budget in parallel mode, else the shared one."""
+    if not is_parallel_models_enabled():
+        return inference
+    return InferenceExecutor(
+        kind,
+        max_workers=max(get_infer_workers(), get_infer_processes()),
+        max_queue=get_infer_queue_size(),
+        queue_timeout_ms=get_infer_queue_timeout_ms(),
+        initializer=functools.partial(_init_inference_thread, kind),
+    )
+
+
+sentiment_inference = _model_executor("sentiment")
+emotion_inference = _model_executor("emotion")
+
+# Forked worker processes for local forward passes (EMO_INFER_PROCESSES > 0); started in lifespan
+worker_pool: Optional[ProcessInferencePool] = None
+
+# Durable queue behind /ingest, drained by a background task started in lifespan
+ingest_queue = IngestQueue(
+    get_ingest_queue_path(), get_ingest_queue_size(), get_ingest_idempotency_ttl_sec(), get_ingest_max_attempts()
+)
+_ingest_wakeup = asyncio.Event()
+
+# Raw model outputs keyed by normalised text + model ids + settings; user updates still run per call
+result_cache = LRUCache(
+    int(get_result_cache_max_mb() * 1024 * 1024),
+    get_result_cache_ttl_sec(),
+    enabled=is_result_cache_enabled(),
+)
+
+# Fixed-bucket histograms: recording is O(1) and lock-safe from any thread, scrapes cost the same
+# regardless of traffic. Latencies and emotion top-1 scores are also kept in a 5-minute ring:
+# /metrics reports the recent windows, Prometheus the cumulative histograms.
 _metrics = {
     "start_time": time.perf_counter(),
-    "inference_latencies_ms": [],  # type: List[float]
-    "inference_count": 0,
-    "error_count": 0,
-    "emotion_top1_scores": [],  # type: List[float]
-    "emotion_top1_times": [],  # type: List[float]
+    "inference_count": Counter(),
+    "error_count": Counter(),
+    "inference_latency_ms": RecentHistogram(LATENCY_MS_BOUNDS),
+    "emotion_top1_score": Histogram(SCORE_BOUNDS),
+    "emotion_top1_score_recent": WindowedHistogram(SCORE_BOUNDS, window_sec=300.0, slot_sec=10.0),
 }
 
 
 def _record_latency_ms(ms: float) -> None:
-    _metrics["inference_count"] += 1
-    buf: List[float] = _metrics["inference_latencies_ms"]
-    buf.append(float(ms))
-    # cap buffer size to avoid unbounded growth
-    if len(buf) > 2000:
-        del buf[: len(buf) - 1000]
+    _metrics["inference_count"].inc()
+    _metrics["inference_latency_ms"].observe(ms)
 
 
-def _percentile(values: List[float], q: float):
-    if not values:
-        return None
-    s = sorted(values)
-    n = len(s)
-    idx = int(q * (n - 1))
-    idx = max(0, min(idx, n - 1))
-    return float(s[idx])
+def _record_error() -> None:
+    _metrics["error_count"].inc()
+
+
+# Per-model forward timings; "combined" is the wall time both models took for the same input
+_model_ms: Dict[str, RecentHistogram] = {
+    "sentiment": RecentHistogram(LATENCY_MS_BOUNDS),
+    "emotion": RecentHistogram(LATENCY_MS_BOUNDS),
+    "combined": RecentHistogram(LATENCY_MS_BOUNDS),
+}
+
+
+def _timed_model(kind: str, fn: Callable[..., Any], *args: Any) -> Any:
+    t0 = time.perf_counter()
+    try:
+        return fn(*args)
+    finally:
+        _model_ms[kind].observe((time.perf_counter() - t0) * 1000.0)
+
+
+def _run_models(sentiment_fn: Callable[[Any], Any], emotion_fn: Callable[[Any], Any], arg: Any) -> Tuple[Any, Any]:
+    """Run the sentiment and emotion functions on `arg` (blocking).
+
+    In parallel mode both run at once on their own executors, so the wall time is close to
+    the slower model instead of the sum; otherwise they run back to back in this thread.
+    """
+    t0 = time.perf_counter()
+    if sentiment_inference is inference:
+        out = (_timed_model("sentiment", sentiment_fn, arg), _timed_model("emotion", emotion_fn, arg))
+    else:
+        sent_f = sentiment_inference.submit(_timed_model, "sentiment", sentiment_fn, arg)
+        emo_f = emotion_inference.submit(_timed_model, "emotion", emotion_fn, arg)
+        out = (sent_f.result(), emo_f.result())
+    _model_ms["combined"].observe((time.perf_counter() - t0) * 1000.0)
+    return out
 
 
 def _record_emotion_top1(score: float) -> None:
-    _metrics["emotion_top1_scores"].append(float(score))
-    _metrics["emotion_top1_times"].append(float(time.perf_counter()))
-    if len(_metrics["emotion_top1_scores"]) > 2000:
-        del _metrics["emotion_top1_scores"][: len(_metrics["emotion_top1_scores"]) - 1000]
-        del _metrics["emotion_top1_times"][: len(_metrics["emotion_top1_times"]) - 1000]
+    _metrics["emotion_top1_score"].observe(score)
+    _metrics["emotion_top1_score_recent"].observe(score)
 
 
 def _analyze_sentiment_with_backend(text: str):
@@ -72,7 +226,7 @@ def _analyze_sentiment_with_backend(text: str):
     # Auto: prefer local, fallback to online
     if mode == "auto" and provider == "nlpcloud":
         try:
-            return models.analyze_sentiment(text)
+            return _sentiment_batch_sync([text])[0]
         except Exception as e:  # noqa: BLE001
             logger.warning("Local sentiment failed in auto mode, falling back to NLP Cloud: %s", e)
             from .online import analyze_sentiment_nlpcloud
@@ -80,7 +234,7 @@ def _analyze_sentiment_with_backend(text: str):
             return analyze_sentiment_nlpcloud(text)
 
     # Default: local backend
-    return models.analyze_sentiment(text)
+    return _sentiment_batch_sync([text])[0]
 
 
 def _analyze_emotions_with_backend(text: str):
@@ -104,7 +258,7 @@ def _analyze_emotions_with_backend(text: str):
     # Auto: prefer local, fallback to online
     if mode == "auto" and provider == "nlpcloud":
         try:
-            return models.analyze_emotions(text)
+            return _emotion_batch_sync([text])[0]
         except Exception as e:  # noqa: BLE001
             logger.warning("Local emotions failed in auto mode, falling back to NLP Cloud: %s", e)
             from .online import analyze_emotions_nlpcloud
@@ -112,53 +266,669 @@ def _analyze_emotions_with_backend(text: str):
             return analyze_emotions_nlpcloud(text)
 
     # Default: local backend
-    return models.analyze_emotions(text)
+    return _emotion_batch_sync([text])[0]
+
+
+def _init_emotion_vad() -> None:
+    """Ensure the local emotion model is loaded and its VAD mapper built (no file I/O once initialized)."""
+    with span("vad_init"):
+        pipe, emo_mid = models.ensure_emotion()
+        labels = models.emotion_labels(pipe)
+        ensure_vad_mapper(emo_mid, labels if labels else None)
+
+
+async def _vad_watch_loop(interval_sec: float) -> None:
+    """Periodically re-stat VAD map files off the request path and reload the mapper on change."""
+    while True:
+        await asyncio.sleep(interval_sec)
+        try:
+            await run_in_threadpool(refresh_vad_mapper_if_changed)
+        except Exception as e:  # noqa: BLE001
+            logger.warning("VAD map refresh failed: %s", e)
+
+
+def _infer_text_sync(text: str, backend_mode: str, provider: Optional[str]) -> Tuple[Dict[str, Any], Any]:
+    """Run the sentiment and emotion models for one text (blocking; runs on the inference executor).
+
+    Returns (sentiment, emotions) before emotion post-processing: local models give
+    `EmotionScores`, the online provider (label, score) pairs.
+    """
+    # Ensure emotion model and VAD mapper only when using local backend.
+    if not (backend_mode == "online" and provider == "nlpcloud"):
+        _init_emotion_vad()
+
+    # Online+NLP Cloud 优化：若情感和情绪使用同一模型，只发一次 HTTP 请求
+    sentiment = None
+    emotions = None
+    if backend_mode == "online" and provider == "nlpcloud":
+        cfg = get_nlpcloud_config()
+        sent_model = cfg.get("sentiment_model")
+        emo_model = cfg.get("emotion_model")
+        same_model = (emo_model is None) or (emo_model == sent_model)
+        if same_model:
+            from .online import analyze_combined_nlpcloud
+
+            sentiment, emotions = analyze_combined_nlpcloud(text)
+
+    if sentiment is None or emotions is None:
+        sentiment, emotions = _run_models(_analyze_sentiment_with_backend, _analyze_emotions_with_backend, text)
+    return sentiment, emotions
+
+
+def _analyze_text_sync(text: str, backend_mode: str, provider: Optional[str]) -> Tuple[Dict[str, Any], List[Tuple[str, float]], float, float, float, float, str]:
+    """Run models and emotion post-processing for one text (blocking; runs on the inference executor).
+
+    Returns (sentiment, canon_pairs, v, a, d, stress, level).
+    """
+    sentiment, emotions = _infer_text_sync(text, backend_mode, provider)
+    canon_pairs, v, a, d, stress, level = _postprocess_emotions(emotions)
+    return sentiment, canon_pairs, v, a, d, stress, level
+
+
+def _postprocess_emotions(emotions: Any) -> Tuple[List[Tuple[str, float]], float, float, float, float, str]:
+    """Label selection, alias canonicalisation, min-score filtering, VAD mapping and stress for one emotion output."""
+    return _postprocess_emotions_batch([emotions])[0]
+
+
+def _postprocess_emotions_batch(emotions: List[Any]) -> List[Tuple[List[Tuple[str, float]], float, float, float, float, str]]:
+    """Post-process a batch of emotion outputs: local model scores (`EmotionScores`) go through the
+    columnar stage one score matrix per label set; online (label, score) pairs through the list path."""
+    # 情绪最小分数阈值过滤仅当配置 > 0 时生效；全部被过滤时保留原分布，避免信息丢失
+    use_alias = use_emotion_label_alias()
+    min_score = get_emotion_min_score()
+    results: List[Any] = [None] * len(emotions)
+    with span("postprocess"):
+        by_labels: Dict[Tuple[str, ...], List[int]] = {}
+        pairs_idx: List[int] = []
+        for i, e in enumerate(emotions):
+            if isinstance(e, EmotionScores):
+                by_labels.setdefault(e.labels, []).append(i)
+            else:
+                pairs_idx.append(i)
+        for labels, idxs in by_labels.items():
+            posts = postprocess_emotion_scores(
+                np.stack([emotions[i].scores for i in idxs]),
+                labels,
+                multi=is_emotion_multi_label(),
+                threshold=get_emotion_threshold(),
+                topk=get_emotion_topk(),
+                use_alias=use_alias,
+                min_score=min_score,
+            )
+            for i, post in zip(idxs, posts):
+                results[i] = post
+        if pairs_idx:
+            posts = postprocess_emotions_batch([emotions[i] for i in pairs_idx], use_alias=use_alias, min_score=min_score)
+            for i, post in zip(pairs_idx, posts):
+                results[i] = post
+    return results
+
+
+def _result_cache_key(text: str, backend_mode: str, provider: Optional[str]) -> Optional[Tuple[Any, ...]]:
+    """Cache key for raw model outputs: normalised text + selected models + settings that shape them.
+
+    Returns None (no caching) until the local models are loaded.
+    """
+    if not result_cache.enabled:
+        return None
+    if backend_mode == "online" and provider == "nlpcloud":
+        cfg = get_nlpcloud_config()
+        source: Tuple[Any, ...] = ("nlpcloud", cfg.get("sentiment_model"), cfg.get("emotion_model"))
+    else:
+        sent_mid, emo_mid = models.model_id("sentiment"), models.model_id("emotion")
+        if not sent_mid or not emo_mid:
+            return None
+        source = ("local", sent_mid, emo_mid)
+    # Emotion threshold / top-k are applied in post-processing, after the cache
+    settings = (is_emotion_multi_label(), get_sentiment_neutral_mode())
+    return (text_digest(text), *source, *settings)
+
+
+def _sentiment_batch_sync(texts: List[str]) -> List[Dict[str, Any]]:
+    """Batched local sentiment (runs on the inference executor, or in a worker process when enabled)."""
+    if worker_pool is not None:
+        # tokenisation and post-processing happen in the worker and are included here
+        with span("forward"):
+            return worker_pool.run("sentiment", texts)
+    return models.analyze_sentiment_batch(texts)
+
+
+def _emotion_batch_sync(texts: List[str]) -> List[EmotionScores]:
+    """Batched local emotion scores (runs on the inference executor, or in a worker process when enabled);
+    label selection happens in post-processing."""
+    _init_emotion_vad()
+    if worker_pool is not None:
+        with span("forward"):
+            return worker_pool.run("emotion", texts)
+    return models.emotion_scores_batch(texts)
+
+
+sentiment_batcher = MicroBatcher(
+    "sentiment",
+    functools.partial(_timed_model, "sentiment", _sentiment_batch_sync),
+    sentiment_inference,
+    get_microbatch_max_size(),
+    get_microbatch_wait_ms(),
+)
+emotion_batcher = MicroBatcher(
+    "emotion",
+    functools.partial(_timed_model, "emotion", _emotion_batch_sync),
+    emotion_inference,
+    get_microbatch_max_size(),
+    get_microbatch_wait_ms(),
+)
+
+
+# Single-flight: identical normalised texts being analysed right now share one computation
+_inflight: Dict[Tuple[Any, ...], "asyncio.Task[Any]"] = {}
+_dedup_stats = {"coalesced_inflight": Counter(), "deduped_in_batch": Counter()}
+
+
+async def _analyze_one(text: str, backend_mode: str, provider: Optional[str]) -> Tuple[Dict[str, Any], List[Tuple[str, float]], float, float, float, float, str]:
+    """Analyze one text; concurrent calls with the same normalised text await the same computation.
+
+    The computation runs as its own task, so a caller that goes away doesn't cancel it for the
+    others; its stage spans are added to every caller's request. Callers still apply their own
+    user-state updates.
+    """
+    fkey = (text_digest(text), backend_mode, provider)
+    task = _inflight.get(fkey)
+    if task is not None:
+        _dedup_stats["coalesced_inflight"].inc()
+    else:
+        task = asyncio.ensure_future(collect_spans_async(_compute_one(text, backend_mode, provider)))
+        _inflight[fkey] = task
+
+        def _done(t: "asyncio.Task[Any]") -> None:
+            _inflight.pop(fkey, None)
+            if not t.cancelled():
+                t.exception()  # retrieved here so an error nobody awaited isn't logged as unhandled
+
+        task.add_done_callback(_done)
+    res, spans = await asyncio.shield(task)
+    merge_spans(spans)
+    return res
+
+
+async def _compute_one(text: str, backend_mode: str, provider: Optional[str]) -> Tuple[Dict[str, Any], List[Tuple[str, float]], float, float, float, float, str]:
+    """Analyze one text: serve model outputs from the result cache, otherwise merge the text into
+    micro-batches with concurrent callers when the local backend is used."""
+    key = _result_cache_key(text, backend_mode, provider)
+    cached = result_cache.get(key) if key is not None else None
+    if cached is not None:
+        sentiment, emotions = cached
+    elif (backend_mode == "online" and provider == "nlpcloud") or not is_microbatch_enabled():
+        sentiment, emotions = await inference.run(_infer_text_sync, text, backend_mode, provider)
+        # In auto mode either model may have fallen back to NLP Cloud; don't cache that as a local result
+        if not (backend_mode == "auto" and provider == "nlpcloud"):
+            if key is None:
+                key = _result_cache_key(text, backend_mode, provider)
+            if key is not None:
+                result_cache.put(key, (sentiment, emotions))
+    else:
+        t0 = time.perf_counter()
+        try:
+            sentiment, emotions = await asyncio.gather(sentiment_batcher.submit(text), emotion_batcher.submit(text))
+            _model_ms["combined"].observe((time.perf_counter() - t0) * 1000.0)
+        except InferenceOverloaded:
+            raise
+        except Exception as e:  # noqa: BLE001
+            if backend_mode == "auto" and provider == "nlpcloud":
+                # Same per-model local -> NLP Cloud fallback as the unbatched path (not cached)
+                logger.warning("Local micro-batch failed in auto mode, falling back per text: %s", e)
+                return await inference.run(_analyze_text_sync, text, backend_mode, provider)
+            raise
+        if key is None:
+            key = _result_cache_key(text, backend_mode, provider)
+        if key is not None:
+            result_cache.put(key, (sentiment, emotions))
+    canon_pairs, v, a, d, stress, level = _postprocess_emotions(emotions)
+    return sentiment, canon_pairs, v, a, d, stress, level
+
+
+def _update_user_state(
+    userid: str,
+    username: Optional[str],
+    text: str,
+    sentiment: Dict[str, Any],
+    canon_pairs: List[Tuple[str, float]],
+    v: float,
+    a: float,
+    d: float,
+    stress: float,
+    level: str,
+) -> UserState:
+    """Apply one analysis result to the user's state (blocking DuckDB I/O; run in a threadpool).
+
+    Store errors propagate; see `_update_user_states` for the best-effort variant.
+    """
+    with span("user_update"):
+        return get_store().update_user(
+            userid=userid,
+            username=username,
+            text=text,
+            sentiment_label=str(sentiment.get("label")) if isinstance(sentiment, dict) else None,
+            vad=VADResult(valence=float(v), arousal=float(a), dominance=float(d), method="emotion_mapping"),
+            stress=StressResult(score=float(stress), level=level),
+            emotions=[LabelScore(label=k, score=float(vv)) for k, vv in canon_pairs],
+        )
+
+
+def _emotion_model_name(backend_mode: str, provider: Optional[str]) -> str:
+    """Decide emotion model name for telemetry field."""
+    emotion_model_name = models.model_id("emotion") or "unknown"
+    if backend_mode in {"online", "auto"} and provider == "nlpcloud":
+        cfg = get_nlpcloud_config()
+        emotion_model_name = (
+            cfg.get("emotion_model")
+            or cfg.get("sentiment_model")
+            or emotion_model_name
+        )
+    return emotion_model_name
+
+
+async def _ingest_loop() -> None:
+    """Drain the ingest queue in enqueue order (so per-user updates stay ordered).
+
+    Each batch is analysed on the inference executor, its user updates applied, and only then
+    acknowledged. Items that fail analysis on their own are logged and dropped. When the whole
+    batch fails (model not loaded, every item failing the same way, DB error) its messages are
+    retried one by one: those that succeed are applied, each failing one has its attempt count
+    raised and is dead-lettered after EMO_INGEST_MAX_ATTEMPTS, with a growing pause between rounds.
+    """
+    while True:
+        try:
+            messages = await run_in_threadpool(ingest_queue.fetch, get_ingest_batch_size())
+            if not messages:
+                _ingest_wakeup.clear()
+                if ingest_queue.depth() == 0:
+                    await _ingest_wakeup.wait()
+                continue
+            texts = [m["text"] for m in messages]
+            try:
+                outcomes = await inference.run(_analyze_texts_sync, texts, get_emo_backend(), get_online_provider())
+            except InferenceOverloaded as e:
+                await asyncio.sleep(e.retry_after_sec)
+                continue
+            except Exception as e:  # noqa: BLE001
+                logger.warning("Ingest batch of %d failed, retrying per message: %s", len(messages), e)
+                await _ingest_one_by_one(messages)
+                continue
+            try:
+                await _apply_ingest_batch(messages, outcomes)
+            except Exception as e:  # noqa: BLE001
+                logger.warning("Ingest user updates failed, retrying per message: %s", e)
+                await _ingest_one_by_one(messages)
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:  # noqa: BLE001
+            logger.warning("Ingest batch failed, retrying: %s", e)
+            await asyncio.sleep(1.0)
+
+
+async def _apply_ingest_batch(messages: List[Dict[str, Any]], outcomes: List[Any]) -> None:
+    """Apply the user updates of an analysed batch in order, then acknowledge it."""
+    updates = []
+    failed = 0
+    for m, res in zip(messages, outcomes):
+        if isinstance(res, Exception):
+            failed += 1
+            logger.error("Ingest message %s dropped: %s", m["seq"], res)
+            continue
+        updates.append((m["userid"], m["username"], m["text"], res))
+    if updates:
+        await run_in_threadpool(_update_user_states, updates, True)
+    await run_in_threadpool(ingest_queue.ack, messages, failed)
+
+
+async def _ingest_one_by_one(messages: List[Dict[str, Any]]) -> None:
+    """Retry path after a batch failure: analyse and apply each message on its own; a message
+    that still fails gets an attempt recorded (and is dead-lettered once out of attempts)."""
+    backoff = 0
+    for m in messages:
+        try:
+            outcomes = await inference.run(_analyze_texts_sync, [m["text"]], get_emo_backend(), get_online_provider())
+            if isinstance(outcomes[0], Exception):
+                raise outcomes[0]
+            await run_in_threadpool(_update_user_states, [(m["userid"], m["username"], m["text"], outcomes[0])], True)
+            await run_in_threadpool(ingest_queue.ack, [m])
+        except InferenceOverloaded as e:
+            await asyncio.sleep(e.retry_after_sec)
+            return
+        except Exception as e:  # noqa: BLE001
+            if await run_in_threadpool(ingest_queue.record_failure, m, str(e)):
+                logger.error("Ingest message %s dead-lettered after %d attempts: %s", m["seq"], m["attempts"] + 1, e)
+            else:
+                logger.warning("Ingest message %s failed (attempt %d): %s", m["seq"], m["attempts"] + 1, e)
+                backoff = max(backoff, m["attempts"] + 1)
+    if backoff:
+        await asyncio.sleep(min(60.0, 2.0 ** (backoff - 1)))
+
+
+def _overloaded(e: InferenceOverloaded) -> HTTPException:
+    retry_after = max(1, int(round(e.retry_after_sec)))
+    return HTTPException(status_code=get_infer_overload_status(), detail=str(e), headers={"Retry-After": str(retry_after)})
+
+
+def _run_autotune(force: bool) -> None:
+    """Tune (or load saved) threads x batch size per model and apply them (blocking)."""
+    if get_infer_processes() > 0:
+        # The workers are forked from this process next, so no forward pass may run here first
+        tuned = autotune_in_subprocess(models, force=force)
+    else:
+        tuned = {kind: autotune_model(models, kind, force=force) for kind in ("sentiment", "emotion")}
+    threads = {kind: int(res["threads"]) for kind, res in tuned.items()}
+    if get_infer_processes() > 0:
+        _thread_budget["process"] = max(threads.values())
+    elif sentiment_inference is not inference:
+        _thread_budget.update(threads)
+    else:
+        # One executor runs both models, so it gets the larger budget
+        _thread_budget["infer"] = max(threads.values())
+    set_interop_threads(1)
+    sentiment_batcher.max_batch_size = int(tuned["sentiment"]["batch_size"])
+    emotion_batcher.max_batch_size = int(tuned["emotion"]["batch_size"])
+    _autotune.update(
+        {
+            "host": host_key(),
+            "batch_size": min(int(res["batch_size"]) for res in tuned.values()),
+            "thread_budget": dict(_thread_budget),
+            "interop_threads": 1,
+            **{
+                kind: {k: v for k, v in res.items() if k != "trials"}
+                for kind, res in tuned.items()
+            },
+        }
+    )
+
+
+# ----- Model hot-swap -----
+_reload_lock = threading.Lock()
+# Candidate that failed to load per kind; the watcher doesn't retry it until the selection changes
+_failed_candidates: Dict[str, Optional[str]] = {}
+
+
+def _reload_model(kind: str, force: bool = False) -> Dict[str, Any]:
+    """Load the currently selected `kind` model next to the serving one, warm it up and swap it in.
+
+    Requests that already hold the old pipeline finish on it; it is freed once they are done
+    (see `ModelManager.release_retired`). On load failure the old model keeps serving.
+    """
+    with _reload_lock:
+        current = models.model_id(kind)
+        target = models.selected_candidate(kind)
+        if target is None:
+            return {"kind": kind, "status": "no_model", "model": current}
+        if target == current and not force:
+            return {"kind": kind, "status": "unchanged", "model": current}
+        t0 = time.perf_counter()
+        try:
+            pipe = models.load_candidate(kind, _warmup_batches(random.Random(0), kind))
+        except Exception:
+            _failed_candidates[kind] = target
+            raise
+        _failed_candidates.pop(kind, None)
+        t1 = time.perf_counter()
+        if kind == "emotion":
+            labels = models.emotion_labels(pipe)
+            swap_vad_mapper(pipe.model_id, labels if labels else None, lambda: models.install(kind, pipe))
+        else:
+            models.install(kind, pipe)
+        if worker_pool is not None:
+            worker_pool.reload()
+        # Keys include the model ids, so old entries would only occupy memory
+        result_cache.clear()
+        swap_ms = (time.perf_counter() - t1) * 1000.0
+        logger.info(f"Hot-swapped {kind} model: {current} -> {pipe.model_id} (load+warmup {t1 - t0:.2f}s, swap {swap_ms:.1f} ms)")
+        return {
+            "kind": kind,
+            "status": "swapped",
+            "previous": current,
+            "model": pipe.model_id,
+            "engine": models.get_status()[kind]["engine"],
+            "load_sec": t1 - t0,
+            "swap_ms": swap_ms,
+        }
+
+
+def _check_model_selection() -> None:
+    """Watcher tick: hot-swap loaded models whose selection changed, then free drained old ones."""
+    reload_model_selectors()
+    for kind in ("sentiment", "emotion"):
+        current = models.model_id(kind)
+        if current is None:
+            continue  # never loaded (online backend / lazy); nothing to swap
+        target = models.selected_candidate(kind)
+        if target is None or target == current or _failed_candidates.get(kind) == target:
+            continue
+        try:
+            _reload_model(kind)
+        except Exception as e:  # noqa: BLE001
+            logger.warning(f"Hot-swap of {kind} model to {target} failed, keeping {current}: {e}")
+    models.release_retired()
+
+
+async def _model_watch_loop(interval_sec: float) -> None:
+    while True:
+        await asyncio.sleep(interval_sec)
+        try:
+            await run_in_threadpool(_check_model_selection)
+        except Exception as e:  # noqa: BLE001
+            logger.warning("Model selection check failed: %s", e)
+
+
+# ----- Warmup -----
+def _warmup_shapes() -> Tuple[List[int], List[int]]:
+    """(lengths in tokens, batch sizes) to warm up: the token-length buckets and the batch sizes traffic will use."""
+    lengths = get_warmup_lengths() or get_length_buckets() or [16, 64, 256]
+    sizes = get_warmup_batch_sizes() or sorted({1, get_microbatch_max_size(), _default_batch_size()})
+    return lengths, sizes
+
+
+def _warmup_batches(rng: random.Random, kind: str) -> List[List[str]]:
+    """Synthetic batches of every warmup shape, sized in tokens of the current `kind` model's tokenizer."""
+    pipe, _ = models.ensure_sentiment() if kind == "sentiment" else models.ensure_emotion()
+    tokenizer = getattr(pipe, "tokenizer", None)
+    lengths, sizes = _warmup_shapes()
+    return [token_length_texts(rng, bs, length, tokenizer) for length in lengths for bs in sizes]
+
+
+def _warmup_lane(batches: Dict[str, List[List[str]]]) -> None:
+    for kind, kind_batches in batches.items():
+        run = _sentiment_batch_sync if kind == "sentiment" else _emotion_batch_sync
+        for texts in kind_batches:
+            run(texts)
+
+
+def _run_warmup() -> Dict[str, Any]:
+    """Run synthetic batches of every warmup shape through both models on each inference thread,
+    or in every worker process, so kernels and allocators are warm before real traffic (blocking)."""
+    if sentiment_inference is inference:
+        lanes = [(inference, ("sentiment", "emotion"))]
+    else:
+        lanes = [(sentiment_inference, ("sentiment",)), (emotion_inference, ("emotion",))]
+    rng = random.Random(0)
+    rounds = get_warmup_rounds()
+    t0 = time.perf_counter()
+    texts = 0
+    for _ in range(rounds):
+        # fresh texts per round: the forward pass runs, not the token cache
+        batches = {kind: _warmup_batches(rng, kind) for kind in ("sentiment", "emotion")}
+        if worker_pool is not None:
+            # The pool hands each worker exactly one warmup; the executor threads only forward to it
+            worker_pool.warmup(batches)
+            texts += sum(len(b) for kb in batches.values() for b in kb) * worker_pool.processes
+            continue
+        # One task per executor thread; they block concurrently, so every thread takes one
+        futures = []
+        for ex, kinds in lanes:
+            lane = {kind: batches[kind] for kind in kinds}
+            futures += [ex.submit(_warmup_lane, lane) for _ in range(ex.max_workers)]
+            texts += sum(len(b) for kb in lane.values() for b in kb) * ex.max_workers
+        for f in futures:
+            f.result()
+    lengths, sizes = _warmup_shapes()
+    report = {"sec": time.perf_counter() - t0, "rounds": rounds, "lengths": lengths, "batch_sizes": sizes, "texts": texts}
+    logger.info(f"Warmup done in {report['sec']:.2f}s (lengths={lengths} batch_sizes={sizes} rounds={rounds})")
+    return report
+
+
+def _load_report() -> Dict[str, Any]:
+    """Current load for routing/autoscaling: executor queues, pending micro-batch items, worker and ingest queues."""
+    executors = [inference] if sentiment_inference is inference else [sentiment_inference, emotion_inference]
+    out: Dict[str, Any] = {}
+    for ex in executors:
+        st = ex.stats()
+        out[ex.name] = {
+            "queue_depth": st["queue_depth"],
+            "running": st["running"],
+            "workers": st["workers"],
+            "max_queue": st["max_queue"],
+            "saturation": (st["queue_depth"] + st["running"]) / st["max_queue"],
+            "utilization": st["utilization"],
+        }
+    out["microbatch_pending"] = sentiment_batcher.stats()["pending"] + emotion_batcher.stats()["pending"]
+    out["worker_pool_in_flight"] = worker_pool.stats()["in_flight"] if worker_pool is not None else None
+    out["ingest_queue_depth"] = ingest_queue.depth()
+    return out
+
+
+def _default_batch_size() -> int:
+    """Sub-batch size for /analyze/batch and /analyze/stream: autotuned, else EMO_BATCH_SIZE."""
+    return int(_autotune.get("batch_size") or get_batch_size())
+
+
+def _client_batch_size(requested: Optional[int]) -> int:
+    """Sub-batch size for a client-supplied `batch_size`, clamped to EMO_MAX_BATCH_SIZE."""
+    return max(1, min(int(requested or _default_batch_size()), get_max_batch_size()))
+
+
+def _online_only() -> bool:
+    """Both models come from the online provider, so torch / transformers are never needed."""
+    return get_emo_backend() == "online" and get_online_provider() == "nlpcloud"
+
+
+def _startup_report() -> Dict[str, Any]:
+    status = models.get_status()
+    return {
+        **_startup,
+        "import_ms": {**_startup["import_ms"], **heavy_import_times()},
+        "model_load_sec": {kind: status[kind]["load_time_sec"] for kind in ("sentiment", "emotion")},
+        "torch_loaded": "torch" in sys.modules,
+    }
+
+
+def _autotune_report() -> Dict[str, Any]:
+    return {"mode": get_autotune_mode(), **_autotune}
 
 
 @asynccontextmanager
 async def lifespan(app: FastAPI):
     # Startup
-    try:
-        emo_pipe, emo_mid = models.ensure_emotion()
-        labels = []
+    _readiness.update(phase="starting", warmup=None)
+    t_start = time.perf_counter()
+    online_only = _online_only()
+    # Online-only deployments skip everything below that would import torch / transformers
+    if not online_only:
         try:
-            id2label = getattr(emo_pipe.model.config, "id2label", None)
-            if isinstance(id2label, dict) and id2label:
-                numeric_keys = [k for k in id2label.keys() if isinstance(k, int) or (isinstance(k, str) and str(k).isdigit())]
-                if numeric_keys:
-                    idxs = sorted([int(k) for k in id2label.keys()])
-                    labels = [str(id2label[i]) for i in idxs]
-                else:
-                    labels = [str(v) for v in id2label.values()]
+            _init_emotion_vad()
+        except Exception as e:  # noqa: BLE001
+            logger.warning(f"Startup VAD init skipped: {e}")
+
+        try:
+            models.ensure_sentiment()
+        except Exception as e:  # noqa: BLE001
+            logger.warning(f"Startup sentiment preload skipped: {e}")
+
+        # Log device report once at startup
+        try:
+            dev = get_device_report()
+            logger.info(
+                "Device decision: using=%s index=%s name=%s cuda_available=%s count=%s (mode=%s selector=%s)",
+                dev.get("using"),
+                dev.get("index"),
+                dev.get("device_name"),
+                dev.get("cuda_available"),
+                dev.get("cuda_device_count"),
+                dev.get("mode"),
+                dev.get("selector"),
+            )
         except Exception:
-            labels = []
-        init_vad_mapper(emo_mid, labels if labels else None)
-    except Exception as e:  # noqa: BLE001
-        logger.warning(f"Startup VAD init skipped: {e}")
+            pass
 
-    try:
-        models.ensure_sentiment()
-    except Exception as e:  # noqa: BLE001
-        logger.warning(f"Startup sentiment preload skipped: {e}")
+    if get_autotune_mode() != "off" and not online_only:
+        _readiness["phase"] = "autotuning"
+        t0 = time.perf_counter()
+        try:
+            # Before any inference thread starts; with worker processes it benchmarks in a subprocess
+            await run_in_threadpool(_run_autotune, get_autotune_mode() == "force")
+        except Exception as e:  # noqa: BLE001
+            logger.warning(f"Autotune skipped: {e}")
+        _startup["autotune_sec"] = time.perf_counter() - t0
 
-    # Log device report once at startup
+    global worker_pool
+    processes = get_infer_processes()
+    if processes > 0 and not online_only:
+        pool = ProcessInferencePool(models, processes, _thread_budget.get("process") or get_infer_process_threads())
+        try:
+            pool.start()
+            worker_pool = pool
+        except Exception as e:  # noqa: BLE001
+            pool.shutdown()
+            logger.warning(f"Inference worker processes unavailable, using in-process inference: {e}")
+
+    if is_warmup_enabled() and not online_only:
+        _readiness["phase"] = "warming"
+        try:
+            _readiness["warmup"] = await run_in_threadpool(_run_warmup)
+        except Exception as e:  # noqa: BLE001
+            logger.warning(f"Warmup failed: {e}")
+            _readiness["warmup"] = {"error": str(e)}
+    models_missing = models.model_id("sentiment") is None or models.model_id("emotion") is None
+    _readiness["phase"] = "failed" if (get_emo_backend() == "local" and models_missing) else "ready"
+    _startup["warmup_sec"] = (_readiness["warmup"] or {}).get("sec")
+    _startup["startup_sec"] = time.perf_counter() - t_start
+    _startup["rss_mb"] = process_rss_mb()
+    logger.info(f"Startup finished in {_startup['startup_sec']:.2f}s (phase={_readiness['phase']}, rss={_startup['rss_mb']} MB)")
+
+    vad_watch: Optional[asyncio.Task] = None
+    if get_vad_watch_interval_sec() > 0:
+        vad_watch = asyncio.create_task(_vad_watch_loop(get_vad_watch_interval_sec()))
+
+    model_watch: Optional[asyncio.Task] = None
+    if get_model_watch_interval_sec() > 0 and not online_only:
+        model_watch = asyncio.create_task(_model_watch_loop(get_model_watch_interval_sec()))
+
+    ingest_task: Optional[asyncio.Task] = None
     try:
-        dev = get_device_report()
-        logger.info(
-            "Device decision: using=%s index=%s name=%s cuda_available=%s count=%s (mode=%s selector=%s)",
-            dev.get("using"),
-            dev.get("index"),
-            dev.get("device_name"),
-            dev.get("cuda_available"),
-            dev.get("cuda_device_count"),
-            dev.get("mode"),
-            dev.get("selector"),
-        )
-    except Exception:
-        pass
+        leftover = await run_in_threadpool(ingest_queue.open)
+        if leftover:
+            logger.info("Resuming %d queued ingest messages", leftover)
+        ingest_task = asyncio.create_task(_ingest_loop())
+    except Exception as e:  # noqa: BLE001
+        logger.warning(f"Ingest queue unavailable: {e}")
 
     yield
-    # Teardown (nothing for now)
+    # Teardown
+    _readiness["phase"] = "stopping"
+    if vad_watch is not None:
+        vad_watch.cancel()
+    if model_watch is not None:
+        model_watch.cancel()
+    if ingest_task is not None:
+        ingest_task.cancel()
+        try:
+            await ingest_task
+        except (asyncio.CancelledError, Exception):  # noqa: BLE001
+            pass
+    ingest_queue.close()
+    inference.shutdown()
+    if sentiment_inference is not inference:
+        sentiment_inference.shutdown()
+        emotion_inference.shutdown()
+    if worker_pool is not None:
+        worker_pool.shutdown()
+        worker_pool = None
 
 
 app = FastAPI(title="Sentra Emo: 文本情绪/情感/VAD/PAD/压力分析", lifespan=lifespan)
@@ -169,13 +939,23 @@ app.add_middleware(
     allow_methods=["*"],
     allow_headers=["*"],
 )
+app.add_middleware(ServerTimingMiddleware, enabled=is_server_timing_enabled())
 
 
 @app.get("/health")
 async def health():
+    """Liveness: ok as soon as the process serves HTTP (use /ready for routing)."""
     return {"status": "ok"}
 
 
+@app.get("/ready")
+async def ready(response: Response):
+    """Readiness: 200 once models are loaded and warmed up, else 503; always reports the current load."""
+    is_ready = _readiness["phase"] == "ready"
+    response.status_code = 200 if is_ready else 503
+    return {"ready": is_ready, "phase": _readiness["phase"], "warmup": _readiness["warmup"], "load": _load_report()}
+
+
 @app.post("/analyze", response_model=AnalyzeResponse, response_model_exclude_none=True)
 async def analyze(req: AnalyzeRequest):
     text = (req.text or "").strip()
@@ -187,92 +967,22 @@ async def analyze(req: AnalyzeRequest):
         backend_mode = get_emo_backend()
         provider = get_online_provider()
 
-        # Ensure emotion model and VAD mapper only when using local backend.
-        if not (backend_mode == "online" and provider == "nlpcloud"):
-            emo_pipe, emo_mid = models.ensure_emotion()
-            labels = []
-            try:
-                id2label = getattr(emo_pipe.model.config, "id2label", None)
-                if isinstance(id2label, dict) and id2label:
-                    numeric_keys = [k for k in id2label.keys() if isinstance(k, int) or (isinstance(k, str) and str(k).isdigit())]
-                    if numeric_keys:
-                        idxs = sorted([int(k) for k in id2label.keys()])
-                        labels = [str(id2label[i]) for i in idxs]
-                    else:
-                        labels = [str(v) for v in id2label.values()]
-            except Exception:
-                labels = []
-            init_vad_mapper(emo_mid, labels if labels else None)
-
-        # Online+NLP Cloud 优化：若情感和情绪使用同一模型，只发一次 HTTP 请求
-        sentiment = None
-        emotions_pairs = None
-        if backend_mode == "online" and provider == "nlpcloud":
-            cfg = get_nlpcloud_config()
-            sent_model = cfg.get("sentiment_model")
-            emo_model = cfg.get("emotion_model")
-            same_model = (emo_model is None) or (emo_model == sent_model)
-            if same_model:
-                from .online import analyze_combined_nlpcloud
-
-                sentiment, emotions_pairs = analyze_combined_nlpcloud(text)
-
-        if sentiment is None or emotions_pairs is None:
-            sentiment = _analyze_sentiment_with_backend(text)
-            emotions_pairs = _analyze_emotions_with_backend(text)
-        if use_emotion_label_alias():
-            canon_pairs = canonicalize_distribution(emotions_pairs)
-        else:
-            canon_pairs = emotions_pairs
-
-        # 应用情绪最小分数阈值过滤（仅当配置 > 0 时生效）
-        min_score = get_emotion_min_score()
-        if min_score > 0.0:
-            filtered = [(k, float(vv)) for k, vv in canon_pairs if float(vv) >= min_score]
-            # 只有在仍有剩余标签时才替换，避免全部被过滤导致信息丢失
-            if filtered:
-                canon_pairs = filtered
-                canon_pairs = normalize_distribution(canon_pairs)
-        v, a, d = emotions_to_vad(canon_pairs)
-        stress, level = derive_stress(v, a, canon_pairs)
+        sentiment, canon_pairs, v, a, d, stress, level = await _analyze_one(text, backend_mode, provider)
 
         user_state: Optional[UserState] = None
         if (req.userid or "").strip():
-            try:
-                user_state = get_store().update_user(
-                    userid=req.userid.strip(),
-                    username=(req.username or "").strip() or None,
-                    text=text,
-                    sentiment_label=str(sentiment.get("label")) if isinstance(sentiment, dict) else None,
-                    vad=VADResult(valence=float(v), arousal=float(a), dominance=float(d), method="emotion_mapping"),
-                    stress=StressResult(score=float(stress), level=level),
-                    emotions=[LabelScore(label=k, score=float(vv)) for k, vv in canon_pairs],
-                )
-            except Exception:
-                user_state = None
-
-        # Decide emotion model name for telemetry field
-        emotion_model_name = models._emotion_model_id or "unknown"
-        if backend_mode in {"online", "auto"} and provider == "nlpcloud":
-            cfg = get_nlpcloud_config()
-            emotion_model_name = (
-                cfg.get("emotion_model")
-                or cfg.get("sentiment_model")
-                or emotion_model_name
+            (user_state,) = await run_in_threadpool(
+                _update_user_states,
+                [(req.userid.strip(), (req.username or "").strip() or None, text, (sentiment, canon_pairs, v, a, d, stress, level))],
             )
 
-        resp = AnalyzeResponse(
-            sentiment=SentimentResult(**sentiment),
-            emotions=[LabelScore(label=k, score=float(v)) for k, v in canon_pairs],
-            vad=VADResult(valence=float(v), arousal=float(a), dominance=float(d), method="emotion_mapping"),
-            pad=PADResult(pleasure=float(v), arousal=float(a), dominance=float(d)),
-            stress=StressResult(score=float(stress), level=level),
-            models={
-                "sentiment": sentiment.get("raw_model", "unknown"),
-                "emotion": emotion_model_name,
-            },
-            user=user_state,
-        )
+        with span("serialize"):
+            resp = _build_response(
+                (sentiment, canon_pairs, v, a, d, stress, level),
+                _emotion_model_name(backend_mode, provider),
+                user_state,
+            )
+            body = resp.model_dump_json(exclude_none=True)
         dt_ms = (time.perf_counter() - t0) * 1000.0
         _record_latency_ms(dt_ms)
         try:
@@ -298,16 +1008,125 @@ async def analyze(req: AnalyzeRequest):
             vad_d,
             len(text),
         )
-        return resp
+        return Response(content=body, media_type="application/json")
+    except InferenceOverloaded as e:
+        logger.warning("Analyze rejected: %s", e)
+        raise _overloaded(e)
     except Exception as e:  # noqa: BLE001
         dt_ms = (time.perf_counter() - t0) * 1000.0
         _record_latency_ms(dt_ms)
-        _metrics["error_count"] += 1
+        _record_error()
         logger.exception("Analyze error in %.1f ms: %s", dt_ms, e)
         raise HTTPException(status_code=500, detail=str(e))
 
 
-@app.post("/analyze/batch", response_model=List[AnalyzeResponse], response_model_exclude_none=True)
+def _analyze_texts_sync(texts: List[str], backend_mode: str, provider: Optional[str]) -> List[Any]:
+    """Analyze a sub-batch of texts (blocking; runs on the inference executor).
+
+    Cached model outputs are reused and repeated texts are computed once; for the rest the
+    local backend runs one batched forward pass per model. If the batched call fails (or the
+    backend is online), the remaining texts are analyzed one by one so a bad item only fails
+    itself. Emotion post-processing then runs over the whole sub-batch. Returns per text either
+    the `_analyze_text_sync` tuple or the exception raised for it.
+
+    Failures that aren't about any one text raise instead: the local models failing to load
+    with no online fallback, or every per-item retry failing with the same error.
+    """
+    local = not (backend_mode == "online" and provider == "nlpcloud")
+    if local:
+        try:
+            _init_emotion_vad()
+            models.ensure_sentiment()
+        except Exception as e:  # noqa: BLE001
+            if not (backend_mode == "auto" and provider == "nlpcloud"):
+                raise
+            logger.warning("Local model preload failed, analyzing per item: %s", e)
+
+    keys = [_result_cache_key(t, backend_mode, provider) for t in texts]
+    raw: List[Any] = [result_cache.get(k) if k is not None else None for k in keys]
+    # Identical normalised texts are computed once and fanned out
+    todo: List[int] = []
+    dup_of: Dict[int, int] = {}
+    first: Dict[bytes, int] = {}
+    for i, r in enumerate(raw):
+        if r is not None:
+            continue
+        j = first.setdefault(text_digest(texts[i]), i)
+        if j == i:
+            todo.append(i)
+        else:
+            dup_of[i] = j
+    if dup_of:
+        _dedup_stats["deduped_in_batch"].inc(len(dup_of))
+    if todo and local:
+        try:
+            chunk = [texts[i] for i in todo]
+            sentiments, emotions = _run_models(_sentiment_batch_sync, _emotion_batch_sync, chunk)
+            for i, sentiment, emotion in zip(todo, sentiments, emotions):
+                raw[i] = (sentiment, emotion)
+                if keys[i] is not None:
+                    result_cache.put(keys[i], raw[i])
+            todo = []
+        except Exception as e:  # noqa: BLE001
+            logger.warning("Batched inference failed for %d texts, retrying per item: %s", len(todo), e)
+
+    for i in todo:
+        try:
+            raw[i] = _infer_text_sync(texts[i], backend_mode, provider)
+            # Per-item local results may come from the auto-mode online fallback; only cache online mode
+            if not local and keys[i] is not None:
+                result_cache.put(keys[i], raw[i])
+        except Exception as e:  # noqa: BLE001
+            raw[i] = e
+    if len(todo) > 1:
+        errors = {(type(raw[i]), str(raw[i])) for i in todo if isinstance(raw[i], Exception)}
+        if len(errors) == 1 and all(isinstance(raw[i], Exception) for i in todo):
+            raise raw[todo[0]]
+    for i, j in dup_of.items():
+        raw[i] = raw[j]
+
+    ok = [i for i, r in enumerate(raw) if not isinstance(r, Exception)]
+    posts = _postprocess_emotions_batch([raw[i][1] for i in ok])
+    results: List[Any] = list(raw)
+    for i, post in zip(ok, posts):
+        results[i] = (raw[i][0], *post)
+    return results
+
+
+def _update_user_states(items: List[Tuple[str, Optional[str], str, Any]], strict: bool = False) -> List[Optional[UserState]]:
+    """Apply (userid, username, text, result) items to user state in input order (blocking; run in a threadpool).
+
+    With `strict` the first store error propagates; otherwise it is logged and that item's state is None.
+    """
+    states: List[Optional[UserState]] = []
+    for userid, username, text, res in items:
+        try:
+            states.append(_update_user_state(userid, username, text, *res))
+        except Exception as e:  # noqa: BLE001
+            if strict:
+                raise
+            logger.warning("User state update for %s failed: %s", userid, e)
+            states.append(None)
+    return states
+
+
+def _build_response(res: Any, emotion_model_name: str, user_state: Optional[UserState]) -> AnalyzeResponse:
+    sentiment, canon_pairs, v, a, d, stress, level = res
+    return AnalyzeResponse(
+        sentiment=SentimentResult(**sentiment),
+        emotions=[LabelScore(label=k, score=float(vv)) for k, vv in canon_pairs],
+        vad=VADResult(valence=float(v), arousal=float(a), dominance=float(d), method="emotion_mapping"),
+        pad=PADResult(pleasure=float(v), arousal=float(a), dominance=float(d)),
+        stress=StressResult(score=float(stress), level=level),
+        models={
+            "sentiment": sentiment.get("raw_model", "unknown"),
+            "emotion": emotion_model_name,
+        },
+        user=user_state,
+    )
+
+
+@app.post("/analyze/batch", response_model=List[Union[AnalyzeResponse, BatchItemError]], response_model_exclude_none=True)
 async def analyze_batch(req: BatchAnalyzeRequest):
     texts = [str(t or "").strip() for t in (req.texts or [])]
     texts = [t for t in texts if t]
@@ -316,126 +1135,255 @@ async def analyze_batch(req: BatchAnalyzeRequest):
 
     backend_mode = get_emo_backend()
     provider = get_online_provider()
+    batch_size = _client_batch_size(req.batch_size)
 
-    # Preload local models and initialize VAD mapper only when backend is local/auto.
-    if not (backend_mode == "online" and provider == "nlpcloud"):
+    outcomes: List[Any] = []
+    elapsed_ms: List[float] = []
+    # One executor slot per sub-batch so a large batch interleaves with single requests
+    for start in range(0, len(texts), batch_size):
+        chunk = texts[start : start + batch_size]
+        t0 = time.perf_counter()
         try:
-            emo_pipe, emo_mid = models.ensure_emotion()
-            labels = []
-            try:
-                id2label = getattr(emo_pipe.model.config, "id2label", None)
-                if isinstance(id2label, dict) and id2label:
-                    numeric_keys = [k for k in id2label.keys() if isinstance(k, int) or (isinstance(k, str) and str(k).isdigit())]
-                    if numeric_keys:
-                        idxs = sorted([int(k) for k in id2label.keys()])
-                        labels = [str(id2label[i]) for i in idxs]
-                    else:
-                        labels = [str(v) for v in id2label.values()]
-            except Exception:
-                labels = []
-            init_vad_mapper(emo_mid, labels if labels else None)
+            outcomes.extend(await inference.run(_analyze_texts_sync, chunk, backend_mode, provider))
+        except InferenceOverloaded as e:
+            logger.warning("Analyze(batch) rejected: %s", e)
+            raise _overloaded(e)
         except Exception as e:  # noqa: BLE001
-            logger.exception("Batch startup VAD init failed: %s", e)
-            raise HTTPException(status_code=500, detail=str(e))
-
+            outcomes.extend([e] * len(chunk))
+        dt_ms = (time.perf_counter() - t0) * 1000.0
+        elapsed_ms.extend([dt_ms] * len(chunk))
+        logger.info("Analyze(batch) chunk of %d OK in %.1f ms", len(chunk), dt_ms)
+
+    userid = (getattr(req, "userid", None) or "").strip()
+    username = (getattr(req, "username", None) or "").strip() or None
+    user_states: List[Optional[UserState]] = [None] * len(texts)
+    if userid:
+        ok_idx = [i for i, res in enumerate(outcomes) if not isinstance(res, Exception)]
+        updated = await run_in_threadpool(
+            _update_user_states, [(userid, username, texts[i], outcomes[i]) for i in ok_idx]
+        )
+        for i, state in zip(ok_idx, updated):
+            user_states[i] = state
+
+    emotion_model_name = _emotion_model_name(backend_mode, provider)
+    with span("serialize"):
+        results = _build_batch_results(outcomes, elapsed_ms, emotion_model_name, user_states)
+        body = _batch_results_adapter.dump_json(results, exclude_none=True)
+    return Response(content=body, media_type="application/json")
+
+
+_batch_results_adapter = TypeAdapter(List[Union[AnalyzeResponse, BatchItemError]])
+
+
+def _build_batch_results(
+    outcomes: List[Any], elapsed_ms: List[float], emotion_model_name: str, user_states: List[Optional[UserState]]
+) -> List[Union[AnalyzeResponse, BatchItemError]]:
+    results: List[Union[AnalyzeResponse, BatchItemError]] = []
+    for i, res in enumerate(outcomes):
+        _record_latency_ms(elapsed_ms[i])
+        if isinstance(res, Exception):
+            _record_error()
+            logger.error("Analyze(batch) item %d error: %s", i, res)
+            results.append(BatchItemError(index=i, error=str(res)))
+            continue
         try:
-            models.ensure_sentiment()
+            results.append(_build_response(res, emotion_model_name, user_states[i]))
         except Exception as e:  # noqa: BLE001
-            logger.exception("Batch sentiment preload failed: %s", e)
-            raise HTTPException(status_code=500, detail=str(e))
+            _record_error()
+            logger.exception("Analyze(batch) item %d error: %s", i, e)
+            results.append(BatchItemError(index=i, error=str(e)))
+            continue
+        try:
+            canon_pairs = res[1]
+            if canon_pairs:
+                _record_emotion_top1(float(canon_pairs[0][1]))
+        except Exception:
+            pass
+    return results
 
-    results: List[AnalyzeResponse] = []
-    use_alias = use_emotion_label_alias()
-    for text in texts:
-        t0 = time.perf_counter()
+
+class _NDJSONStreamingResponse(StreamingResponse):
+    """StreamingResponse without the background disconnect listener.
+
+    The body iterator of /analyze/stream keeps reading the request body while responding; the
+    stock listener would consume those request messages. Disconnects still surface through
+    `request.stream()` (ClientDisconnect) and the send side.
+    """
+
+    async def __call__(self, scope, receive, send) -> None:  # type: ignore[override]
+        await send({"type": "http.response.start", "status": self.status_code, "headers": self.raw_headers})
+        async for chunk in self.body_iterator:
+            if not isinstance(chunk, (bytes, memoryview)):
+                chunk = chunk.encode(self.charset)
+            await send({"type": "http.response.body", "body": chunk, "more_body": True})
+        await send({"type": "http.response.body", "body": b"", "more_body": False})
+
+
+def _ndjson(obj: Dict[str, Any]) -> bytes:
+    return (json.dumps(obj, ensure_ascii=False) + "\n").encode("utf-8")
+
+
+async def _stream_chunk(
+    items: List[Tuple[int, StreamAnalyzeItem]], backend_mode: str, provider: Optional[str], emotion_model_name: str
+) -> Tuple[List[bytes], int]:
+    """Analyze one micro-batch of stream items; returns its NDJSON result lines (input order) and error count."""
+    texts = [it.text.strip() for _, it in items]
+    t0 = time.perf_counter()
+    while True:
         try:
-            sentiment = None
-            emotions_pairs = None
-            if backend_mode == "online" and provider == "nlpcloud":
-                cfg = get_nlpcloud_config()
-                sent_model = cfg.get("sentiment_model")
-                emo_model = cfg.get("emotion_model")
-                same_model = (emo_model is None) or (emo_model == sent_model)
-                if same_model:
-                    from .online import analyze_combined_nlpcloud
-
-                    sentiment, emotions_pairs = analyze_combined_nlpcloud(text)
-
-            if sentiment is None or emotions_pairs is None:
-                sentiment = _analyze_sentiment_with_backend(text)
-                emotions_pairs = _analyze_emotions_with_backend(text)
-            if use_alias:
-                canon_pairs = canonicalize_distribution(emotions_pairs)
-            else:
-                canon_pairs = emotions_pairs
-
-            min_score = get_emotion_min_score()
-            if min_score > 0.0:
-                filtered = [(k, float(vv)) for k, vv in canon_pairs if float(vv) >= min_score]
-                if filtered:
-                    canon_pairs = filtered
-                    canon_pairs = normalize_distribution(canon_pairs)
-            v, a, d = emotions_to_vad(canon_pairs)
-            stress, level = derive_stress(v, a, canon_pairs)
-
-            user_state: Optional[UserState] = None
-            if (getattr(req, "userid", None) or "").strip():
-                try:
-                    user_state = get_store().update_user(
-                        userid=req.userid.strip(),
-                        username=(getattr(req, "username", None) or "").strip() or None,
-                        text=text,
-                        sentiment_label=str(sentiment.get("label")) if isinstance(sentiment, dict) else None,
-                        vad=VADResult(valence=float(v), arousal=float(a), dominance=float(d), method="emotion_mapping"),
-                        stress=StressResult(score=float(stress), level=level),
-                        emotions=[LabelScore(label=k, score=float(vv)) for k, vv in canon_pairs],
-                    )
-                except Exception:
-                    user_state = None
-
-            # Decide emotion model name for telemetry field
-            emotion_model_name = models._emotion_model_id or "unknown"
-            if backend_mode in {"online", "auto"} and provider == "nlpcloud":
-                cfg = get_nlpcloud_config()
-                emotion_model_name = (
-                    cfg.get("emotion_model")
-                    or cfg.get("sentiment_model")
-                    or emotion_model_name
-                )
-
-            resp = AnalyzeResponse(
-                sentiment=SentimentResult(**sentiment),
-                emotions=[LabelScore(label=k, score=float(vv)) for k, vv in canon_pairs],
-                vad=VADResult(valence=float(v), arousal=float(a), dominance=float(d), method="emotion_mapping"),
-                pad=PADResult(pleasure=float(v), arousal=float(a), dominance=float(d)),
-                stress=StressResult(score=float(stress), level=level),
-                models={
-                    "sentiment": sentiment.get("raw_model", "unknown"),
-                    "emotion": emotion_model_name,
-                },
-                user=user_state,
-            )
-            dt_ms = (time.perf_counter() - t0) * 1000.0
-            _record_latency_ms(dt_ms)
-            try:
-                if canon_pairs:
-                    _record_emotion_top1(float(canon_pairs[0][1]))
-            except Exception:
-                pass
-            logger.info(
-                "Analyze(batch) OK in %.1f ms | text_len=%d",
-                dt_ms,
-                len(text),
-            )
-            results.append(resp)
+            outcomes = await inference.run(_analyze_texts_sync, texts, backend_mode, provider)
+            break
+        except InferenceOverloaded as e:
+            # Status is already sent; wait for capacity instead (this also stops reading the upload)
+            await asyncio.sleep(e.retry_after_sec)
         except Exception as e:  # noqa: BLE001
-            dt_ms = (time.perf_counter() - t0) * 1000.0
-            _record_latency_ms(dt_ms)
-            _metrics["error_count"] += 1
-            logger.exception("Analyze(batch) error in %.1f ms: %s", dt_ms, e)
-            raise HTTPException(status_code=500, detail=str(e))
-
-    return results
+            outcomes = [e] * len(texts)
+            break
+    dt_ms = (time.perf_counter() - t0) * 1000.0
+
+    updates = [
+        (i, ((it.userid or "").strip(), (it.username or "").strip() or None, texts[i], outcomes[i]))
+        for i, (_, it) in enumerate(items)
+        if (it.userid or "").strip() and not isinstance(outcomes[i], Exception)
+    ]
+    user_states: List[Optional[UserState]] = [None] * len(items)
+    if updates:
+        states = await run_in_threadpool(_update_user_states, [u for _, u in updates])
+        for (i, _), state in zip(updates, states):
+            user_states[i] = state
+
+    lines: List[bytes] = []
+    n_errors = 0
+    for i, (index, it) in enumerate(items):
+        _record_latency_ms(dt_ms)
+        res = outcomes[i]
+        record: Dict[str, Any] = {"index": index}
+        if it.id is not None:
+            record["id"] = it.id
+        try:
+            if isinstance(res, Exception):
+                raise res
+            record["result"] = _build_response(res, emotion_model_name, user_states[i]).model_dump(exclude_none=True)
+            if res[1]:
+                _record_emotion_top1(float(res[1][0][1]))
+        except Exception as e:  # noqa: BLE001
+            _record_error()
+            n_errors += 1
+            record.pop("result", None)
+            record["error"] = str(e)
+        lines.append(_ndjson(record))
+    logger.info("Analyze(stream) chunk of %d in %.1f ms", len(items), dt_ms)
+    return lines, n_errors
+
+
+@app.post("/analyze/stream")
+async def analyze_stream(request: Request, batch_size: Optional[int] = None):
+    """Analyze newline-delimited JSON items and stream NDJSON results as each micro-batch finishes.
+
+    Request body: one JSON object per line, `{"text": ..., "userid"?: ..., "username"?: ..., "id"?: ...}`.
+    Response lines: `{"index", "id"?, "result"}` or `{"index", "id"?, "error"}`, then a final
+    `{"done": true, "count", "errors"}`. The body is read incrementally and only one micro-batch is
+    held in memory; reading pauses while a batch is being analyzed, which applies backpressure to the upload.
+    """
+    backend_mode = get_emo_backend()
+    provider = get_online_provider()
+    size = _client_batch_size(batch_size)
+    max_line = get_stream_max_line_bytes()
+    emotion_model_name = _emotion_model_name(backend_mode, provider)
+
+    async def _body() -> AsyncIterator[bytes]:
+        count = 0
+        errors = 0
+        index = 0
+        # (index, item) or (index, error message) for invalid lines, kept in input order
+        pending: List[Tuple[int, Union[StreamAnalyzeItem, str]]] = []
+        buf = b""
+        skipping = False  # inside an over-long line, discard until the next newline
+
+        def _parse(line: bytes) -> None:
+            nonlocal index
+            line = line.strip()
+            if not line:
+                return
+            cur = index
+            index += 1
+            if len(line) > max_line:
+                pending.append((cur, f"line exceeds {max_line} bytes"))
+                return
+            try:
+                item = StreamAnalyzeItem.model_validate_json(line)
+                if not item.text.strip():
+                    raise ValueError("text 不能为空")
+            except Exception as e:  # noqa: BLE001
+                pending.append((cur, f"invalid line: {e}"))
+                return
+            pending.append((cur, item))
+
+        async def _flush() -> AsyncIterator[bytes]:
+            nonlocal pending, count, errors
+            chunk, pending = pending, []
+            valid = [(i, it) for i, it in chunk if isinstance(it, StreamAnalyzeItem)]
+            lines: List[bytes] = []
+            if valid:
+                lines, n_errors = await _stream_chunk(valid, backend_mode, provider, emotion_model_name)
+                errors += n_errors
+            results = iter(lines)
+            for i, it in chunk:
+                count += 1
+                if isinstance(it, str):
+                    errors += 1
+                    yield _ndjson({"index": i, "error": it})
+                else:
+                    yield next(results)
+
+        async for data in request.stream():
+            buf += data
+            while True:
+                nl = buf.find(b"\n")
+                if nl < 0:
+                    break
+                line, buf = buf[:nl], buf[nl + 1 :]
+                if skipping:
+                    skipping = False
+                    continue
+                _parse(line)
+                if len(pending) >= size:
+                    async for out in _flush():
+                        yield out
+            if len(buf) > max_line and not skipping:
+                pending.append((index, f"line exceeds {max_line} bytes"))
+                index += 1
+                skipping = True
+            if skipping:
+                buf = b""
+        if buf and not skipping:
+            _parse(buf)
+        if pending:
+            async for out in _flush():
+                yield out
+        yield _ndjson({"done": True, "count": count, "errors": errors})
+
+    return _NDJSONStreamingResponse(_body(), media_type="application/x-ndjson")
+
+
+@app.post("/ingest", status_code=202, response_model=IngestAccepted)
+async def ingest(req: IngestRequest, request: Request):
+    """Fire-and-forget analysis: persist the message and return 202; user state is updated in the background."""
+    text = (req.text or "").strip()
+    userid = (req.userid or "").strip()
+    if not text or not userid:
+        raise HTTPException(status_code=400, detail="text 与 userid 不能为空")
+    key = (req.idempotency_key or request.headers.get("Idempotency-Key") or "").strip() or None
+    try:
+        seq, duplicate = await run_in_threadpool(
+            ingest_queue.enqueue, userid, (req.username or "").strip() or None, text, key
+        )
+    except IngestQueueFull as e:
+        logger.warning("Ingest rejected: %s", e)
+        raise HTTPException(status_code=get_infer_overload_status(), detail=str(e), headers={"Retry-After": "1"})
+    if not duplicate:
+        _ingest_wakeup.set()
+    return IngestAccepted(id=seq, duplicate=duplicate, queue_depth=ingest_queue.depth())
 
 
 @app.get("/user/{userid}", response_model=UserState, response_model_exclude_none=True)
@@ -479,45 +1427,148 @@ async def models_status():
         vad = get_vad_status()
     except Exception as e:  # pragma: no cover
         vad = {"error": str(e)}
-    return {"models": status, "vad": vad}
+    return {"models": status, "vad": vad, "autotune": _autotune_report(), "startup": _startup_report()}
+
+
+@app.post("/admin/models/reload")
+async def reload_models(request: Request, kind: Optional[str] = None, force: bool = False):
+    """Hot-swap to the currently selected local models (priority.txt / SENTRA_*_MODEL).
+
+    `kind`: sentiment | emotion (default both); `force` reloads even when the selection is unchanged.
+    """
+    token = get_admin_token()
+    if not token:
+        raise HTTPException(status_code=403, detail="admin endpoints are disabled (set EMO_ADMIN_TOKEN)")
+    if not hmac.compare_digest(request.headers.get("x-admin-token", ""), token):
+        raise HTTPException(status_code=403, detail="invalid admin token")
+    if kind is not None and kind not in {"sentiment", "emotion"}:
+        raise HTTPException(status_code=400, detail="kind must be 'sentiment' or 'emotion'")
+    kinds = [kind] if kind else ["sentiment", "emotion"]
+
+    def _reload_all() -> List[Dict[str, Any]]:
+        reload_model_selectors()
+        results = [_reload_model(k, force=force) for k in kinds]
+        models.release_retired()
+        return results
+
+    try:
+        results = await run_in_threadpool(_reload_all)
+    except Exception as e:  # noqa: BLE001
+        raise HTTPException(status_code=500, detail=f"model reload failed: {e}")
+    return {"results": results, "models": models.get_status()}
+
+
+def _score_summary(snap) -> Dict[str, Any]:
+    out = snap.summary()
+    return {k: out[k] for k in ("avg", "p50", "p95", "p99", "count")}
+
+
+# Token cache and padding stats live in the inference worker processes and aren't reported back
+_IN_WORKERS = {"available": False, "reason": "collected inside the inference worker processes"}
 
 
 @app.get("/metrics")
 async def metrics():
-    lat = _metrics["inference_latencies_ms"]
-    avg = (sum(lat) / len(lat)) if lat else None
-    es = _metrics["emotion_top1_scores"]
-    et = _metrics["emotion_top1_times"]
-    now = float(time.perf_counter())
-    def _recent(vals: List[float], times: List[float], window_sec: float):
-        if not vals or not times:
-            return {"avg": None, "p50": None, "p95": None, "p99": None, "count": 0}
-        sel = [v for v, t in zip(vals, times) if (now - t) <= window_sec]
-        if not sel:
-            return {"avg": None, "p50": None, "p95": None, "p99": None, "count": 0}
-        a = sum(sel) / len(sel)
-        return {"avg": float(a), "p50": _percentile(sel, 0.50), "p95": _percentile(sel, 0.95), "p99": _percentile(sel, 0.99), "count": len(sel)}
+    recent = _metrics["emotion_top1_score_recent"]
+    parallel = sentiment_inference is not inference
     return {
         "uptime_sec": (time.perf_counter() - _metrics["start_time"]),
-        "inference_count": _metrics["inference_count"],
-        "error_count": _metrics["error_count"],
-        "inference_latency_ms": {
-            "avg": float(avg) if avg is not None else None,
-            "p50": _percentile(lat, 0.50),
-            "p95": _percentile(lat, 0.95),
-            "p99": _percentile(lat, 0.99),
-        },
+        "inference_count": _metrics["inference_count"].value,
+        "error_count": _metrics["error_count"].value,
+        "inference_latency_ms": _metrics["inference_latency_ms"].summary(("avg", "p50", "p95", "p99", "count")),
         "model_load_sec": models.get_status(),
-        "device": get_device_report(),
-        "emotion_top1_score": {
-            "avg": (sum(es) / len(es)) if es else None,
-            "p50": _percentile(es, 0.50),
-            "p95": _percentile(es, 0.95),
-            "p99": _percentile(es, 0.99),
-            "count": len(es),
+        "inference_executor": inference.stats(),
+        "model_timings_ms": {
+            "parallel": parallel,
+            "sentiment": {
+                **_model_ms["sentiment"].summary(),
+                "threads": get_model_threads("sentiment") if parallel else None,
+                "executor": sentiment_inference.stats() if parallel else None,
+            },
+            "emotion": {
+                **_model_ms["emotion"].summary(),
+                "threads": get_model_threads("emotion") if parallel else None,
+                "executor": emotion_inference.stats() if parallel else None,
+            },
+            "combined": _model_ms["combined"].summary(),
         },
+        "result_cache": result_cache.stats(),
+        "dedup": {**{k: c.value for k, c in _dedup_stats.items()}, "inflight": len(_inflight)},
+        "stages_ms": stages.stats(),
+        "tokenization": models.tokenization_stats() if worker_pool is None else _IN_WORKERS,
+        "padding": models.padding_stats() if worker_pool is None else _IN_WORKERS,
+        "worker_pool": worker_pool.stats() if worker_pool is not None else None,
+        "ingest": ingest_queue.stats(),
+        "microbatch": {
+            "enabled": is_microbatch_enabled(),
+            "sentiment": sentiment_batcher.stats(),
+            "emotion": emotion_batcher.stats(),
+        },
+        "device": get_device_report() if not _online_only() else None,
+        "autotune": _autotune_report(),
+        "emotion_top1_score": _score_summary(_metrics["emotion_top1_score"].snapshot()),
         "emotion_top1_score_recent": {
-            "60s": _recent(es, et, 60.0),
-            "300s": _recent(es, et, 300.0),
+            "60s": _score_summary(recent.snapshot(60.0)),
+            "300s": _score_summary(recent.snapshot(300.0)),
         },
     }
+
+
+@app.get("/metrics/prometheus", response_class=PlainTextResponse)
+async def metrics_prometheus():
+    """Prometheus text exposition of the same counters and histograms (durations in seconds)."""
+    w = PrometheusWriter()
+    w.sample("uptime_seconds", "gauge", time.perf_counter() - _metrics["start_time"], "Seconds since the service started")
+    w.sample("analyze_total", "counter", _metrics["inference_count"].value, "Analysed texts (all endpoints)")
+    w.sample("analyze_errors_total", "counter", _metrics["error_count"].value, "Failed analyses")
+    w.histogram("analyze_duration_seconds", _metrics["inference_latency_ms"].snapshot(), "End-to-end analysis latency", scale=0.001)
+    for stage, snap in stages.snapshots().items():
+        w.histogram("stage_duration_seconds", snap, "Per-stage latency", {"stage": stage}, scale=0.001)
+    for kind, hist in _model_ms.items():
+        w.histogram("model_duration_seconds", hist.snapshot(), "Model forward latency per call", {"model": kind}, scale=0.001)
+    w.histogram("emotion_top1_score", _metrics["emotion_top1_score"].snapshot(), "Top-1 emotion score")
+
+    executors = [("infer", inference)]
+    if sentiment_inference is not inference:
+        executors += [("sentiment", sentiment_inference), ("emotion", emotion_inference)]
+    ex_stats = [(name, ex.stats()) for name, ex in executors]
+    for key, kind, help_text in (
+        ("queue_depth", "gauge", "Tasks waiting for an inference worker"),
+        ("running", "gauge", "Tasks running on inference workers"),
+        ("utilization", "gauge", "Busy fraction of inference workers since start"),
+        ("rejected", "counter", "Tasks rejected because the queue was full"),
+        ("expired", "counter", "Tasks dropped after waiting longer than the queue timeout"),
+        ("completed", "counter", "Finished inference tasks"),
+    ):
+        name = f"executor_{key}" + ("_total" if kind == "counter" else "")
+        for ex_name, st in ex_stats:
+            w.sample(name, kind, st[key], help_text, {"executor": ex_name})
+    for ex_name, ex in executors:
+        w.histogram("executor_wait_seconds", ex.wait_histogram(), "Time tasks waited before starting", {"executor": ex_name}, scale=0.001)
+
+    rc = result_cache.stats()
+    tc = models.tokenization_stats() if worker_pool is None else None
+    for key, kind in (("hits", "counter"), ("misses", "counter"), ("evictions", "counter"), ("entries", "gauge"), ("bytes", "gauge")):
+        name = f"cache_{key}" + ("_total" if kind == "counter" else "")
+        w.sample(name, kind, rc[key], f"Cache {key}", {"cache": "result"})
+        if tc is not None:
+            w.sample(name, kind, tc[key], f"Cache {key}", {"cache": "token"})
+
+    for kind in ("sentiment", "emotion"):
+        st = sentiment_batcher.stats() if kind == "sentiment" else emotion_batcher.stats()
+        w.sample("microbatch_batches_total", "counter", st["batches"], "Micro-batches run", {"model": kind})
+    for kind in ("sentiment", "emotion"):
+        st = sentiment_batcher.stats() if kind == "sentiment" else emotion_batcher.stats()
+        w.sample("microbatch_items_total", "counter", st["items"], "Texts run through micro-batches", {"model": kind})
+
+    ing = ingest_queue.stats()
+    w.sample("ingest_queue_depth", "gauge", ing["depth"], "Messages waiting in the ingest queue")
+    w.sample("ingest_oldest_age_seconds", "gauge", ing["oldest_age_sec"] or 0.0, "Age of the oldest queued ingest message")
+    w.sample("ingest_processed_total", "counter", ing["processed"], "Ingest messages applied")
+    w.sample("ingest_failed_total", "counter", ing["failed"], "Ingest messages dropped or dead-lettered after failed analysis")
+    w.sample("ingest_retries_total", "counter", ing["retries"], "Failed per-message ingest attempts")
+    w.sample("ingest_dead_lettered_total", "counter", ing["dead_lettered"], "Ingest messages moved to ingest_failed")
+    w.sample("ingest_duplicates_total", "counter", ing["duplicates"], "Ingest messages acknowledged by idempotency key")
+    w.sample("ingest_rejected_total", "counter", ing["rejected"], "Ingest messages rejected because the queue was full")
+    w.histogram("ingest_lag_seconds", ingest_queue.lag_histogram(), "Enqueue-to-applied latency of ingest messages", scale=0.001)
+    return PlainTextResponse(w.render(), media_type="text/plain; version=0.0.4; charset=utf-8")
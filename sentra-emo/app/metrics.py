@@ -0,0 +1,282 @@
+import bisect
+import math
+import threading
+import time
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+
+def exponential_bounds(start: float, factor: float, limit: float) -> List[float]:
+    """Bucket upper bounds start, start*factor, ... up to `limit`."""
+    bounds: List[float] = []
+    v = float(start)
+    while v < limit:
+        bounds.append(round(v, 6))
+        v *= factor
+    bounds.append(float(limit))
+    return bounds
+
+
+def linear_bounds(start: float, width: float, count: int) -> List[float]:
+    return [round(start + width * i, 6) for i in range(1, count + 1)]
+
+
+# ~12% relative resolution from 0.05 ms to 2 min
+LATENCY_MS_BOUNDS = exponential_bounds(0.05, 1.25, 120_000.0)
+# Scores in [0, 1] with 0.01 resolution
+SCORE_BOUNDS = linear_bounds(0.0, 0.01, 100)
+
+
+class HistogramSnapshot:
+    """Immutable merged view of bucket counts; quantiles are interpolated inside buckets."""
+
+    def __init__(self, bounds: Sequence[float], counts: List[int], total: float, count: int, vmin: float, vmax: float) -> None:
+        self.bounds = bounds
+        self.counts = counts  # len(bounds) + 1, last one is +Inf
+        self.sum = total
+        self.count = count
+        self.min = vmin
+        self.max = vmax
+
+    def quantile(self, q: float) -> Optional[float]:
+        if self.count <= 0:
+            return None
+        rank = q * self.count
+        seen = 0
+        for i, c in enumerate(self.counts):
+            if c and seen + c >= rank:
+                lo = self.bounds[i - 1] if i > 0 else min(self.min, self.bounds[0])
+                hi = self.bounds[i] if i < len(self.bounds) else self.max
+                lo, hi = max(lo, self.min), min(hi, self.max)
+                frac = (rank - seen) / c
+                return float(lo + (hi - lo) * min(1.0, max(0.0, frac)))
+            seen += c
+        return float(self.max)
+
+    def mean(self) -> Optional[float]:
+        return (self.sum / self.count) if self.count else None
+
+    def summary(self) -> Dict[str, Any]:
+        return {
+            "count": self.count,
+            "avg": self.mean(),
+            "p50": self.quantile(0.50),
+            "p95": self.quantile(0.95),
+            "p99": self.quantile(0.99),
+            "max": self.max if self.count else None,
+        }
+
+    def cumulative(self) -> List[Tuple[float, int]]:
+        """(upper bound, cumulative count) pairs ending with +Inf, for Prometheus exposition."""
+        out: List[Tuple[float, int]] = []
+        acc = 0
+        for i, c in enumerate(self.counts):
+            acc += c
+            out.append((self.bounds[i] if i < len(self.bounds) else math.inf, acc))
+        return out
+
+
+class Histogram:
+    """Fixed-bucket histogram: O(log buckets) record and constant-cost snapshots, lock-protected."""
+
+    def __init__(self, bounds: Sequence[float] = LATENCY_MS_BOUNDS) -> None:
+        self.bounds = list(bounds)
+        self._lock = threading.Lock()
+        self._counts = [0] * (len(self.bounds) + 1)
+        self._sum = 0.0
+        self._count = 0
+        self._min = math.inf
+        self._max = -math.inf
+
+    def observe(self, value: float) -> None:
+        v = float(value)
+        i = bisect.bisect_left(self.bounds, v)
+        with self._lock:
+            self._counts[i] += 1
+            self._sum += v
+            self._count += 1
+            if v < self._min:
+                self._min = v
+            if v > self._max:
+                self._max = v
+
+    def snapshot(self) -> HistogramSnapshot:
+        with self._lock:
+            return HistogramSnapshot(self.bounds, list(self._counts), self._sum, self._count, self._min, self._max)
+
+    def summary(self) -> Dict[str, Any]:
+        return self.snapshot().summary()
+
+
+class WindowedHistogram:
+    """Histogram over a sliding time window, kept as a ring of per-slot bucket arrays.
+
+    Recording touches one slot; a snapshot merges at most `window_sec / slot_sec` slots, so
+    the cost doesn't depend on traffic.
+    """
+
+    def __init__(self, bounds: Sequence[float], window_sec: float = 300.0, slot_sec: float = 10.0) -> None:
+        self.bounds = list(bounds)
+        self.slot_sec = float(slot_sec)
+        self.window_sec = float(window_sec)
+        self._n = max(1, int(math.ceil(window_sec / slot_sec)))
+        self._lock = threading.Lock()
+        self._slot_ids = [-1] * self._n
+        self._counts = [[0] * (len(self.bounds) + 1) for _ in range(self._n)]
+        self._sums = [0.0] * self._n
+        self._mins = [math.inf] * self._n
+        self._maxs = [-math.inf] * self._n
+
+    def observe(self, value: float, now: Optional[float] = None) -> None:
+        v = float(value)
+        sid = int((time.monotonic() if now is None else now) // self.slot_sec)
+        idx = sid % self._n
+        i = bisect.bisect_left(self.bounds, v)
+        with self._lock:
+            if self._slot_ids[idx] != sid:
+                self._slot_ids[idx] = sid
+                self._counts[idx] = [0] * (len(self.bounds) + 1)
+                self._sums[idx] = 0.0
+                self._mins[idx] = math.inf
+                self._maxs[idx] = -math.inf
+            self._counts[idx][i] += 1
+            self._sums[idx] += v
+            self._mins[idx] = min(self._mins[idx], v)
+            self._maxs[idx] = max(self._maxs[idx], v)
+
+    def snapshot(self, window_sec: Optional[float] = None, now: Optional[float] = None) -> HistogramSnapshot:
+        window = min(self.window_sec, float(window_sec or self.window_sec))
+        sid_now = int((time.monotonic() if now is None else now) // self.slot_sec)
+        keep = max(1, int(math.ceil(window / self.slot_sec)))
+        counts = [0] * (len(self.bounds) + 1)
+        total, vmin, vmax = 0.0, math.inf, -math.inf
+        with self._lock:
+            for idx in range(self._n):
+                sid = self._slot_ids[idx]
+                if sid < 0 or sid_now - sid >= keep:
+                    continue
+                for i, c in enumerate(self._counts[idx]):
+                    counts[i] += c
+                total += self._sums[idx]
+                vmin = min(vmin, self._mins[idx])
+                vmax = max(vmax, self._maxs[idx])
+        return HistogramSnapshot(self.bounds, counts, total, sum(counts), vmin, vmax)
+
+
+class RecentHistogram:
+    """Cumulative histogram plus a sliding-window ring over the same buckets.
+
+    `snapshot()` is the cumulative view (Prometheus computes rates itself); `summary()` reports
+    the recent windows, so a regression shows up in /metrics however long the process has run.
+    """
+
+    WINDOWS = (60.0, 300.0)
+
+    def __init__(self, bounds: Sequence[float] = LATENCY_MS_BOUNDS, window_sec: float = 300.0, slot_sec: float = 10.0) -> None:
+        self.bounds = list(bounds)
+        self._total = Histogram(bounds)
+        self._recent = WindowedHistogram(bounds, window_sec=window_sec, slot_sec=slot_sec)
+
+    def observe(self, value: float) -> None:
+        self._total.observe(value)
+        self._recent.observe(value)
+
+    def snapshot(self) -> HistogramSnapshot:
+        return self._total.snapshot()
+
+    def recent(self, window_sec: Optional[float] = None) -> HistogramSnapshot:
+        return self._recent.snapshot(window_sec)
+
+    def summary(self, keys: Optional[Sequence[str]] = None) -> Dict[str, Any]:
+        """Summary of the longest window, with "60s" / "300s" / "lifetime" sub-summaries."""
+
+        def _pick(snap: HistogramSnapshot) -> Dict[str, Any]:
+            out = snap.summary()
+            return {k: out[k] for k in keys} if keys else out
+
+        windows = {f"{int(w)}s": _pick(self.recent(w)) for w in self.WINDOWS if w <= self._recent.window_sec}
+        return {**_pick(self.recent()), **windows, "lifetime": _pick(self.snapshot())}
+
+
+class Counter:
+    def __init__(self) -> None:
+        self._lock = threading.Lock()
+        self._value = 0
+
+    def inc(self, n: int = 1) -> None:
+        with self._lock:
+            self._value += n
+
+    @property
+    def value(self) -> int:
+        return self._value
+
+
+# ----- Prometheus text exposition -----
+def process_rss_mb() -> Optional[float]:
+    """Resident memory of this process in MB (Linux /proc; None elsewhere)."""
+    try:
+        with open("/proc/self/status", encoding="utf-8") as f:
+            for line in f:
+                if line.startswith("VmRSS:"):
+                    return int(line.split()[1]) / 1024.0
+    except Exception:  # noqa: BLE001
+        pass
+    return None
+
+
+def _fmt(v: Any) -> str:
+    if v is None:
+        return "NaN"
+    if isinstance(v, bool):
+        return "1" if v else "0"
+    f = float(v)
+    if math.isinf(f):
+        return "+Inf" if f > 0 else "-Inf"
+    return repr(f) if not f.is_integer() else str(int(f))
+
+
+def _escape_label(v: Any) -> str:
+    return str(v).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _labels(labels: Optional[Dict[str, str]]) -> str:
+    if not labels:
+        return ""
+    inner = ",".join(f'{k}="{_escape_label(v)}"' for k, v in labels.items())
+    return "{" + inner + "}"
+
+
+class PrometheusWriter:
+    """Builds Prometheus text format (version 0.0.4)."""
+
+    def __init__(self, prefix: str = "sentra_emo_") -> None:
+        self.prefix = prefix
+        self._lines: List[str] = []
+        self._declared: set = set()
+
+    def _declare(self, name: str, kind: str, help_text: str) -> None:
+        if name not in self._declared:
+            self._declared.add(name)
+            self._lines.append(f"# HELP {name} {help_text}")
+            self._lines.append(f"# TYPE {name} {kind}")
+
+    def sample(self, name: str, kind: str, value: Any, help_text: str = "", labels: Optional[Dict[str, str]] = None) -> None:
+        full = self.prefix + name
+        self._declare(full, kind, help_text or name)
+        self._lines.append(f"{full}{_labels(labels)} {_fmt(value)}")
+
+    def histogram(
+        self, name: str, snap: HistogramSnapshot, help_text: str = "", labels: Optional[Dict[str, str]] = None, scale: float = 1.0
+    ) -> None:
+        """Emit a histogram; `scale` converts recorded units (e.g. 0.001 for ms -> seconds)."""
+        full = self.prefix + name
+        self._declare(full, "histogram", help_text or name)
+        base = dict(labels or {})
+        for le, acc in snap.cumulative():
+            le_s = "+Inf" if math.isinf(le) else _fmt(le * scale)
+            self._lines.append(f"{full}_bucket{_labels({**base, 'le': le_s})} {acc}")
+        self._lines.append(f"{full}_sum{_labels(base)} {_fmt(snap.sum * scale)}")
+        self._lines.append(f"{full}_count{_labels(base)} {snap.count}")
+
+    def render(self) -> str:
+        return "\n".join(self._lines) + "\n"
@@ -1,15 +1,18 @@
+from __future__ import annotations
+
+import importlib
 import logging
-from typing import Dict, List, Tuple, Optional, Any
+import sys
+from typing import TYPE_CHECKING, Dict, List, Tuple, Optional, Any
 import os
 from pathlib import Path
+import gc
+import threading
 import time
+import weakref
+
+import numpy as np
 
-from transformers import (
-    AutoTokenizer,
-    AutoModelForSequenceClassification,
-    TextClassificationPipeline,
-    pipeline,
-)
 from .config import (
     get_pipeline_device_index,
     get_model_selector,
@@ -17,24 +20,130 @@ from .config import (
     get_emotion_threshold,
     get_emotion_topk,
     get_sentiment_neutral_mode,
+    is_token_cache_enabled,
+    get_token_cache_max_mb,
+    get_model_max_length,
+    get_length_buckets,
+    get_engine,
+    is_parallel_models_enabled,
+    get_model_threads,
+    get_model_quantize,
+    is_mmap_weights_enabled,
 )
+from .tokenization import TokenCache, tokenizer_fingerprint
+from .timing import span
+
+if TYPE_CHECKING:
+    from transformers import TextClassificationPipeline
 
 logger = logging.getLogger(__name__)
 
+# torch / transformers are imported on first local model load (not at app import), so online-only
+# deployments never pay for them; how long each took is part of the startup profile
+_heavy_import_ms: Dict[str, float] = {}
+_heavy_import_lock = threading.Lock()
+
+
+def import_heavy(name: str) -> Any:
+    """Import an ML library on first use and record its import time."""
+    mod = sys.modules.get(name)
+    if mod is not None:
+        return mod
+    with _heavy_import_lock:
+        t0 = time.perf_counter()
+        mod = importlib.import_module(name)
+        if name not in _heavy_import_ms:
+            _heavy_import_ms[name] = (time.perf_counter() - t0) * 1000.0
+            logger.info(f"Imported {name} in {_heavy_import_ms[name]:.0f} ms")
+    return mod
+
+
+def heavy_import_times() -> Dict[str, float]:
+    """Milliseconds spent importing each heavy library (only those imported through import_heavy)."""
+    with _heavy_import_lock:
+        return dict(_heavy_import_ms)
+
+_MODEL_SOURCE_FILES = ("config.json", "model.safetensors", "pytorch_model.bin")
+
+
+def model_files_signature(model_dir: str) -> Dict[str, Any]:
+    """Size and mtime of a model directory's config and weights; artifacts derived from the
+    model (ONNX export, quantised weights) are rebuilt when this changes."""
+    sig: Dict[str, Any] = {}
+    for name in _MODEL_SOURCE_FILES:
+        p = Path(model_dir) / name
+        if p.exists():
+            st = p.stat()
+            sig[name] = [st.st_size, st.st_mtime_ns]
+    return sig
+
+
+class EmotionScores:
+    """One text's emotion model output: scores in class order and the (shared) label tuple they belong to."""
+
+    __slots__ = ("scores", "labels")
+
+    def __init__(self, scores: "np.ndarray", labels: Tuple[str, ...]) -> None:
+        self.scores = np.array(scores, dtype=np.float32)  # own copy, not a view of the batch
+        self.labels = labels
+
+    def __sizeof__(self) -> int:
+        # the label tuple is shared by every result of the model
+        return object.__sizeof__(self) + self.scores.nbytes
+
+
+def select_emotions(scores: "np.ndarray", multi: bool, threshold: float, topk: int) -> Tuple["np.ndarray", "np.ndarray", "np.ndarray"]:
+    """Label selection over an N x classes emotion score matrix, all rows at once.
+
+    Returns (order, ranked, keep), each N x classes: class ids highest score first (ties keep
+    class order), their scores (normalised per row unless multi-label) and which are selected.
+    """
+    if not multi:
+        # 归一化（多标签模式不归一化，保持独立概率）
+        scores = np.maximum(scores, 0.0)
+        totals = scores.sum(axis=1, keepdims=True)
+        scores = np.divide(scores, totals, out=scores, where=totals > 0)
+    order = np.argsort(-scores, axis=1, kind="stable")
+    ranked = np.take_along_axis(scores, order, axis=1)
+    if multi:
+        # 多标签：基于阈值与TopK选择；若为空，回退Top-1
+        keep = ranked >= threshold
+        if topk > 0:
+            keep &= np.cumsum(keep, axis=1) <= topk
+        if keep.shape[1]:
+            keep[~keep.any(axis=1), 0] = True
+    else:
+        # 单标签：返回降序分布，并支持 TopK 可见裁剪（若配置）
+        keep = np.ones(ranked.shape, dtype=bool)
+        if topk > 0:
+            keep[:, topk:] = False
+    return order, ranked, keep
+
 
 class ModelManager:
-    def __init__(self) -> None:
+    def __init__(self, engine: Optional[str] = None, quantize: Optional[str] = None) -> None:
+        # torch | onnx (EMO_ENGINE); onnx falls back to torch per model if export fails
+        self.engine = engine or get_engine()
+        # off | int8 for both models; None follows EMO_QUANTIZE / EMO_<KIND>_QUANTIZE
+        self._quantize = quantize
+        # Loaded pipelines carry their model_id / labels / load_sec, so one attribute read gives a
+        # consistent view even while a hot-swap replaces the model
         self._sentiment_pipe: Optional[TextClassificationPipeline] = None
-        self._sentiment_model_id: Optional[str] = None
         self._emotion_pipe: Optional[TextClassificationPipeline] = None
-        self._emotion_model_id: Optional[str] = None
+        self._load_lock = threading.RLock()
         # discovery and telemetry
         self._sentiment_candidates: List[str] = []
         self._emotion_candidates: List[str] = []
-        self._sentiment_load_sec: Optional[float] = None
-        self._emotion_load_sec: Optional[float] = None
+        # hot-swap: replaced pipelines still referenced by in-flight requests
+        self._retired: List[Tuple[str, str, "weakref.ref[Any]"]] = []
+        self._swaps: Dict[str, int] = {"sentiment": 0, "emotion": 0}
+        # Encoded inputs shared by both pipelines; entries are keyed by tokenizer fingerprint
+        self._token_cache = TokenCache(int(get_token_cache_max_mb() * 1024 * 1024), enabled=is_token_cache_enabled())
+        # padding telemetry per model kind: real vs padded tokens of the forward batches
+        self._padding_lock = threading.Lock()
+        self._padding: Dict[str, Dict[str, int]] = {}
     
-    def _build_local_candidates(self, kind: str) -> List[str]:
+    def _build_local_candidates(self, kind: str, *, quiet: bool = False) -> List[str]:
         """Discover local model directories under ./models/<kind>.
         Rules:
         - If ./models/<kind>/ has config.json directly, use that directory as a candidate.
@@ -88,208 +197,525 @@ class ModelManager:
         candidates = [str(p) for p in subs_sorted]
         if not candidates:
             logger.warning(f"No local models discovered under: {base}")
-        else:
+        elif not quiet:
             logger.info(f"Discovered local {kind} models: {candidates}")
         return candidates
 
-    def _load_first_available(self, model_ids: List[str], task: str, *, multilabel: bool = False) -> Tuple[TextClassificationPipeline, str, float]:
+    def _load_first_available(self, model_ids: List[str], task: str, *, kind: str, multilabel: bool = False) -> Tuple[TextClassificationPipeline, str, float]:
         last_err: Optional[Exception] = None
+        use_onnx = self.engine == "onnx"
+        quant = self.quantize_mode(kind)
+        import_heavy("torch")
+        transformers = import_heavy("transformers")
+        from .tokenization import CachingTextClassificationPipeline
         for mid in model_ids:
             try:
                 t0 = time.perf_counter()
-                tok = AutoTokenizer.from_pretrained(mid, local_files_only=True)
-                mdl = AutoModelForSequenceClassification.from_pretrained(mid, local_files_only=True)
-                device = get_pipeline_device_index()
+                tok = transformers.AutoTokenizer.from_pretrained(mid, local_files_only=True)
+                t_tok = time.perf_counter()
+                mdl = None
+                weights = "from_pretrained"
+                if quant == "int8" and not use_onnx:
+                    from .quantization import load_quantized
+
+                    mdl = load_quantized(mid)
+                    weights = "int8_cache" if mdl is not None else weights
+                if mdl is None:
+                    if is_mmap_weights_enabled():
+                        from .weights import load_model_mmap
+
+                        mdl = load_model_mmap(mid)
+                        weights = "mmap" if mdl is not None else weights
+                    if mdl is None:
+                        mdl = transformers.AutoModelForSequenceClassification.from_pretrained(mid, local_files_only=True)
+                    if quant == "int8" and not use_onnx:
+                        from .quantization import quantize_and_cache
+
+                        mdl = quantize_and_cache(mid, mdl)
+                t_weights = time.perf_counter()
+                # onnxruntime and quantised kernels run on CPU (the torch model stays there too)
+                device = -1 if (use_onnx or quant == "int8") else get_pipeline_device_index()
                 f2a = "sigmoid" if multilabel else None
-                pipe = pipeline(task=task, model=mdl, tokenizer=tok, device=device, function_to_apply=f2a)
-                dt = time.perf_counter() - t0
-                logger.info(f"Loaded model: {mid} for task={task} in {dt*1000:.1f} ms (device_index={device})")
+                pipe = transformers.pipeline(
+                    task=task,
+                    model=mdl,
+                    tokenizer=tok,
+                    device=device,
+                    function_to_apply=f2a,
+                    pipeline_class=CachingTextClassificationPipeline,
+                )
+                t_pipe = time.perf_counter()
+                pipe.model_id = mid
+                pipe.labels = self._labels_of(pipe)
+                pipe.activation = self._activation_of(pipe.model.config, multilabel)
+                if kind == "sentiment":
+                    pipe.sentiment_projection = self._sentiment_projections(pipe.labels)
+                if quant == "int8" and not use_onnx:
+                    pipe.quantization = "int8"
+                if use_onnx:
+                    self._attach_onnx(kind, mid, pipe, quant)
+                try:
+                    pipe.tokenizer_fingerprint = tokenizer_fingerprint(tok)
+                    pipe.token_cache = self._token_cache
+                except Exception as e:  # noqa: BLE001
+                    logger.warning(f"Token cache disabled for {mid}: {e}")
+                t_end = time.perf_counter()
+                dt = t_end - t0
+                pipe.load_sec = dt
+                pipe.weights_source = weights
+                pipe.load_breakdown = {
+                    "tokenizer": t_tok - t0,
+                    "weights": t_weights - t_tok,
+                    "pipeline": t_pipe - t_weights,
+                    # ONNX export / session setup and tokenizer fingerprinting
+                    "engine": t_end - t_pipe,
+                }
+                logger.info(
+                    f"Loaded model: {mid} for task={task} in {dt*1000:.1f} ms "
+                    f"(device_index={device}, engine={self._engine_of(pipe)}, quantization={getattr(pipe, 'quantization', None)}, weights={weights})"
+                )
                 return pipe, mid, dt
             except Exception as e:  # noqa: BLE001
                 last_err = e
                 logger.warning(f"Failed to load {mid} for {task}: {e}")
         raise RuntimeError(f"No available model for task={task}. Last error: {last_err}")
 
-    def ensure_sentiment(self):
-        if self._sentiment_pipe is None:
-            local = self._build_local_candidates("sentiment")
+    def quantize_mode(self, kind: str) -> str:
+        return self._quantize or get_model_quantize(kind)
+
+    @staticmethod
+    def _attach_onnx(kind: str, mid: str, pipe: TextClassificationPipeline, quant: str) -> None:
+        """Export (or reuse the cached export of) `mid` and route the pipeline's forward pass to onnxruntime."""
+        from .onnx_engine import OnnxSession, export_onnx
+
+        try:
+            path = export_onnx(mid, pipe.model, pipe.tokenizer)
+            if quant == "int8":
+                from .quantization import quantize_onnx
+
+                path = quantize_onnx(path)
+            threads = get_model_threads(kind) if is_parallel_models_enabled() else 0
+            pipe.onnx_session = OnnxSession(path, threads=threads)
+            if quant == "int8":
+                pipe.quantization = "int8"
+        except Exception as e:  # noqa: BLE001
+            logger.warning(f"ONNX engine unavailable for {mid}, using torch: {e}")
+
+    @staticmethod
+    def _engine_of(pipe: Optional[TextClassificationPipeline]) -> Optional[str]:
+        if pipe is None:
+            return None
+        return "onnx" if getattr(pipe, "onnx_session", None) is not None else "torch"
+
+    def _load_kind(self, kind: str, *, quiet: bool = False) -> TextClassificationPipeline:
+        """Load the currently selected model for `kind` (not installed)."""
+        local = self._build_local_candidates(kind, quiet=quiet)
+        if kind == "sentiment":
             self._sentiment_candidates = local
-            if not local:
-                base = Path(__file__).resolve().parents[1] / "models" / "sentiment"
-                raise RuntimeError(f"No local sentiment model found. Please place a HF model folder under: {base}")
-            pipe, mid, dt = self._load_first_available(local, task="text-classification")
-            self._sentiment_pipe, self._sentiment_model_id = pipe, mid
-            self._sentiment_load_sec = dt
-        return self._sentiment_pipe, self._sentiment_model_id
+        else:
+            self._emotion_candidates = local
+        if not local:
+            base = Path(__file__).resolve().parents[1] / "models" / kind
+            raise RuntimeError(f"No local {kind} model found. Please place a HF model folder under: {base}")
+        multilabel = is_emotion_multi_label() if kind == "emotion" else False
+        pipe, _, _ = self._load_first_available(local, task="text-classification", kind=kind, multilabel=multilabel)
+        return pipe
+
+    def ensure_sentiment(self):
+        pipe = self._sentiment_pipe
+        if pipe is None:
+            with self._load_lock:
+                if self._sentiment_pipe is None:
+                    self._sentiment_pipe = self._load_kind("sentiment")
+                    self._log_shared_tokenizer()
+                pipe = self._sentiment_pipe
+        return pipe, pipe.model_id
 
     def ensure_emotion(self):
-        if self._emotion_pipe is None:
-            local = self._build_local_candidates("emotion")
-            self._emotion_candidates = local
-            if not local:
-                base = Path(__file__).resolve().parents[1] / "models" / "emotion"
-                raise RuntimeError(f"No local emotion model found. Please place a HF model folder under: {base}")
-            pipe, mid, dt = self._load_first_available(local, task="text-classification", multilabel=is_emotion_multi_label())
-            self._emotion_pipe, self._emotion_model_id = pipe, mid
-            self._emotion_load_sec = dt
-        return self._emotion_pipe, self._emotion_model_id
+        pipe = self._emotion_pipe
+        if pipe is None:
+            with self._load_lock:
+                if self._emotion_pipe is None:
+                    self._emotion_pipe = self._load_kind("emotion")
+                    self._log_shared_tokenizer()
+                pipe = self._emotion_pipe
+        return pipe, pipe.model_id
+
+    def model_id(self, kind: str) -> Optional[str]:
+        pipe = self._sentiment_pipe if kind == "sentiment" else self._emotion_pipe
+        return getattr(pipe, "model_id", None)
+
+    # ----- hot-swap -----
+    def selected_candidate(self, kind: str) -> Optional[str]:
+        """Model directory that would be chosen now (priority.txt / selector env), without loading it."""
+        local = self._build_local_candidates(kind, quiet=True)
+        return local[0] if local else None
+
+    def load_candidate(self, kind: str, warmup_batches: List[List[str]]) -> TextClassificationPipeline:
+        """Load the currently selected model for `kind` and warm it up, without installing it."""
+        pipe = self._load_kind(kind, quiet=True)
+        for texts in warmup_batches:
+            self._score_batch(kind, pipe, texts)
+        return pipe
+
+    def load_model(self, kind: str, model_dir: str) -> TextClassificationPipeline:
+        """Load a specific model directory for `kind` (not installed), e.g. to match another process."""
+        multilabel = is_emotion_multi_label() if kind == "emotion" else False
+        pipe, _, _ = self._load_first_available([model_dir], task="text-classification", kind=kind, multilabel=multilabel)
+        return pipe
+
+    def install(self, kind: str, pipe: TextClassificationPipeline) -> Optional[TextClassificationPipeline]:
+        """Make `pipe` the model for `kind` (a single attribute store). Calls that already fetched
+        the old pipeline finish on it; it is released once they drop their references."""
+        with self._load_lock:
+            if kind == "sentiment":
+                old, self._sentiment_pipe = self._sentiment_pipe, pipe
+            else:
+                old, self._emotion_pipe = self._emotion_pipe, pipe
+            self._swaps[kind] += 1
+            if old is not None:
+                self._retired.append((kind, old.model_id, weakref.ref(old)))
+        self._log_shared_tokenizer()
+        return old
+
+    def release_retired(self) -> int:
+        """Collect replaced pipelines whose in-flight calls have finished; returns how many are still in use."""
+        with self._load_lock:
+            if not self._retired:
+                return 0
+        gc.collect()
+        with self._load_lock:
+            alive = [r for r in self._retired if r[2]() is not None]
+            released = len(self._retired) - len(alive)
+            self._retired = alive
+        if released:
+            logger.info(f"Released {released} replaced model(s)")
+        return len(alive)
+
+    def shares_tokenizer(self) -> bool:
+        """Whether both loaded models tokenise identically (encodings are then computed once for both)."""
+        fp_s = getattr(self._sentiment_pipe, "tokenizer_fingerprint", None)
+        fp_e = getattr(self._emotion_pipe, "tokenizer_fingerprint", None)
+        return bool(fp_s) and fp_s == fp_e
+
+    def _log_shared_tokenizer(self) -> None:
+        if self.shares_tokenizer():
+            logger.info("Sentiment and emotion models share a tokenizer; encodings are reused across both")
+
+    def tokenization_stats(self) -> Dict[str, Any]:
+        return {"shared_tokenizer": self.shares_tokenizer(), **self._token_cache.stats()}
+
+    def emotion_labels(self, pipe: Optional[TextClassificationPipeline] = None) -> List[str]:
+        """Labels of the emotion model (`pipe`, default the loaded one) in class-index order (computed once at load)."""
+        pipe = pipe if pipe is not None else self._emotion_pipe
+        return list(getattr(pipe, "labels", None) or [])
 
     @staticmethod
-    def _normalize_scores(items, *, normalize: bool = True) -> List[Tuple[str, float]]:
-        """支持 return_all_scores 或 top_k=None 风格输出，统一为 (label, score) 列表。"""
-        # items 可能是 [{'label':..., 'score':...}, ...] 或 [[{...}, {...}, ...]]
-        if isinstance(items, list) and items and isinstance(items[0], list):
-            items = items[0]
-        pairs: List[Tuple[str, float]] = []
-        for it in items:
-            label = str(it.get("label", "")).strip()
-            score = float(it.get("score", 0.0))
-            pairs.append((label, score))
-        # 归一化（多标签模式通常不归一化，保持独立概率）
+    def _labels_of(pipe: TextClassificationPipeline) -> List[str]:
+        labels: List[str] = []
+        try:
+            id2label = getattr(pipe.model.config, "id2label", None)
+            if isinstance(id2label, dict) and id2label:
+                numeric_keys = [k for k in id2label.keys() if isinstance(k, int) or (isinstance(k, str) and str(k).isdigit())]
+                if numeric_keys:
+                    idxs = sorted([int(k) for k in id2label.keys()])
+                    labels = [str(id2label[i]).strip() for i in idxs]
+                else:
+                    labels = [str(v).strip() for v in id2label.values()]
+        except Exception:
+            labels = []
+        num_labels = getattr(getattr(pipe.model, "config", None), "num_labels", None)
+        if isinstance(num_labels, int) and len(labels) != num_labels:
+            labels = [f"LABEL_{i}" for i in range(num_labels)]
+        return labels
+
+    @staticmethod
+    def _activation_of(config: Any, multilabel: bool) -> str:
+        """Score function applied to the logits, as the HF text-classification pipeline picks it."""
+        if multilabel:
+            return "sigmoid"
+        if getattr(config, "problem_type", None) == "multi_label_classification" or getattr(config, "num_labels", 2) == 1:
+            return "sigmoid"
+        return "softmax"
+
+    @staticmethod
+    def _pairs(labels: List[str], row: "np.ndarray", *, normalize: bool = True) -> List[Tuple[str, float]]:
+        """One score row as (label, score) pairs, highest first (ties keep class order)."""
         if normalize:
-            total = sum(max(0.0, s) for _, s in pairs)
+            # 归一化（多标签模式通常不归一化，保持独立概率）
+            row = np.maximum(row, 0.0)
+            total = float(row.sum())
             if total > 0:
-                pairs = [(l, max(0.0, s) / total) for l, s in pairs]
-        return pairs
+                row = row / total
+        return [(labels[i], float(row[i])) for i in np.argsort(-row, kind="stable")]
+
+    @staticmethod
+    def _model_max_length(kind: str, pipe: TextClassificationPipeline) -> int:
+        """Token limit for one model: EMO_<KIND>_MAX_LENGTH capped by what the model supports."""
+        limits: List[int] = []
+        n_pos = getattr(pipe.model.config, "max_position_embeddings", None)
+        if isinstance(n_pos, int) and n_pos > 0:
+            limits.append(n_pos)
+        tok_max = getattr(pipe.tokenizer, "model_max_length", None)
+        if isinstance(tok_max, int) and 0 < tok_max < 100_000:  # HF uses a huge sentinel when unset
+            limits.append(tok_max)
+        limit = min(limits) if limits else 512
+        configured = get_model_max_length(kind)
+        return min(configured, limit) if configured > 0 else limit
+
+    @staticmethod
+    def _bucketize(lengths: List[int], edges: List[int]) -> List[List[int]]:
+        """Group text indices into length buckets (sorted by length inside each bucket)."""
+        groups: Dict[int, List[int]] = {}
+        for i in sorted(range(len(lengths)), key=lambda j: lengths[j]):
+            b = next((k for k, edge in enumerate(edges) if lengths[i] <= edge), len(edges))
+            groups.setdefault(b, []).append(i)
+        return [groups[b] for b in sorted(groups)]
+
+    @staticmethod
+    def _collate(pipe: TextClassificationPipeline, encodings: List[Dict[str, Any]]) -> Dict[str, Any]:
+        """Pad per-text encodings (1 x length each) into one batch on the tokenizer's padding side."""
+        torch = import_heavy("torch")
+        tok = pipe.tokenizer
+        width = max(int(e["input_ids"].shape[-1]) for e in encodings)
+        left = getattr(tok, "padding_side", "right") == "left"
+        batch: Dict[str, Any] = {}
+        for key, first in encodings[0].items():
+            pad = (tok.pad_token_id or 0) if key == "input_ids" else 0
+            out = torch.full((len(encodings), width), pad, dtype=first.dtype)
+            for i, enc in enumerate(encodings):
+                row = enc[key][0]
+                if left:
+                    out[i, width - row.shape[-1]:] = row
+                else:
+                    out[i, : row.shape[-1]] = row
+            batch[key] = out
+        return batch
+
+    @staticmethod
+    def _forward_logits(pipe: TextClassificationPipeline, batch: Dict[str, Any]) -> "np.ndarray":
+        session = getattr(pipe, "onnx_session", None)
+        if session is not None:
+            return np.asarray(session.run(batch), dtype=np.float32)
+        torch = import_heavy("torch")
+        device = pipe.device
+        if device.type != "cpu":
+            batch = {k: v.to(device) for k, v in batch.items()}
+        with torch.inference_mode():
+            logits = pipe.model(**batch).logits
+        return logits.float().cpu().numpy()
+
+    @staticmethod
+    def _activate(logits: "np.ndarray", activation: str) -> "np.ndarray":
+        if activation == "sigmoid":
+            return 1.0 / (1.0 + np.exp(-logits))
+        if activation == "softmax":
+            shifted = np.exp(logits - logits.max(axis=-1, keepdims=True))
+            return shifted / shifted.sum(axis=-1, keepdims=True)
+        return logits
+
+    def _score_batch(self, kind: str, pipe: TextClassificationPipeline, texts: List[str]) -> "np.ndarray":
+        """Tokenizer -> model -> softmax/sigmoid over all texts: scores (len(texts) x classes) in
+        class-index order (labels: `pipe.labels`). Bypasses the HF pipeline's per-text pre/post-processing.
+
+        Inputs are truncated to the model's token limit. With EMO_LENGTH_BUCKETS, texts are
+        split into length buckets and each bucket is one forward pass, so short messages are
+        not padded to the longest one in the batch.
+        """
+        max_length = self._model_max_length(kind, pipe)
+        tok_kwargs: Dict[str, Any] = {"truncation": True, "max_length": max_length}
+        # Per-text encodings go through the token cache (shared across models with the same tokenizer)
+        encodings = [pipe.preprocess(t, **tok_kwargs) for t in texts]
+        lengths = [int(e["input_ids"].shape[-1]) for e in encodings]
+        edges = get_length_buckets()
+        groups = self._bucketize(lengths, edges) if (edges and len(texts) > 1) else [list(range(len(texts)))]
+        scores: Optional[np.ndarray] = None
+        for idxs in groups:
+            with span("forward"):
+                logits = self._forward_logits(pipe, self._collate(pipe, [encodings[i] for i in idxs]))
+            if scores is None:
+                scores = np.empty((len(texts), logits.shape[-1]), dtype=np.float32)
+            scores[idxs] = self._activate(logits, pipe.activation)
+        self._record_padding(kind, max_length, lengths, groups)
+        return scores if scores is not None else np.empty((0, len(pipe.labels)), dtype=np.float32)
+
+    def score_batch(self, kind: str, texts: List[str]) -> Tuple["np.ndarray", List[str]]:
+        """(scores: len(texts) x classes, labels in column order) from the loaded `kind` model."""
+        pipe, _ = self.ensure_sentiment() if kind == "sentiment" else self.ensure_emotion()
+        return self._score_batch(kind, pipe, texts), pipe.labels
+
+    def _record_padding(self, kind: str, max_length: int, lengths: List[int], groups: List[List[int]]) -> None:
+        if not lengths:
+            return
+        padded = sum(len(g) * max(lengths[i] for i in g) for g in groups)
+        with self._padding_lock:
+            st = self._padding.setdefault(
+                kind,
+                {"batches": 0, "forward_passes": 0, "texts": 0, "real_tokens": 0, "padded_tokens": 0, "unbucketed_padded_tokens": 0, "truncated": 0},
+            )
+            st["max_length"] = max_length
+            st["batches"] += 1
+            st["forward_passes"] += len(groups)
+            st["texts"] += len(lengths)
+            st["real_tokens"] += sum(lengths)
+            st["padded_tokens"] += padded
+            st["unbucketed_padded_tokens"] += len(lengths) * max(lengths)
+            st["truncated"] += sum(1 for n in lengths if n >= max_length)
+
+    def padding_stats(self) -> Dict[str, Any]:
+        """Real vs padded tokens per model; `efficiency` = real / padded (1.0 means no padding)."""
+        out: Dict[str, Any] = {"buckets": get_length_buckets()}
+        with self._padding_lock:
+            for kind, st in self._padding.items():
+                out[kind] = {
+                    **st,
+                    "efficiency": (st["real_tokens"] / st["padded_tokens"]) if st["padded_tokens"] else None,
+                    "efficiency_unbucketed": (st["real_tokens"] / st["unbucketed_padded_tokens"]) if st["unbucketed_padded_tokens"] else None,
+                }
+        return out
 
     def analyze_sentiment(self, text: str) -> Dict:
+        return self.analyze_sentiment_batch([text])[0]
+
+    def analyze_sentiment_batch(self, texts: List[str]) -> List[Dict]:
+        if not texts:
+            return []
         pipe, mid = self.ensure_sentiment()
-        # 取全分布
-        try:
-            raw = pipe(text, top_k=None)
-        except Exception:  # transformers 旧版兼容
-            raw = pipe(text, return_all_scores=True)
-        pairs = self._normalize_scores(raw)
-        neutral_mode = get_sentiment_neutral_mode()  # auto|on|off
-
-        # 特殊模型标签处理
-        scores: Dict[str, float] = {}
-
-        # 1) nlptown 5星 -> 三类
-        if mid.startswith("nlptown/bert-base-multilingual-uncased-sentiment"):
-            star_scores: Dict[int, float] = {}
-            for lbl, s in pairs:
-                # label like "1 star" or "5 stars"
-                parts = lbl.split()
-                try:
-                    star = int(parts[0])
-                except Exception:
-                    continue
-                star_scores[star] = s
-            neg = star_scores.get(1, 0.0) + star_scores.get(2, 0.0)
-            neu = star_scores.get(3, 0.0)
-            pos = star_scores.get(4, 0.0) + star_scores.get(5, 0.0)
-            total = max(1e-9, neg + neu + pos)
-            scores = {"negative": neg / total, "neutral": neu / total, "positive": pos / total}
-            # 根据 neutral 策略裁剪
-            if neutral_mode == "off":
-                pos_neg = scores.get("positive", 0.0) + scores.get("negative", 0.0)
-                if pos_neg <= 0:
-                    # 无法区分时默认偏正向
-                    scores = {"positive": 1.0, "negative": 0.0}
-                else:
-                    scores = {
-                        "positive": scores.get("positive", 0.0) / pos_neg,
-                        "negative": scores.get("negative", 0.0) / pos_neg,
-                    }
-        else:
-            # 通用：将标签名包含正/负/中性的进行标准化
-            tmp: Dict[str, float] = {}
-            # 判断模型是否天然包含 neutral 类
-            model_has_neutral = False
-            try:
-                id2label = getattr(pipe.model.config, "id2label", {})
-                if isinstance(id2label, dict):
-                    for v in id2label.values():
-                        lv = str(v).lower()
-                        if ("neu" in lv) or ("neutral" in lv):
-                            model_has_neutral = True
-                            break
-            except Exception:
-                pass
-            unknown_sum = 0.0
-            for lbl, s in pairs:
-                l = lbl.lower()
-                if "pos" in l or "positive" in l:
-                    tmp["positive"] = tmp.get("positive", 0.0) + s
-                elif "neg" in l or "negative" in l:
-                    tmp["negative"] = tmp.get("negative", 0.0) + s
-                elif "neu" in l or "neutral" in l:
-                    tmp["neutral"] = tmp.get("neutral", 0.0) + s
-                else:
-                    # 未知标签：先累计，稍后仅在确有 neutral 且允许时并入 neutral
-                    unknown_sum += s
-            # 若模型确实包含 neutral 且策略允许，将未知并入 neutral
-            if (model_has_neutral and neutral_mode != "off") and unknown_sum > 0:
-                tmp["neutral"] = tmp.get("neutral", 0.0) + unknown_sum
-            # 归一
-            total = sum(tmp.values()) or 1.0
-            scores = {k: v / total for k, v in tmp.items()}
-            # 根据策略裁剪 neutral
-            if neutral_mode == "off" or (neutral_mode == "auto" and not model_has_neutral):
-                # 删除 neutral 并重归一
-                pos = scores.get("positive", 0.0)
-                neg = scores.get("negative", 0.0)
-                denom = pos + neg
-                if denom <= 0:
-                    # 若两者皆0，则回退：pos=1, neg=0
-                    scores = {"positive": 1.0, "negative": 0.0}
-                else:
-                    scores = {"positive": pos / denom, "negative": neg / denom}
+        scores = self._score_batch("sentiment", pipe, texts)
+        matrix, keep_neutral = pipe.sentiment_projection[get_sentiment_neutral_mode()]
+        with span("postprocess"):
+            names, dist = self._project_sentiment(scores.astype(np.float64), matrix, keep_neutral)
+            best = dist.argmax(axis=1)
+            return [
+                {"label": names[j], "scores": dict(zip(names, row)), "raw_model": mid}
+                for j, row in zip(best, dist.tolist())
+            ]
+
+    @staticmethod
+    def _sentiment_projections(labels: List[str]) -> Dict[str, Tuple["np.ndarray", bool]]:
+        """{neutral mode: (classes x 3 matrix onto negative/neutral/positive, keep neutral)}, compiled
+        once per model from its labels so post-processing a batch is a single matrix product."""
+        n = len(labels)
+        stars: List[Optional[int]] = []
+        for lbl in labels:
+            parts = lbl.lower().split()
+            is_star = len(parts) == 2 and parts[0].isdigit() and parts[1] in ("star", "stars")
+            stars.append(int(parts[0]) if is_star else None)
+        if labels and all(s is not None for s in stars):
+            # 5星模型（如 nlptown）-> 三类：1-2 负向，3 中性，4-5 正向
+            matrix = np.zeros((n, 3))
+            for i, star in enumerate(stars):
+                if star in (1, 2, 3, 4, 5):
+                    matrix[i, (0, 0, 1, 2, 2)[star - 1]] = 1.0
+            return {mode: (matrix, mode != "off") for mode in ("auto", "on", "off")}
+
+        # 通用：将标签名包含正/负/中性的映射到对应类
+        base = np.zeros((n, 3))
+        unknown: List[int] = []
+        for i, lbl in enumerate(labels):
+            l = lbl.lower()
+            if "pos" in l:
+                base[i, 2] = 1.0
+            elif "neg" in l:
+                base[i, 0] = 1.0
+            elif "neu" in l:
+                base[i, 1] = 1.0
             else:
-                # 保证三类键存在再归一
-                for k in ("negative", "neutral", "positive"):
-                    scores.setdefault(k, 0.0)
-                total = sum(scores.values()) or 1.0
-                scores = {k: v / total for k, v in scores.items()}
-
-        # 取最大为标签
-        label = max(scores.items(), key=lambda x: x[1])[0]
-        return {
-            "label": label,
-            "scores": scores,
-            "raw_model": mid,
-        }
+                unknown.append(i)
+        model_has_neutral = bool(base[:, 1].any())
+        out: Dict[str, Tuple[np.ndarray, bool]] = {}
+        for mode in ("auto", "on", "off"):
+            matrix = base.copy()
+            # 未知标签仅在模型确有 neutral 且策略允许时并入 neutral
+            if model_has_neutral and mode != "off":
+                matrix[unknown, 1] = 1.0
+            out[mode] = (matrix, mode == "on" or (mode == "auto" and model_has_neutral))
+        return out
+
+    @staticmethod
+    def _project_sentiment(scores: "np.ndarray", matrix: "np.ndarray", keep_neutral: bool) -> Tuple[List[str], "np.ndarray"]:
+        """N x classes model scores -> (sentiment names, N x len(names) distribution)."""
+        probs = np.maximum(scores, 0.0)
+        totals = probs.sum(axis=1, keepdims=True)
+        probs = np.divide(probs, totals, out=probs, where=totals > 0)
+        dist = probs @ matrix
+        if keep_neutral:
+            totals = dist.sum(axis=1, keepdims=True)
+            return ["negative", "neutral", "positive"], np.divide(dist, totals, out=dist, where=totals > 0)
+        # 删除 neutral 并重归一
+        dist = dist[:, [2, 0]]
+        totals = dist.sum(axis=1, keepdims=True)
+        dist = np.divide(dist, totals, out=dist, where=totals > 0)
+        # 若两者皆0，则回退：pos=1, neg=0
+        dist[totals[:, 0] <= 0] = (1.0, 0.0)
+        return ["positive", "negative"], dist
 
     def analyze_emotions(self, text: str) -> List[Tuple[str, float]]:
+        return self.analyze_emotions_batch([text])[0]
+
+    def analyze_emotions_batch(self, texts: List[str]) -> List[List[Tuple[str, float]]]:
+        """Selected (label, score) pairs per text, highest first (model labels, no aliasing)."""
+        if not texts:
+            return []
         pipe, _ = self.ensure_emotion()
-        try:
-            raw = pipe(text, top_k=None)
-        except Exception:
-            raw = pipe(text, return_all_scores=True)
-        multi = is_emotion_multi_label()
-        pairs = self._normalize_scores(raw, normalize=(not multi))
-        # 多标签：基于阈值与TopK选择；若为空，回退Top-1
-        if multi:
-            thr = get_emotion_threshold()
-            topk = get_emotion_topk()
-            selected = [(l, s) for (l, s) in pairs if s >= thr]
-            selected.sort(key=lambda x: x[1], reverse=True)
-            if topk and len(selected) > topk:
-                selected = selected[:topk]
-            if not selected and pairs:
-                selected = [max(pairs, key=lambda x: x[1])]
-            return selected
-        # 单标签：返回降序分布，并支持 TopK 可见裁剪（若配置）
-        sorted_pairs = sorted(pairs, key=lambda x: x[1], reverse=True)
-        topk = get_emotion_topk()
-        if topk and len(sorted_pairs) > topk:
-            return sorted_pairs[:topk]
-        return sorted_pairs
+        scores = self._score_batch("emotion", pipe, texts)
+        with span("postprocess"):
+            order, ranked, keep = select_emotions(
+                scores.astype(np.float64), is_emotion_multi_label(), get_emotion_threshold(), get_emotion_topk()
+            )
+            labels = pipe.labels
+            return [
+                [(labels[c], s) for c, s, k in zip(o, r, kp) if k]
+                for o, r, kp in zip(order.tolist(), ranked.tolist(), keep.tolist())
+            ]
+
+    def emotion_scores_batch(self, texts: List[str]) -> List[EmotionScores]:
+        """Raw emotion model scores per text (selection and label strings are left to post-processing)."""
+        if not texts:
+            return []
+        pipe, _ = self.ensure_emotion()
+        scores = self._score_batch("emotion", pipe, texts)
+        labels = tuple(pipe.labels)
+        return [EmotionScores(row, labels) for row in scores]
 
     def get_status(self) -> Dict[str, Any]:
         """Return discovery and loading status for models."""
-        return {
-            "sentiment": {
-                "selected": self._sentiment_model_id,
-                "candidates": list(self._sentiment_candidates),
-                "loaded": bool(self._sentiment_pipe is not None),
-                "load_time_sec": float(self._sentiment_load_sec) if self._sentiment_load_sec is not None else None,
-            },
-            "emotion": {
-                "selected": self._emotion_model_id,
-                "candidates": list(self._emotion_candidates),
-                "loaded": bool(self._emotion_pipe is not None),
-                "load_time_sec": float(self._emotion_load_sec) if self._emotion_load_sec is not None else None,
-            },
-        }
+        status: Dict[str, Any] = {}
+        for kind, pipe, candidates in (
+            ("sentiment", self._sentiment_pipe, self._sentiment_candidates),
+            ("emotion", self._emotion_pipe, self._emotion_candidates),
+        ):
+            load_sec = getattr(pipe, "load_sec", None)
+            status[kind] = {
+                "selected": getattr(pipe, "model_id", None),
+                "candidates": list(candidates),
+                "loaded": bool(pipe is not None),
+                "engine": self._engine_of(pipe),
+                "quantization": getattr(pipe, "quantization", None),
+                "load_time_sec": float(load_sec) if load_sec is not None else None,
+                "load_breakdown_sec": getattr(pipe, "load_breakdown", None),
+                "weights": getattr(pipe, "weights_source", None),
+                "swaps": self._swaps[kind],
+            }
+        with self._load_lock:
+            status["retired_in_use"] = [mid for _, mid, ref in self._retired if ref() is not None]
+        return status
+
+
+def set_thread_budget(num_threads: int) -> None:
+    """Limit torch intra-op threads for the calling thread (used as an executor thread initializer).
+
+    With the OpenMP backend the setting is per thread, so each model's workers keep their own budget.
+    """
+    try:
+        import_heavy("torch").set_num_threads(max(1, int(num_threads)))
+    except Exception as e:  # noqa: BLE001
+        logger.warning("Failed to set torch thread budget to %s: %s", num_threads, e)
+
+
+def set_interop_threads(num_threads: int) -> None:
+    """Set torch's process-wide inter-op pool size (only possible before any inter-op work ran)."""
+    try:
+        import_heavy("torch").set_num_interop_threads(max(1, int(num_threads)))
+    except Exception as e:  # noqa: BLE001
+        logger.info("Torch inter-op threads left unchanged: %s", e)
@@ -0,0 +1,190 @@
+"""ONNX Runtime engine for local models (EMO_ENGINE=onnx).
+
+Each local model directory is exported to ONNX once; the artifact is cached next to the model
+(`<model_dir>/onnx/model.onnx` plus `export.json` describing what it was built from) and
+re-exported only when the weights or config change. Tokenisation and scoring are shared with
+the torch engine (ModelManager feeds the session directly), so results are the same up to float
+rounding.
+
+Parity check against the torch engine:
+  python -m app.onnx_engine                      # built-in sample texts
+  python -m app.onnx_engine --file texts.txt     # one text per line
+"""
+from __future__ import annotations
+
+import argparse
+import inspect
+import json
+import logging
+import os
+import threading
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Sequence
+
+import torch
+
+from .models import import_heavy, model_files_signature
+
+logger = logging.getLogger(__name__)
+
+ONNX_OPSET = 17
+
+
+def onnx_dir(model_dir: str) -> Path:
+    return Path(model_dir) / "onnx"
+
+
+class _LogitsOnly(torch.nn.Module):
+    """Positional-input wrapper: the exporter binds graph input names to forward() positions,
+    so HF's keyword signature (input_ids, attention_mask, token_type_ids, ...) is pinned here."""
+
+    def __init__(self, model: torch.nn.Module, input_names: Sequence[str]) -> None:
+        super().__init__()
+        self.model = model
+        self.input_names = list(input_names)
+
+    def forward(self, *tensors: torch.Tensor) -> torch.Tensor:
+        return self.model(**dict(zip(self.input_names, tensors))).logits
+
+
+def export_onnx(model_dir: str, model: Any, tokenizer: Any) -> Path:
+    """Export `model` to `<model_dir>/onnx/model.onnx` unless an up-to-date export exists."""
+    out_dir = onnx_dir(model_dir)
+    path = out_dir / "model.onnx"
+    meta_path = out_dir / "export.json"
+    sig = {"opset": ONNX_OPSET, **model_files_signature(model_dir)}
+    if path.exists() and meta_path.exists():
+        try:
+            if json.loads(meta_path.read_text(encoding="utf-8")).get("source") == sig:
+                return path
+        except Exception:  # noqa: BLE001
+            pass
+
+    sample = tokenizer(["样例文本 sample", "短"], return_tensors="pt", padding=True)
+    forward_args = inspect.signature(model.forward).parameters
+    input_names = [k for k in sample.keys() if k in forward_args]
+    dynamic_axes: Dict[str, Dict[int, str]] = {k: {0: "batch", 1: "sequence"} for k in input_names}
+    dynamic_axes["logits"] = {0: "batch"}
+
+    out_dir.mkdir(parents=True, exist_ok=True)
+    tmp = out_dir / f"model.onnx.{os.getpid()}.tmp"
+    was_training = model.training
+    wrapper = _LogitsOnly(model, input_names).eval()
+    # TorchScript exporter; `dynamo` exists (and may default to True) only from torch 2.5
+    extra: Dict[str, Any] = {}
+    if "dynamo" in inspect.signature(torch.onnx.export).parameters:
+        extra["dynamo"] = False
+    try:
+        with torch.no_grad():
+            torch.onnx.export(
+                wrapper,
+                tuple(sample[k] for k in input_names),
+                str(tmp),
+                input_names=input_names,
+                output_names=["logits"],
+                dynamic_axes=dynamic_axes,
+                opset_version=ONNX_OPSET,
+                **extra,
+            )
+        os.replace(tmp, path)
+    finally:
+        # the exporter restores the wrapper's mode onto the wrapped model
+        model.train(was_training)
+        if tmp.exists():
+            tmp.unlink()
+    meta_path.write_text(json.dumps({"source": sig, "inputs": input_names}, indent=2), encoding="utf-8")
+    logger.info(f"Exported ONNX model: {path}")
+    return path
+
+
+class OnnxSession:
+    """onnxruntime CPU session for one exported model.
+
+    The session is (re)created lazily per process, so forked inference workers never reuse the
+    parent's onnxruntime thread pools. `threads` = 0 follows torch's thread budget of the thread
+    that creates it.
+    """
+
+    def __init__(self, path: Path, threads: int = 0) -> None:
+        self.path = Path(path)
+        self.threads = max(0, int(threads))
+        meta = json.loads((self.path.parent / "export.json").read_text(encoding="utf-8"))
+        self.input_names: List[str] = list(meta["inputs"])
+        self._lock = threading.Lock()
+        self._session: Any = None
+        self._pid: Optional[int] = None
+
+    def _get(self) -> Any:
+        if self._session is None or self._pid != os.getpid():
+            with self._lock:
+                if self._session is None or self._pid != os.getpid():
+                    ort = import_heavy("onnxruntime")
+                    opts = ort.SessionOptions()
+                    opts.intra_op_num_threads = self.threads or torch.get_num_threads()
+                    opts.inter_op_num_threads = 1
+                    opts.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+                    self._session = ort.InferenceSession(str(self.path), opts, providers=["CPUExecutionProvider"])
+                    self._pid = os.getpid()
+        return self._session
+
+    def run(self, inputs: Dict[str, Any]) -> Any:
+        feeds = {name: inputs[name].numpy() for name in self.input_names}
+        return self._get().run(["logits"], feeds)[0]
+
+
+# ----- Parity check -----
+SAMPLE_TEXTS = [
+    "今天天气真好，心情特别愉快！",
+    "这件事让我非常生气，简直不可理喻。",
+    "我有点担心明天的考试。",
+    "嗯，知道了。",
+    "I can't believe how wonderful this day has been.",
+    "这家餐厅的服务太差了，再也不来了，等了一个小时才上菜，菜还是凉的。",
+]
+
+
+def _max_diff(a: Dict[str, float], b: Dict[str, float]) -> float:
+    return max((abs(a.get(k, 0.0) - b.get(k, 0.0)) for k in set(a) | set(b)), default=0.0)
+
+
+def parity_report(texts: List[str]) -> Dict[str, Any]:
+    """Run `texts` through the torch and onnx engines; report max score difference and label mismatches."""
+    from .models import ModelManager
+
+    ref, onnx = ModelManager(engine="torch"), ModelManager(engine="onnx")
+    report: Dict[str, Any] = {"texts": len(texts)}
+
+    sent_ref, sent_onnx = ref.analyze_sentiment_batch(texts), onnx.analyze_sentiment_batch(texts)
+    report["sentiment"] = {
+        "model": sent_ref[0]["raw_model"] if sent_ref else None,
+        "max_score_diff": max((_max_diff(a["scores"], b["scores"]) for a, b in zip(sent_ref, sent_onnx)), default=0.0),
+        "label_mismatches": sum(1 for a, b in zip(sent_ref, sent_onnx) if a["label"] != b["label"]),
+    }
+
+    emo_ref, emo_onnx = ref.analyze_emotions_batch(texts), onnx.analyze_emotions_batch(texts)
+    report["emotion"] = {
+        "model": ref.get_status()["emotion"]["selected"],
+        "max_score_diff": max((_max_diff(dict(a), dict(b)) for a, b in zip(emo_ref, emo_onnx)), default=0.0),
+        "label_mismatches": sum(1 for a, b in zip(emo_ref, emo_onnx) if a[:1] and b[:1] and a[0][0] != b[0][0]),
+    }
+    return report
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    ap = argparse.ArgumentParser(description="Compare ONNX engine outputs with the torch engine")
+    ap.add_argument("--file", type=Path, help="text file, one input per line (default: built-in samples)")
+    ap.add_argument("--tolerance", type=float, default=1e-4, help="max allowed score difference (exit code 1 above it)")
+    args = ap.parse_args(argv)
+
+    texts = SAMPLE_TEXTS
+    if args.file:
+        texts = [ln.strip() for ln in args.file.read_text(encoding="utf-8").splitlines() if ln.strip()]
+    report = parity_report(texts)
+    print(json.dumps(report, ensure_ascii=False, indent=2))
+    worst = max(report["sentiment"]["max_score_diff"], report["emotion"]["max_score_diff"])
+    return 0 if worst <= args.tolerance else 1
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    raise SystemExit(main())
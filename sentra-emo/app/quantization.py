@@ -0,0 +1,264 @@
+"""Dynamic int8 quantisation of the local models (EMO_QUANTIZE=int8, CPU only).
+
+- torch engine: `nn.Linear` layers are quantised with torch dynamic quantisation; the quantised
+  module is cached as `<model_dir>/quantized/int8_dynamic.pt` and loaded directly by later
+  startups (the fp32 weights are then not loaded at all).
+- onnx engine: the exported graph's MatMul weights are quantised with onnxruntime into
+  `<model_dir>/onnx/model.int8.onnx`.
+Caches are rebuilt when the model files (or torch/transformers versions) change.
+
+fp32 vs int8 evaluation on a corpus (latency, memory, label agreement, VAD/stress drift):
+  python -m app.quantization --file corpus.txt [--batch-size 16]
+"""
+from __future__ import annotations
+
+import argparse
+import gc
+import io
+import json
+import logging
+import os
+import time
+import warnings
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Tuple
+
+import torch
+import transformers
+
+from .metrics import process_rss_mb
+from .models import ModelManager, model_files_signature
+
+logger = logging.getLogger(__name__)
+
+_SCHEME = "dynamic-int8-linear"
+
+
+def quantized_dir(model_dir: str) -> Path:
+    return Path(model_dir) / "quantized"
+
+
+def _torch_signature(model_dir: str) -> Dict[str, Any]:
+    # The cache is a pickled module, so it is tied to the library versions that wrote it
+    return {
+        "scheme": _SCHEME,
+        "torch": torch.__version__,
+        "transformers": transformers.__version__,
+        **model_files_signature(model_dir),
+    }
+
+
+def _select_qengine() -> None:
+    supported = torch.backends.quantized.supported_engines
+    if torch.backends.quantized.engine in supported and torch.backends.quantized.engine != "none":
+        return
+    for name in ("x86", "fbgemm", "qnnpack"):
+        if name in supported:
+            torch.backends.quantized.engine = name
+            return
+
+
+def quantize_model(model: Any) -> Any:
+    """Dynamic int8 quantisation of every nn.Linear (weights int8, activations quantised per batch)."""
+    _select_qengine()
+    with warnings.catch_warnings():
+        warnings.simplefilter("ignore")  # torch.ao.quantization deprecation notice
+        return torch.ao.quantization.quantize_dynamic(model.eval(), {torch.nn.Linear}, dtype=torch.qint8)
+
+
+def load_quantized(model_dir: str) -> Optional[Any]:
+    """Cached quantised module for `model_dir`, or None when missing or stale."""
+    qdir = quantized_dir(model_dir)
+    path, meta_path = qdir / "int8_dynamic.pt", qdir / "quantize.json"
+    if not (path.exists() and meta_path.exists()):
+        return None
+    try:
+        if json.loads(meta_path.read_text(encoding="utf-8")).get("source") != _torch_signature(model_dir):
+            return None
+        _select_qengine()
+        # Written by quantize_and_cache from the same model directory
+        with warnings.catch_warnings():
+            warnings.simplefilter("ignore")
+            model = torch.load(str(path), weights_only=False, map_location="cpu")
+        logger.info(f"Loaded cached int8 model: {path}")
+        return model.eval()
+    except Exception as e:  # noqa: BLE001
+        logger.warning(f"Ignoring cached int8 model {path}: {e}")
+        return None
+
+
+def quantize_and_cache(model_dir: str, model: Any) -> Any:
+    """Quantise `model` and cache the result next to it (cache write failures are only logged)."""
+    t0 = time.perf_counter()
+    qmodel = quantize_model(model)
+    logger.info(f"Quantised {model_dir} to int8 in {(time.perf_counter() - t0) * 1000:.1f} ms")
+    qdir = quantized_dir(model_dir)
+    try:
+        qdir.mkdir(parents=True, exist_ok=True)
+        tmp = qdir / f"int8_dynamic.pt.{os.getpid()}.tmp"
+        torch.save(qmodel, str(tmp))
+        os.replace(tmp, qdir / "int8_dynamic.pt")
+        (qdir / "quantize.json").write_text(
+            json.dumps({"source": _torch_signature(model_dir)}, indent=2), encoding="utf-8"
+        )
+    except Exception as e:  # noqa: BLE001
+        logger.warning(f"Failed to cache int8 model under {qdir}: {e}")
+    return qmodel
+
+
+def quantize_onnx(fp32_path: Path) -> Path:
+    """int8 copy of an exported ONNX model (MatMul weights), cached beside it."""
+    from onnxruntime.quantization import QuantType, quantize_dynamic
+
+    fp32_path = Path(fp32_path)
+    out = fp32_path.with_name("model.int8.onnx")
+    meta_path = fp32_path.with_name("quantize.json")
+    st = fp32_path.stat()
+    sig = {"scheme": _SCHEME, "source": [st.st_size, st.st_mtime_ns]}
+    if out.exists() and meta_path.exists():
+        try:
+            if json.loads(meta_path.read_text(encoding="utf-8")).get("source") == sig:
+                return out
+        except Exception:  # noqa: BLE001
+            pass
+    tmp = out.with_name(f"model.int8.onnx.{os.getpid()}.tmp")
+    try:
+        quantize_dynamic(str(fp32_path), str(tmp), weight_type=QuantType.QInt8, op_types_to_quantize=["MatMul"])
+        os.replace(tmp, out)
+    finally:
+        if tmp.exists():
+            tmp.unlink()
+    meta_path.write_text(json.dumps({"source": sig}, indent=2), encoding="utf-8")
+    logger.info(f"Quantised ONNX model: {out}")
+    return out
+
+
+# ----- fp32 vs int8 evaluation -----
+def _weights_mb(pipe: Any) -> float:
+    session = getattr(pipe, "onnx_session", None)
+    if session is not None:
+        return session.path.stat().st_size / (1024 * 1024)
+    buf = io.BytesIO()
+    torch.save(pipe.model.state_dict(), buf)
+    return len(buf.getvalue()) / (1024 * 1024)
+
+
+def _latency(samples: List[float]) -> Dict[str, Optional[float]]:
+    s = sorted(samples)
+    if not s:
+        return {"avg": None, "p50": None, "p95": None}
+    return {"avg": sum(s) / len(s), "p50": s[int(0.50 * (len(s) - 1))], "p95": s[int(0.95 * (len(s) - 1))]}
+
+
+def _run_path(quantize: str, texts: List[str], batch_size: int) -> Tuple[Dict[str, Any], List[Dict], List[List[Tuple[str, float]]], Tuple[str, List[str]]]:
+    """Load both models with `quantize` and time them on `texts`.
+
+    Returns (report, sentiments, emotions, (emotion model dir, emotion labels)).
+    """
+    gc.collect()
+    rss0 = process_rss_mb()
+    mm = ModelManager(quantize=quantize)
+    t0 = time.perf_counter()
+    sent_pipe, _ = mm.ensure_sentiment()
+    emo_pipe, emo_mid = mm.ensure_emotion()
+    load_sec = time.perf_counter() - t0
+    rss1 = process_rss_mb()
+    report: Dict[str, Any] = {
+        "engine": mm.engine,
+        "load_sec": load_sec,
+        "rss_delta_mb": (rss1 - rss0) if (rss0 is not None and rss1 is not None) else None,
+    }
+    outputs: Dict[str, List[Any]] = {}
+    for kind, pipe, fn in (
+        ("sentiment", sent_pipe, mm.analyze_sentiment_batch),
+        ("emotion", emo_pipe, mm.analyze_emotions_batch),
+    ):
+        fn(texts[:1])  # warm-up
+        single: List[float] = []
+        for t in texts:
+            t1 = time.perf_counter()
+            fn([t])
+            single.append((time.perf_counter() - t1) * 1000.0)
+        t1 = time.perf_counter()
+        out: List[Any] = []
+        for i in range(0, len(texts), batch_size):
+            out.extend(fn(texts[i:i + batch_size]))
+        batch_sec = time.perf_counter() - t1
+        outputs[kind] = out
+        report[kind] = {
+            "quantization": getattr(pipe, "quantization", None),
+            "weights_mb": _weights_mb(pipe),
+            "latency_ms": _latency(single),
+            "batch_texts_per_sec": (len(texts) / batch_sec) if batch_sec > 0 else None,
+        }
+    emo_model = (emo_mid, mm.emotion_labels())
+    del mm, sent_pipe, emo_pipe
+    gc.collect()
+    return report, outputs["sentiment"], outputs["emotion"], emo_model
+
+
+def _drift(a: List[float], b: List[float]) -> Dict[str, float]:
+    d = [abs(x - y) for x, y in zip(a, b)]
+    return {"mean": (sum(d) / len(d)) if d else 0.0, "max": max(d, default=0.0)}
+
+
+def evaluate(texts: List[str], batch_size: int = 16) -> Dict[str, Any]:
+    """Run `texts` through the fp32 and int8 paths of the configured engine and compare them."""
+    from .analysis import ensure_vad_mapper, postprocess_emotions_batch
+    from .config import get_emotion_min_score, use_emotion_label_alias
+
+    fp32, sent_ref, emo_ref, (emo_mid, emo_labels) = _run_path("off", texts, batch_size)
+    int8, sent_q, emo_q, _ = _run_path("int8", texts, batch_size)
+
+    def _speedup(kind: str) -> Optional[float]:
+        a, b = fp32[kind]["latency_ms"]["avg"], int8[kind]["latency_ms"]["avg"]
+        return (a / b) if a and b else None
+
+    n = max(1, len(texts))
+    sentiment = {
+        "speedup": _speedup("sentiment"),
+        "label_agreement": sum(1 for a, b in zip(sent_ref, sent_q) if a["label"] == b["label"]) / n,
+        "max_score_diff": max(
+            (abs(a["scores"].get(k, 0.0) - b["scores"].get(k, 0.0)) for a, b in zip(sent_ref, sent_q) for k in a["scores"]),
+            default=0.0,
+        ),
+    }
+
+    ensure_vad_mapper(emo_mid, emo_labels or None)
+    opts = {"use_alias": use_emotion_label_alias(), "min_score": get_emotion_min_score()}
+    post_ref = postprocess_emotions_batch(emo_ref, **opts)
+    post_q = postprocess_emotions_batch(emo_q, **opts)
+    emotion = {
+        "speedup": _speedup("emotion"),
+        "top1_agreement": sum(1 for a, b in zip(emo_ref, emo_q) if a[:1] and b[:1] and a[0][0] == b[0][0]) / n,
+        "max_score_diff": max(
+            (abs(s - dict(b).get(lbl, 0.0)) for a, b in zip(emo_ref, emo_q) for lbl, s in a),
+            default=0.0,
+        ),
+        "vad_drift": {
+            axis: _drift([p[i] for p in post_ref], [p[i] for p in post_q]) for axis, i in (("v", 1), ("a", 2), ("d", 3))
+        },
+        "stress_drift": _drift([p[4] for p in post_ref], [p[4] for p in post_q]),
+        "stress_level_agreement": sum(1 for a, b in zip(post_ref, post_q) if a[5] == b[5]) / n,
+    }
+    return {"texts": len(texts), "fp32": fp32, "int8": int8, "sentiment": sentiment, "emotion": emotion}
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    from .onnx_engine import SAMPLE_TEXTS
+
+    ap = argparse.ArgumentParser(description="Compare fp32 and dynamic int8 quantised local models")
+    ap.add_argument("--file", type=Path, help="corpus, one text per line (default: built-in samples)")
+    ap.add_argument("--batch-size", type=int, default=16, help="batch size for the throughput run")
+    args = ap.parse_args(argv)
+
+    texts = list(SAMPLE_TEXTS)
+    if args.file:
+        texts = [ln.strip() for ln in args.file.read_text(encoding="utf-8").splitlines() if ln.strip()]
+    print(json.dumps(evaluate(texts, max(1, args.batch_size)), ensure_ascii=False, indent=2))
+    return 0
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    raise SystemExit(main())
@@ -1,5 +1,7 @@
 from pydantic import BaseModel, Field
-from typing import List, Dict, Optional
+from typing import List, Dict, Optional, Union
+
+from .config import BATCH_SIZE_LIMIT
 
 
 class AnalyzeRequest(BaseModel):
@@ -11,6 +13,29 @@ class BatchAnalyzeRequest(BaseModel):
     texts: List[str] = Field(..., description="需要批量分析的文本列表，至少包含一条")
     userid: Optional[str] = None
     username: Optional[str] = None
+    batch_size: Optional[int] = Field(None, ge=1, le=BATCH_SIZE_LIMIT, description="每次前向推理的子批大小，默认取 EMO_BATCH_SIZE，上限 EMO_MAX_BATCH_SIZE")
+
+
+class StreamAnalyzeItem(BaseModel):
+    """One NDJSON line of /analyze/stream."""
+    text: str
+    userid: Optional[str] = None
+    username: Optional[str] = None
+    id: Optional[Union[str, int]] = Field(None, description="客户端自定义 ID，原样回传")
+
+
+class IngestRequest(BaseModel):
+    text: str = Field(..., description="需要分析的文本")
+    userid: str = Field(..., description="用户ID（后台分析后按到达顺序更新该用户状态）")
+    username: Optional[str] = None
+    idempotency_key: Optional[str] = Field(None, description="幂等键，重复提交同一键只入队一次（也可用 Idempotency-Key 请求头）")
+
+
+class IngestAccepted(BaseModel):
+    accepted: bool = True
+    id: int
+    duplicate: bool = False
+    queue_depth: int
 
 
 class LabelScore(BaseModel):
@@ -60,3 +85,8 @@ class AnalyzeResponse(BaseModel):
     stress: StressResult
     models: Dict[str, str]
     user: Optional[UserState] = None
+
+
+class BatchItemError(BaseModel):
+    index: int
+    error: str
@@ -0,0 +1,124 @@
+import threading
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Any, Awaitable, Callable, Dict, Iterator, Optional, Tuple
+
+from .metrics import LATENCY_MS_BOUNDS, HistogramSnapshot, RecentHistogram
+
+# Stage durations (ms) of the request being handled; None outside a request
+_request_spans: ContextVar[Optional[Dict[str, float]]] = ContextVar("emo_request_spans", default=None)
+_spans_lock = threading.Lock()
+
+
+class StageStats:
+    """Process-wide latency histograms per stage (tokenize, forward, postprocess, ...): recent
+    windows for /metrics, cumulative snapshots for Prometheus."""
+
+    def __init__(self) -> None:
+        self._lock = threading.Lock()
+        self._hists: Dict[str, RecentHistogram] = {}
+
+    def record(self, stage: str, ms: float) -> None:
+        hist = self._hists.get(stage)
+        if hist is None:
+            with self._lock:
+                hist = self._hists.setdefault(stage, RecentHistogram(LATENCY_MS_BOUNDS))
+        hist.observe(ms)
+
+    def snapshots(self) -> Dict[str, HistogramSnapshot]:
+        with self._lock:
+            hists = dict(self._hists)
+        return {stage: h.snapshot() for stage, h in hists.items()}
+
+    def stats(self) -> Dict[str, Dict[str, Any]]:
+        with self._lock:
+            hists = dict(self._hists)
+        return {stage: h.summary() for stage, h in hists.items()}
+
+
+stages = StageStats()
+
+
+def add_span(stage: str, ms: float) -> None:
+    """Add `ms` to `stage` of the current request (if any)."""
+    spans = _request_spans.get()
+    if spans is not None:
+        with _spans_lock:
+            spans[stage] = spans.get(stage, 0.0) + ms
+
+
+def merge_spans(other: Dict[str, float]) -> None:
+    for stage, ms in other.items():
+        add_span(stage, ms)
+
+
+@contextmanager
+def span(stage: str) -> Iterator[None]:
+    """Time a block: recorded in the process-wide stage stats and on the current request."""
+    t0 = time.perf_counter()
+    try:
+        yield
+    finally:
+        ms = (time.perf_counter() - t0) * 1000.0
+        stages.record(stage, ms)
+        add_span(stage, ms)
+
+
+def collect_spans(fn: Callable[..., Any], *args: Any) -> Tuple[Any, Dict[str, float]]:
+    """Run `fn` with its own span collector; returns (result, spans).
+
+    Used for work shared by several requests (micro-batches, coalesced texts): each request
+    then merges the shared spans into its own.
+    """
+    spans: Dict[str, float] = {}
+    token = _request_spans.set(spans)
+    try:
+        return fn(*args), spans
+    finally:
+        _request_spans.reset(token)
+
+
+async def collect_spans_async(aw: Awaitable[Any]) -> Tuple[Any, Dict[str, float]]:
+    """Await `aw` inside a fresh span collector (call from its own task so the context is private)."""
+    spans: Dict[str, float] = {}
+    _request_spans.set(spans)
+    return await aw, spans
+
+
+def _server_timing(spans: Dict[str, float], total_ms: float) -> str:
+    with _spans_lock:
+        parts = [f"{stage};dur={ms:.1f}" for stage, ms in spans.items()]
+    parts.append(f"total;dur={total_ms:.1f}")
+    return ", ".join(parts)
+
+
+class ServerTimingMiddleware:
+    """ASGI middleware: collects the stage spans of each HTTP request and sends them as a
+    `Server-Timing` header (for responses whose headers go out after the handler finished,
+    i.e. everything except streaming bodies)."""
+
+    def __init__(self, app: Any, enabled: bool = True) -> None:
+        self.app = app
+        self.enabled = enabled
+
+    async def __call__(self, scope, receive, send) -> None:
+        if not self.enabled or scope.get("type") != "http":
+            await self.app(scope, receive, send)
+            return
+        spans: Dict[str, float] = {}
+        token = _request_spans.set(spans)
+        t0 = time.perf_counter()
+
+        async def _send(message) -> None:
+            if message.get("type") == "http.response.start" and spans:
+                headers = list(message.get("headers") or [])
+                value = _server_timing(spans, (time.perf_counter() - t0) * 1000.0)
+                headers.append((b"server-timing", value.encode("latin-1")))
+                message = {**message, "headers": headers}
+            await send(message)
+
+        try:
+            await self.app(scope, receive, _send)
+        finally:
+            _request_spans.reset(token)
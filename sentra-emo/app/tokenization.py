@@ -0,0 +1,144 @@
+import copy
+import hashlib
+import json
+import logging
+import threading
+import time
+from typing import Any, Dict, Optional
+
+from .cache import LRUCache
+from .timing import span
+
+logger = logging.getLogger(__name__)
+
+
+def tokenizer_fingerprint(tok: Any) -> str:
+    """Stable digest of everything that decides how a tokenizer encodes text.
+
+    Two tokenizers with the same fingerprint produce identical input ids, so their
+    encodings can be shared between models (common with Chinese BERT variants).
+    """
+    h = hashlib.blake2b(digest_size=16)
+    h.update(type(tok).__name__.encode())
+    backend = getattr(tok, "backend_tokenizer", None)
+    spec: Optional[str] = None
+    if backend is not None:
+        try:
+            # Full normalizer / pre-tokenizer / vocab / post-processor definition of fast tokenizers
+            spec = backend.to_str()
+        except Exception:  # noqa: BLE001
+            spec = None
+    if spec is None:
+        try:
+            spec = json.dumps(sorted(tok.get_vocab().items()), ensure_ascii=False)
+        except Exception:  # noqa: BLE001
+            spec = repr(id(tok))
+        init = getattr(tok, "init_kwargs", {}) or {}
+        spec += json.dumps(
+            {k: init.get(k) for k in ("do_lower_case", "tokenize_chinese_chars", "strip_accents")}, default=str
+        )
+    h.update(spec.encode("utf-8", errors="ignore"))
+    h.update(str(getattr(tok, "model_max_length", None)).encode())
+    return h.hexdigest()
+
+
+def _encoding_size(enc: Any) -> int:
+    size = 256
+    try:
+        for v in enc.values():
+            size += int(v.numel()) * int(v.element_size())
+    except Exception:  # noqa: BLE001
+        pass
+    return size
+
+
+class TokenCache:
+    """Bounded cache of encoded inputs keyed by (tokenizer fingerprint, exact text hash, tokenizer kwargs).
+
+    Models whose tokenizers share a fingerprint share entries, so a text is tokenised once
+    for both. Also records tokenisation time and hit rate.
+    """
+
+    def __init__(self, max_bytes: int, *, enabled: bool = True) -> None:
+        self._cache = LRUCache(max_bytes, 0.0, enabled=enabled)
+        self._lock = threading.Lock()
+        self._tokenized = 0
+        self._tokenize_sec = 0.0
+
+    @property
+    def enabled(self) -> bool:
+        return self._cache.enabled
+
+    def encode(self, fingerprint: str, text: str, kwargs: Dict[str, Any], tokenize) -> Any:
+        key = None
+        if self._cache.enabled:
+            digest = hashlib.blake2b(text.encode("utf-8", errors="surrogatepass"), digest_size=16).digest()
+            key = (fingerprint, digest, tuple(sorted((k, repr(v)) for k, v in kwargs.items())))
+            cached = self._cache.get(key)
+            if cached is not None:
+                # The pipeline may add keys to the dict it gets; tensors themselves are not mutated
+                return copy.copy(cached)
+        t0 = time.perf_counter()
+        with span("tokenize"):
+            enc = tokenize()
+        dt = time.perf_counter() - t0
+        with self._lock:
+            self._tokenized += 1
+            self._tokenize_sec += dt
+        if key is not None:
+            self._cache.put(key, copy.copy(enc), size=_encoding_size(enc))
+        return enc
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            n, sec = self._tokenized, self._tokenize_sec
+        return {
+            **self._cache.stats(),
+            "tokenized": n,
+            "tokenize_ms_total": sec * 1000.0,
+            "tokenize_ms_avg": (sec * 1000.0 / n) if n else None,
+        }
+
+
+_class_lock = threading.Lock()
+
+
+def _caching_pipeline_class() -> type:
+    from transformers import TextClassificationPipeline
+
+    class CachingTextClassificationPipeline(TextClassificationPipeline):
+        """TextClassificationPipeline whose per-text tokenisation goes through a shared TokenCache.
+
+        `token_cache` and `tokenizer_fingerprint` are attached after construction; without them
+        the pipeline behaves exactly like the stock one.
+        """
+
+        token_cache: Optional[TokenCache] = None
+        tokenizer_fingerprint: Optional[str] = None
+
+        def preprocess(self, inputs, **tokenizer_kwargs):
+            cache = self.token_cache
+            if cache is None or not self.tokenizer_fingerprint or not isinstance(inputs, str):
+                return super().preprocess(inputs, **tokenizer_kwargs)
+            return cache.encode(
+                self.tokenizer_fingerprint,
+                inputs,
+                tokenizer_kwargs,
+                lambda: super(CachingTextClassificationPipeline, self).preprocess(inputs, **tokenizer_kwargs),
+            )
+
+    return CachingTextClassificationPipeline
+
+
+def __getattr__(name: str) -> Any:
+    # The pipeline subclass needs transformers (and torch); it is built on first access so that
+    # importing this module stays cheap for online-only deployments
+    if name == "CachingTextClassificationPipeline":
+        with _class_lock:
+            cls = globals().get(name)
+            if cls is None:
+                cls = _caching_pipeline_class()
+                cls.__module__, cls.__qualname__ = __name__, name
+                globals()[name] = cls
+        return cls
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
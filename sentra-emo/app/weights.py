@@ -0,0 +1,169 @@
+"""Memory-mapped loading of safetensors checkpoints (EMO_MMAP_WEIGHTS).
+
+The model is built on the meta device (no allocation, no random init) and the checkpoint
+tensors are assigned as views of a copy-on-write mmap of the weights file. Nothing is copied
+into private memory: pages come from the page cache, so forked workers and other processes
+loading the same file on this host share them. Checkpoints this can't handle exactly (non-fp32
+floats, missing or renamed keys, .bin files) return None so the caller falls back to
+`from_pretrained`.
+
+The serving weights *are* the file: a weights file must never be modified in place while a
+model loaded from it is in use (pages not yet read would change under the model, and
+truncating it can kill the process with SIGBUS). Replace checkpoints atomically instead:
+write the new file next to it and rename it over the old one (or use a new directory).
+"""
+from __future__ import annotations
+
+import contextlib
+import json
+import logging
+import mmap
+import struct
+import threading
+from pathlib import Path
+from typing import Any, Dict, Iterator, List, Optional
+
+from .models import import_heavy
+
+logger = logging.getLogger(__name__)
+
+_DTYPES = {
+    "F32": "float32",
+    "I64": "int64",
+    "I32": "int32",
+    "I16": "int16",
+    "I8": "int8",
+    "U8": "uint8",
+    "BOOL": "bool",
+}
+
+
+def safetensors_files(model_dir: str) -> List[Path]:
+    """Weight files of a (possibly sharded) safetensors checkpoint; empty when there is none."""
+    d = Path(model_dir)
+    index = d / "model.safetensors.index.json"
+    if index.exists():
+        shards = sorted(set(json.loads(index.read_text(encoding="utf-8")).get("weight_map", {}).values()))
+        return [d / s for s in shards]
+    single = d / "model.safetensors"
+    return [single] if single.exists() else []
+
+
+def _map_file(path: Path) -> Optional[Dict[str, Any]]:
+    """{name: tensor view of the mapped file}, or None if a dtype can't be used as-is."""
+    torch = import_heavy("torch")
+    with open(path, "rb") as f:
+        # ACCESS_COPY: pages are shared with the page cache until (and unless) someone writes to them
+        mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_COPY)
+    try:
+        (header_len,) = struct.unpack("<Q", mm[:8])
+        header = json.loads(mm[8:8 + header_len])
+        header.pop("__metadata__", None)
+    except Exception:
+        mm.close()
+        raise
+    # Checked before any tensor views the map, so it can still be closed
+    if any(info["dtype"] not in _DTYPES for info in header.values()):
+        mm.close()
+        return None  # fp16/bf16/...: from_pretrained decides the dtype conversion
+    base = 8 + header_len
+    tensors: Dict[str, Any] = {}
+    for name, info in header.items():
+        dtype = getattr(torch, _DTYPES[info["dtype"]])
+        start, end = info["data_offsets"]
+        count = (end - start) // dtype.itemsize
+        if count == 0:
+            tensors[name] = torch.empty(info["shape"], dtype=dtype)
+            continue
+        # The tensor keeps `mm` alive
+        tensors[name] = torch.frombuffer(mm, dtype=dtype, count=count, offset=base + start).view(info["shape"])
+    return tensors
+
+
+_meta_params = threading.local()
+_meta_params_lock = threading.Lock()
+
+
+@contextlib.contextmanager
+def _parameters_on_meta() -> Iterator[None]:
+    """Modules built by this thread inside the block get meta parameters but real buffers.
+
+    Parameters are moved as they are registered, before the module's init code runs on them:
+    `torch.empty` storage is dropped untouched and no random initialisation happens. The patch
+    is global while the block runs, but only acts for this thread; the lock keeps blocks from
+    interleaving their restores.
+    """
+    torch = import_heavy("torch")
+    with _meta_params_lock:
+        register = torch.nn.Module.register_parameter
+
+        def _register(module: Any, name: str, param: Any) -> None:
+            if param is not None and getattr(_meta_params, "on", False):
+                param = type(param)(param.to("meta"), requires_grad=param.requires_grad)
+            register(module, name, param)
+
+        torch.nn.Module.register_parameter = _register
+        _meta_params.on = True
+        try:
+            yield
+        finally:
+            _meta_params.on = False
+            torch.nn.Module.register_parameter = register
+
+
+def _materialize_buffers(model: Any, config: Any) -> bool:
+    """Give real values to buffers still on the meta device after loading the checkpoint.
+
+    Non-persistent buffers (position ids, rotary frequencies, ...) are not saved; they are
+    taken from a fresh instance of just the submodule that owns them (HF submodules are built
+    from the config), built with meta parameters. Returns False if some owner can't be rebuilt that way.
+    """
+    for _, module in model.named_modules():
+        names = [n for n, b in module.named_buffers(recurse=False) if b is not None and b.is_meta]
+        if not names:
+            continue
+        try:
+            with _parameters_on_meta():
+                fresh = type(module)(config)
+            for n in names:
+                buf = fresh._buffers[n]
+                if buf is None or buf.is_meta:
+                    return False
+                module._buffers[n] = buf
+        except Exception:  # noqa: BLE001
+            return False
+    return True
+
+
+def load_model_mmap(model_dir: str) -> Optional[Any]:
+    """Sequence classification model with mmap-backed weights, or None when not applicable."""
+    files = safetensors_files(model_dir)
+    if not files:
+        return None
+    transformers = import_heavy("transformers")
+    try:
+        state: Dict[str, Any] = {}
+        for path in files:
+            tensors = _map_file(path)
+            if tensors is None:
+                return None
+            state.update(tensors)
+        config = transformers.AutoConfig.from_pretrained(model_dir, local_files_only=True)
+        torch = import_heavy("torch")
+        # torch's device context only affects tensors created by this thread
+        with torch.device("meta"):
+            model = transformers.AutoModelForSequenceClassification.from_config(config)
+        model.load_state_dict(state, strict=False, assign=True)
+        if hasattr(model, "tie_weights"):
+            model.tie_weights()
+        missing = [n for n, p in model.named_parameters() if p.is_meta]
+        if missing:
+            logger.info(f"mmap load of {model_dir} not applicable (parameters not in checkpoint: {missing[:3]}...)")
+            return None
+        if not _materialize_buffers(model, config):
+            logger.info(f"mmap load of {model_dir} not applicable (buffers not in checkpoint can't be rebuilt)")
+            return None
+        return model.eval()
+    except Exception as e:  # noqa: BLE001
+        logger.warning(f"mmap load of {model_dir} failed, using from_pretrained: {e}")
+        return None
@@ -0,0 +1,215 @@
+import gc
+import logging
+import multiprocessing
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from typing import Any, Dict, List, Optional, Tuple
+
+from .models import ModelManager, set_thread_budget
+
+logger = logging.getLogger(__name__)
+
+# Set in the parent right before forking; children inherit the already-loaded models.
+# Spawned workers (after a hot-swap or crash) load their own copy in `_init_worker`.
+_manager: Optional[ModelManager] = None
+# Shared by one pool's workers; holds each warmup task until every worker has one
+_barrier: Any = None
+
+
+def _init_worker(
+    num_threads: int, barrier: Any = None, engine: Optional[str] = None, model_ids: Optional[Dict[str, str]] = None
+) -> None:
+    global _manager, _barrier
+    set_thread_budget(num_threads)
+    _barrier = barrier
+    if model_ids is not None:
+        manager = ModelManager(engine=engine)
+        for kind, mid in model_ids.items():
+            manager.install(kind, manager.load_model(kind, mid))
+        _manager = manager
+
+
+def _ping() -> int:
+    return os.getpid()
+
+
+def _infer(kind: str, texts: List[str]) -> List[Any]:
+    if _manager is None:
+        raise RuntimeError("inference worker has no models")
+    if kind == "sentiment":
+        return _manager.analyze_sentiment_batch(texts)
+    return _manager.emotion_scores_batch(texts)
+
+
+def _warmup(batches: Dict[str, List[List[str]]], timeout: float) -> int:
+    for kind, kind_batches in batches.items():
+        for texts in kind_batches:
+            _infer(kind, texts)
+    # A worker blocked here can't take another warmup task, so each worker gets exactly one
+    _barrier.wait(timeout)
+    return os.getpid()
+
+
+class ProcessInferencePool:
+    """Forked inference worker processes sharing the parent's model weights copy-on-write.
+
+    The parent loads both models, then forks `processes` workers at startup, before any
+    inference ran in it; weights are never written after load, so their pages stay shared and
+    memory does not grow N×. Batches go to the workers over the executor's local queue.
+
+    Once the server is serving, its torch/OpenMP and tokenizer thread pools are live and a
+    forked child can hang in its first parallel region. Later pools (model hot-swap, crash
+    recovery) are therefore started with "spawn" and each worker loads the parent's current
+    models from disk (memory-mapped safetensors still share the page cache).
+    Only available where the "fork" start method exists (Linux/macOS).
+    """
+
+    def __init__(self, manager: ModelManager, processes: int, threads_per_process: int) -> None:
+        self.manager = manager
+        self.processes = max(1, int(processes))
+        self.threads_per_process = max(1, int(threads_per_process))
+        self._pool: Optional[ProcessPoolExecutor] = None
+        self._pids: List[int] = []
+        self._lock = threading.Lock()
+        # Serialises pool replacement (reload / crash restart) without blocking run() meanwhile
+        self._restart_lock = threading.Lock()
+        self._in_flight = 0
+        self._submitted = 0
+        self._failed = 0
+        self._restarts = 0
+        self._reloads = 0
+
+    def start(self) -> None:
+        """Fork the workers (call at startup, before the parent runs any inference)."""
+        global _manager
+        # Both models must be loaded before the fork so workers inherit them
+        self.manager.ensure_sentiment()
+        self.manager.ensure_emotion()
+        _manager = self.manager
+        ctx = multiprocessing.get_context("fork")
+        # Move everything allocated so far out of the GC's reach: collections in the children
+        # would otherwise touch (and copy) every object header page
+        gc.collect()
+        gc.freeze()
+        try:
+            pool = ProcessPoolExecutor(
+                max_workers=self.processes,
+                mp_context=ctx,
+                initializer=_init_worker,
+                initargs=(self.threads_per_process, ctx.Barrier(self.processes)),
+            )
+            # With the fork start method all workers are forked on the first submit
+            pids = {pool.submit(_ping).result()}
+            pids.update(getattr(pool, "_processes", None) or {})
+        finally:
+            gc.unfreeze()
+        self._pool, self._pids = pool, sorted(pids)
+        logger.info(
+            "Started %d inference worker processes (torch threads each=%d)", self.processes, self.threads_per_process
+        )
+
+    def _spawn(self) -> Tuple[ProcessPoolExecutor, List[int]]:
+        """Start a pool of spawned workers loaded with the parent's current models; returns once all are ready."""
+        model_ids = {kind: mid for kind in ("sentiment", "emotion") if (mid := self.manager.model_id(kind))}
+        ctx = multiprocessing.get_context("spawn")
+        pool = ProcessPoolExecutor(
+            max_workers=self.processes,
+            mp_context=ctx,
+            initializer=_init_worker,
+            initargs=(self.threads_per_process, ctx.Barrier(self.processes), self.manager.engine, model_ids),
+        )
+        try:
+            # Spawned workers start on demand: one ping each brings up (and waits for) all of them
+            pids = {f.result() for f in [pool.submit(_ping) for _ in range(self.processes)]}
+            pids.update(getattr(pool, "_processes", None) or {})
+        except Exception:
+            pool.shutdown(wait=False, cancel_futures=True)
+            raise
+        logger.info("Spawned %d inference worker processes with models %s", self.processes, model_ids)
+        return pool, sorted(pids)
+
+    def _replace(self, pool: ProcessPoolExecutor, pids: List[int]) -> Optional[ProcessPoolExecutor]:
+        with self._lock:
+            old, self._pool, self._pids = self._pool, pool, pids
+        return old
+
+    def _restart(self, broken: ProcessPoolExecutor) -> None:
+        with self._restart_lock:
+            if self._pool is not broken:
+                return  # another caller already restarted it
+            broken.shutdown(wait=False, cancel_futures=True)
+            self._replace(*self._spawn())
+            with self._lock:
+                self._restarts += 1
+
+    def reload(self) -> None:
+        """Start new workers with the parent's current models (after a model hot-swap).
+
+        The old workers keep serving while the new ones load; then new batches go to the new
+        pool, and the old one finishes the batches it already has and exits.
+        """
+        with self._restart_lock:
+            old = self._replace(*self._spawn())
+            with self._lock:
+                self._reloads += 1
+        if old is not None:
+            old.shutdown(wait=False)
+
+    def warmup(self, batches: Dict[str, List[List[str]]], timeout: float = 300.0) -> List[int]:
+        """Run `batches` ({kind: [texts, ...]}) once in every worker process (blocking); returns their pids."""
+        pool = self._pool
+        if pool is None:
+            raise RuntimeError("inference worker pool is not running")
+        futures = [pool.submit(_warmup, batches, timeout) for _ in range(self.processes)]
+        return sorted(f.result() for f in futures)
+
+    def run(self, kind: str, texts: List[str]) -> List[Any]:
+        """Run one batch in a worker process (blocking)."""
+        for attempt in range(2):
+            pool = self._pool
+            if pool is None:
+                raise RuntimeError("inference worker pool is not running")
+            with self._lock:
+                self._in_flight += 1
+                self._submitted += 1
+            try:
+                try:
+                    future = pool.submit(_infer, kind, texts)
+                except RuntimeError:
+                    if attempt or self._pool is pool:
+                        raise
+                    continue  # replaced by reload() between reading and submitting; use the new pool
+                return future.result()
+            except BrokenProcessPool as e:
+                logger.warning("Inference worker pool broke (%s), respawning", e)
+                self._failed += 1
+                if attempt:
+                    raise
+                self._restart(pool)
+            except Exception:
+                self._failed += 1
+                raise
+            finally:
+                with self._lock:
+                    self._in_flight -= 1
+        raise RuntimeError("unreachable")
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "processes": self.processes,
+                "threads_per_process": self.threads_per_process,
+                "pids": list(self._pids),
+                "in_flight": self._in_flight,
+                "submitted": self._submitted,
+                "failed": self._failed,
+                "restarts": self._restarts,
+                "reloads": self._reloads,
+            }
+
+    def shutdown(self) -> None:
+        if self._pool is not None:
+            self._pool.shutdown(wait=False, cancel_futures=True)
+            self._pool = None
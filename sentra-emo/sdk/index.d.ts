@@ -104,9 +104,25 @@ export interface UserEventModel {
 
 export interface BatchOptions extends RequestOptions {
   concurrency?: number;
+  /** Server-side sub-batch size for /analyze/batch (defaults to EMO_BATCH_SIZE) */
+  batchSize?: number;
   onProgress?: (p: { index: number; total: number }) => void;
 }
 
+export interface IngestOptions extends RequestOptions {
+  userid?: string;
+  username?: string;
+  /** Same key within EMO_INGEST_IDEMPOTENCY_TTL_SEC is enqueued only once */
+  idempotencyKey?: string;
+}
+
+export interface IngestAccepted {
+  accepted: boolean;
+  id: number;
+  duplicate: boolean;
+  queue_depth: number;
+}
+
 export default class SentraEmo {
   constructor(options?: SentraEmoOptions);
   baseURL: string;
@@ -116,7 +132,8 @@ export default class SentraEmo {
   models(opts?: RequestOptions): Promise<any>;
   metrics(opts?: RequestOptions): Promise<any>;
   analyze(text: string | { text: string }, opts?: RequestOptions): Promise<AnalyzeResponse>;
-  analyzeBatch(texts: string[], opts?: BatchOptions): Promise<(AnalyzeResponse | { error: string })[]>;
+  ingest(text: string | { text: string; userid: string; username?: string; idempotencyKey?: string }, opts?: IngestOptions): Promise<IngestAccepted>;
+  analyzeBatch(texts: string[], opts?: BatchOptions): Promise<(AnalyzeResponse | { index?: number; error: string })[]>;
   batchAnalyze(texts: string[], opts?: BatchOptions): Promise<(AnalyzeResponse | { error: string })[]>;
   userState(userid: string, opts?: RequestOptions): Promise<UserStateModel>;
   userEvents(userid: string, opts?: UserEventsOptions): Promise<UserEventModel[]>;
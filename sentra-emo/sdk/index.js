@@ -84,6 +84,19 @@ export default class SentraEmo {
     return requestJSON(this.baseURL, '/analyze', { method: 'POST', body, timeout: opts.timeout ?? this.timeout, signal: opts.signal });
   }
 
+  async ingest(text, opts = {}) {
+    const payload = typeof text === 'string' ? { text, userid: opts.userid, username: opts.username } : text;
+    if (!payload || typeof payload.text !== 'string' || !payload.text.trim()) {
+      throw new Error('text is required');
+    }
+    if (!payload.userid) throw new Error('userid is required');
+    const body = { text: payload.text, userid: payload.userid };
+    if (payload.username) body.username = payload.username;
+    const key = payload.idempotencyKey ?? opts.idempotencyKey;
+    if (key) body.idempotency_key = String(key);
+    return requestJSON(this.baseURL, '/ingest', { method: 'POST', body, timeout: opts.timeout ?? this.timeout, signal: opts.signal });
+  }
+
   async analyzeBatch(texts, opts = {}) {
     const list = Array.isArray(texts) ? texts.filter(t => typeof t === 'string' && t.trim().length > 0) : [];
     if (!list.length) throw new Error('texts must be a non-empty array of strings');
@@ -91,6 +104,7 @@ export default class SentraEmo {
       const body = { texts: list };
       if (opts.userid) body.userid = opts.userid;
       if (opts.username) body.username = opts.username;
+      if (typeof opts.batchSize === 'number' && opts.batchSize > 0) body.batch_size = Math.floor(opts.batchSize);
       return await requestJSON(this.baseURL, '/analyze/batch', { method: 'POST', body, timeout: opts.timeout ?? this.timeout, signal: opts.signal });
     } catch (err) {
       if (err && (err.status === 404 || err.status === 405)) {
@@ -0,0 +1,76 @@
+import asyncio
+
+import pytest
+
+from app.batching import MicroBatcher
+from app.executor import InferenceExecutor
+
+
+def _batch_fn(calls):
+    def fn(items):
+        calls.append(list(items))
+        if "BOOM" in items:
+            raise ValueError("bad text")
+        return [it.upper() for it in items]
+
+    return fn
+
+
+def _run(coro):
+    return asyncio.run(coro)
+
+
+def test_flush_by_size():
+    calls = []
+    ex = InferenceExecutor("t", max_workers=1, max_queue=8)
+    batcher = MicroBatcher("t", _batch_fn(calls), ex, max_batch_size=3, max_wait_ms=10_000)
+
+    async def main():
+        return await asyncio.gather(*(batcher.submit(t) for t in ("a", "b", "c")))
+
+    assert _run(main()) == ["A", "B", "C"]
+    assert calls == [["a", "b", "c"]]
+    ex.shutdown()
+
+
+def test_flush_by_time():
+    calls = []
+    ex = InferenceExecutor("t", max_workers=1, max_queue=8)
+    batcher = MicroBatcher("t", _batch_fn(calls), ex, max_batch_size=16, max_wait_ms=20)
+
+    async def main():
+        return await asyncio.gather(batcher.submit("a"), batcher.submit("b"))
+
+    assert _run(main()) == ["A", "B"]
+    assert calls == [["a", "b"]]
+    assert batcher.stats()["batches"] == 1
+    ex.shutdown()
+
+
+def test_poisoned_item_only_fails_its_caller():
+    calls = []
+    ex = InferenceExecutor("t", max_workers=1, max_queue=8)
+    batcher = MicroBatcher("t", _batch_fn(calls), ex, max_batch_size=4, max_wait_ms=10_000)
+
+    async def main():
+        texts = ("ok1", "ok2", "BOOM", "ok3")
+        return await asyncio.gather(*(batcher.submit(t) for t in texts), return_exceptions=True)
+
+    out = _run(main())
+    assert out[:2] == ["OK1", "OK2"] and out[3] == "OK3"
+    assert isinstance(out[2], ValueError)
+    assert calls[0] == ["ok1", "ok2", "BOOM", "ok3"]
+    assert calls[1:] == [["ok1"], ["ok2"], ["BOOM"], ["ok3"]]
+    assert batcher.stats()["failed_batches"] == 1
+    ex.shutdown()
+
+
+def test_single_item_failure_is_not_retried():
+    calls = []
+    ex = InferenceExecutor("t", max_workers=1, max_queue=8)
+    batcher = MicroBatcher("t", _batch_fn(calls), ex, max_batch_size=1, max_wait_ms=0)
+
+    with pytest.raises(ValueError):
+        _run(batcher.submit("BOOM"))
+    assert calls == [["BOOM"]]
+    ex.shutdown()
@@ -0,0 +1,38 @@
+from app import cache
+from app.cache import LRUCache, approx_size
+
+# keys are charged too; one-letter keys all cost the same
+KEY = approx_size("a")
+
+
+def test_lru_evicts_least_recently_used():
+    c = LRUCache(max_bytes=3 * (KEY + 10), ttl_sec=0)
+    c.put("a", 1, size=10)
+    c.put("b", 2, size=10)
+    c.put("c", 3, size=10)
+    assert c.get("a") == 1  # "b" is now the oldest
+    c.put("d", 4, size=10)
+    assert c.get("b") is None
+    assert [c.get(k) for k in ("a", "c", "d")] == [1, 3, 4]
+    st = c.stats()
+    assert st["evictions"] == 1 and st["bytes"] == 3 * (KEY + 10) and st["entries"] == 3
+
+
+def test_oversized_entry_is_not_stored():
+    c = LRUCache(max_bytes=KEY + 10, ttl_sec=0)
+    c.put("a", 1, size=5)
+    c.put("b", 2, size=11)
+    assert c.get("b") is None and c.get("a") == 1
+
+
+def test_ttl_expires_entries(monkeypatch):
+    now = [100.0]
+    monkeypatch.setattr(cache.time, "monotonic", lambda: now[0])
+    c = LRUCache(max_bytes=1000, ttl_sec=5)
+    c.put("a", 1, size=10)
+    now[0] += 4
+    assert c.get("a") == 1
+    now[0] += 2
+    assert c.get("a") is None
+    st = c.stats()
+    assert st["expirations"] == 1 and st["entries"] == 0 and st["bytes"] == 0
@@ -0,0 +1,85 @@
+import itertools
+
+import numpy as np
+import pytest
+
+import app.analysis as analysis
+from app.analysis import VADMapper, postprocess_emotion_scores, postprocess_emotions_batch
+
+LABELS = ("Joy", "sadness", "anger", "fear", "happy", "calm")
+SCORES = np.array(
+    [
+        [0.50, 0.20, 0.10, 0.10, 0.05, 0.05],
+        [0.30, 0.30, 0.30, 0.05, 0.05, 0.00],  # ties keep class order
+        [0.10, 0.60, 0.55, 0.70, 0.20, 0.50],  # multi-label style independent probabilities
+        [0.50, 0.10, 0.50, 0.10, 0.50, 0.10],  # scores exactly at the threshold
+        [0.05, 0.10, 0.15, 0.05, 0.02, 0.01],  # nothing reaches the threshold: top-1 fallback
+        [0.00, 0.00, 0.00, 0.00, 0.00, 0.00],
+        [-0.20, 0.40, 0.30, -0.10, 0.20, 0.00],
+        [0.19, 0.18, 0.17, 0.16, 0.15, 0.15],  # everything below min_score: original distribution kept
+    ]
+)
+
+
+def _old_pairs(labels, row, normalize):
+    if normalize:
+        row = np.maximum(row, 0.0)
+        total = float(row.sum())
+        if total > 0:
+            row = row / total
+    return [(labels[i], float(row[i])) for i in np.argsort(-row, kind="stable")]
+
+
+def _old_select(pairs, multi, thr, topk):
+    if multi:
+        selected = [(l, s) for (l, s) in pairs if s >= thr]
+        selected.sort(key=lambda x: x[1], reverse=True)
+        if topk and len(selected) > topk:
+            selected = selected[:topk]
+        if not selected and pairs:
+            selected = [max(pairs, key=lambda x: x[1])]
+        return selected
+    sorted_pairs = sorted(pairs, key=lambda x: x[1], reverse=True)
+    if topk and len(sorted_pairs) > topk:
+        return sorted_pairs[:topk]
+    return sorted_pairs
+
+
+@pytest.fixture(autouse=True)
+def _mapper(monkeypatch):
+    mapping = {"joy": (0.9, 0.7, 0.6), "sadness": (0.1, 0.3, 0.2), "anger": (0.2, 0.9, 0.7), "fear": (0.15, 0.8, 0.2)}
+    monkeypatch.setattr(analysis, "_vad_mapper", VADMapper(mapping, {"happy": "joy"}, ["joy", "sadness", "anger", "fear"]))
+    monkeypatch.setattr(analysis, "_negative_labels", {"sadness", "anger", "fear"})
+    monkeypatch.setattr(analysis, "_columns_cache", None)
+
+
+@pytest.mark.parametrize(
+    "multi,threshold,topk,min_score,use_alias",
+    list(itertools.product((False, True), (0.3, 0.5), (0, 1, 2, 10), (0.0, 0.2), (True, False))),
+)
+def test_columnar_matches_per_item_chain(multi, threshold, topk, min_score, use_alias):
+    selected = [_old_select(_old_pairs(LABELS, row, not multi), multi, threshold, topk) for row in SCORES]
+    expected = postprocess_emotions_batch(selected, use_alias=use_alias, min_score=min_score)
+    got = postprocess_emotion_scores(
+        SCORES, LABELS, multi=multi, threshold=threshold, topk=topk, use_alias=use_alias, min_score=min_score
+    )
+    assert len(got) == len(expected)
+    for (g_pairs, *g_rest), (e_pairs, *e_rest) in zip(got, expected):
+        assert [l for l, _ in g_pairs] == [l for l, _ in e_pairs]
+        assert [s for _, s in g_pairs] == pytest.approx([s for _, s in e_pairs], abs=1e-12)
+        assert g_rest[:4] == pytest.approx(e_rest[:4], abs=1e-12)
+        assert g_rest[4] == e_rest[4]
+
+
+def test_selection_edge_cases():
+    def labels(**kw):
+        return [[l for l, _ in pairs] for pairs, *_ in postprocess_emotion_scores(SCORES, LABELS, use_alias=False, **kw)]
+
+    multi = labels(multi=True, threshold=0.5, topk=2)
+    assert multi[3] == ["Joy", "anger"]  # >= threshold, top-k cut in class order on ties
+    assert multi[4] == ["anger"]  # fallback to the best label
+    assert multi[5] == ["Joy"]
+    single = labels(multi=False, threshold=0.5, topk=1)
+    assert [row[0] for row in single[:3]] == ["Joy", "Joy", "fear"]
+    assert all(len(row) == 1 for row in single)
+    assert all(len(row) == len(LABELS) for row in labels(multi=False, threshold=0.5, topk=0))
@@ -0,0 +1,41 @@
+import threading
+
+import pytest
+
+from app.executor import InferenceExecutor, InferenceOverloaded
+
+
+def _saturated():
+    ex = InferenceExecutor("t", max_workers=1, max_queue=1)
+    gate = threading.Event()
+    fut = ex.submit(gate.wait, 5)
+    return ex, gate, fut
+
+
+def test_full_queue_rejects_with_retry_after():
+    ex, gate, fut = _saturated()
+    with pytest.raises(InferenceOverloaded) as err:
+        ex.submit(lambda: None)
+    assert err.value.retry_after_sec == 1.0
+    assert ex.stats()["rejected"] == 1
+    gate.set()
+    fut.result()
+    assert ex.submit(lambda: 7).result() == 7
+    ex.shutdown()
+
+
+@pytest.mark.parametrize("status", [429, 503])
+def test_overload_maps_to_http_status_with_retry_after(monkeypatch, status):
+    from app import main
+
+    monkeypatch.setenv("EMO_INFER_OVERLOAD_STATUS", str(status))
+    exc = main._overloaded(InferenceOverloaded("full", retry_after_sec=2.4))
+    assert exc.status_code == status
+    assert exc.headers == {"Retry-After": "2"}
+
+
+def test_invalid_overload_status_falls_back_to_503(monkeypatch):
+    from app import main
+
+    monkeypatch.setenv("EMO_INFER_OVERLOAD_STATUS", "500")
+    assert main._overloaded(InferenceOverloaded("full")).status_code == 503
@@ -0,0 +1,70 @@
+import pytest
+
+from app.ingest import IngestQueue, IngestQueueFull
+
+
+def _queue(tmp_path, **kw):
+    q = IngestQueue(tmp_path / "q.duckdb", max_size=kw.pop("max_size", 10), idempotency_ttl_sec=60, **kw)
+    q.open()
+    return q
+
+
+def test_failed_message_is_dead_lettered_after_max_attempts(tmp_path):
+    q = _queue(tmp_path, max_attempts=3)
+    q.enqueue("u1", None, "poison")
+    q.enqueue("u1", None, "fine")
+
+    for attempt in range(1, 3):
+        m = q.fetch(1)[0]
+        assert m["text"] == "poison" and m["attempts"] == attempt - 1
+        assert q.record_failure(m, "boom") is False
+    m = q.fetch(1)[0]
+    assert q.record_failure(m, "boom") is True
+
+    # the queue moves on; the dead letter is kept with its error
+    assert [m["text"] for m in q.fetch(10)] == ["fine"]
+    assert q.depth() == 1
+    row = q._connect().execute("SELECT text, attempts, error FROM ingest_failed").fetchall()
+    assert row == [("poison", 3, "boom")]
+    st = q.stats()
+    assert st["dead_lettered"] == 1 and st["failed"] == 1 and st["retries"] == 3
+    q.close()
+
+
+def test_attempts_survive_reopen(tmp_path):
+    q = _queue(tmp_path, max_attempts=5)
+    q.enqueue("u1", None, "poison")
+    q.record_failure(q.fetch(1)[0], "boom")
+    q.close()
+
+    q = _queue(tmp_path, max_attempts=5)
+    assert q.fetch(1)[0]["attempts"] == 1
+    q.close()
+
+
+def test_idempotent_enqueue_and_ack(tmp_path):
+    q = _queue(tmp_path)
+    seq, dup = q.enqueue("u1", "alice", "hello", idem_key="k1")
+    assert dup is False
+    assert q.enqueue("u1", "alice", "hello again", idem_key="k1") == (seq, True)
+    q.enqueue("u2", None, "other")
+    assert q.depth() == 2
+
+    batch = q.fetch(10)
+    assert [m["text"] for m in batch] == ["hello", "other"]
+    q.ack(batch[:1])
+    assert [m["text"] for m in q.fetch(10)] == ["other"]
+    # acked messages stay deduplicated within the TTL
+    assert q.enqueue("u1", "alice", "hello", idem_key="k1") == (seq, True)
+    st = q.stats()
+    assert st["depth"] == 1 and st["processed"] == 1 and st["duplicates"] == 2
+    q.close()
+
+
+def test_full_queue_rejects(tmp_path):
+    q = _queue(tmp_path, max_size=1)
+    q.enqueue("u1", None, "a")
+    with pytest.raises(IngestQueueFull):
+        q.enqueue("u1", None, "b")
+    assert q.stats()["rejected"] == 1
+    q.close()
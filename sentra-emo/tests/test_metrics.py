@@ -0,0 +1,43 @@
+from app.metrics import Histogram, PrometheusWriter, RecentHistogram
+
+
+def test_histogram_buckets_and_quantiles():
+    h = Histogram([1.0, 10.0, 100.0])
+    for v in (0.5, 1.0, 5.0, 50.0, 500.0):
+        h.observe(v)
+    snap = h.snapshot()
+    # le is inclusive: 1.0 falls in the first bucket, 500 in +Inf
+    assert snap.counts == [2, 1, 1, 1]
+    assert snap.cumulative()[-1][1] == 5
+    assert snap.count == 5 and snap.sum == 556.5
+    assert snap.min == 0.5 and snap.max == 500.0
+    assert 1.0 <= snap.quantile(0.5) <= 10.0
+    assert snap.quantile(1.0) == 500.0
+    assert Histogram([1.0]).summary()["p50"] is None
+
+
+def test_recent_histogram_keeps_lifetime_and_windows():
+    h = RecentHistogram([1.0, 10.0])
+    h.observe(3.0)
+    out = h.summary(("count", "max"))
+    assert out["count"] == 1 and out["60s"] == {"count": 1, "max": 3.0}
+    assert out["lifetime"] == {"count": 1, "max": 3.0}
+
+
+def test_prometheus_histogram_exposition():
+    h = Histogram([1.0, 10.0])
+    h.observe(0.5)
+    h.observe(20.0)
+    w = PrometheusWriter()
+    w.histogram("latency_seconds", h.snapshot(), "Latency", labels={"route": 'a"b\\c'}, scale=0.001)
+    w.sample("up", "gauge", True)
+    lines = w.render().splitlines()
+    assert lines[:2] == ["# HELP sentra_emo_latency_seconds Latency", "# TYPE sentra_emo_latency_seconds histogram"]
+    assert lines[2:7] == [
+        'sentra_emo_latency_seconds_bucket{route="a\\"b\\\\c",le="0.001"} 1',
+        'sentra_emo_latency_seconds_bucket{route="a\\"b\\\\c",le="0.01"} 1',
+        'sentra_emo_latency_seconds_bucket{route="a\\"b\\\\c",le="+Inf"} 2',
+        'sentra_emo_latency_seconds_sum{route="a\\"b\\\\c"} 0.0205',
+        'sentra_emo_latency_seconds_count{route="a\\"b\\\\c"} 2',
+    ]
+    assert lines[-1] == "sentra_emo_up 1"
@@ -0,0 +1,25 @@
+import app.analysis as analysis
+
+
+def test_request_path_does_not_rebuild_swapped_out_mapper(monkeypatch):
+    built = []
+
+    def fake_reload(emo_dir, labels):
+        built.append(str(emo_dir))
+        monkeypatch.setattr(analysis, "_vad_key", (str(emo_dir), tuple(labels or ())))
+
+    monkeypatch.setattr(analysis, "_vad_key", None)
+    monkeypatch.setattr(analysis, "_swapped_out_keys", set())
+    monkeypatch.setattr(analysis, "_reload_vad_state", fake_reload)
+
+    analysis.ensure_vad_mapper("/models/old", ["joy"])
+    analysis.swap_vad_mapper("/models/new", ["joy"], lambda: None)
+    # a request still holding the old pipeline
+    analysis.ensure_vad_mapper("/models/old", ["joy"])
+    assert built == ["/models/old", "/models/new"]
+    assert analysis._vad_key == ("/models/new", ("joy",))
+
+    # swapping back makes the old key current again
+    analysis.swap_vad_mapper("/models/old", ["joy"], lambda: None)
+    analysis.ensure_vad_mapper("/models/new", ["joy"])
+    assert built == ["/models/old", "/models/new", "/models/old"]
@@ -0,0 +1,43 @@
+import random
+
+from app.autotune import token_length_texts
+from app.workers import ProcessInferencePool
+
+
+class _FakeManager:
+    engine = "torch"
+
+    def ensure_sentiment(self):
+        return None, "s"
+
+    def ensure_emotion(self):
+        return None, "e"
+
+
+class _PairTokenizer:
+    """[CLS] + one token per two characters + [SEP]."""
+
+    def num_special_tokens_to_add(self):
+        return 2
+
+    def __call__(self, text):
+        return {"input_ids": [0] * (2 + (len(text) + 1) // 2)}
+
+
+def test_pool_warmup_reaches_every_worker_once():
+    pool = ProcessInferencePool(_FakeManager(), processes=3, threads_per_process=1)
+    pool.start()
+    try:
+        pids = pool.warmup({}, timeout=30)
+        assert len(pids) == 3 and len(set(pids)) == 3
+        assert sorted(pids) == sorted(pool.stats()["pids"])
+    finally:
+        pool.shutdown()
+
+
+def test_token_length_texts_hit_the_token_count():
+    tok = _PairTokenizer()
+    for tokens in (16, 64):
+        for text in token_length_texts(random.Random(0), 3, tokens, tok):
+            assert len(tok(text)["input_ids"]) == tokens
+    assert [len(t) for t in token_length_texts(random.Random(0), 2, 10)] == [10, 10]